@@ -0,0 +1,8 @@
+"""
+Benchmarks do IFfood. Execute a partir da raiz do projeto, por exemplo:
+
+    python -m benchmarks --duracao 30 --saida resultado.json
+    python -m benchmarks.sse_assinantes --assinantes 5000
+
+``python -m benchmarks`` roda a carga de horário de pico (benchmarks/pico.py).
+"""
@@ -0,0 +1,3 @@
+from benchmarks.pico import main
+
+main()
@@ -0,0 +1,26 @@
+import os
+from contextlib import contextmanager
+
+
+def configurar_django():
+    """ Inicializa o Django com as configurações do projeto para scripts avulsos. """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'iffood.settings')
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    import django
+    django.setup()
+
+
+@contextmanager
+def banco_de_teste():
+    """ Cria um banco de teste descartável (migrado) para o benchmark e o remove no final. """
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    nome_original = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(nome_original, verbosity=0)
+        teardown_test_environment()
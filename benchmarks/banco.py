@@ -0,0 +1,191 @@
+"""
+Latência do banco sob carga mista de leituras e escritas.
+
+Threads leitoras carregam o painel da cozinha e páginas do catálogo,
+enquanto threads escritoras mudam o status de pedidos e fecham pedidos
+novos, como nos horários de pico. Cada operação usa a sua conexão da
+thread (reaberta a cada operação quando CONN_MAX_AGE=0, como numa
+requisição) e o resultado traz p50/p99 por operação e as falhas.
+
+Cada perfil roda num processo separado, com as variáveis de ambiente
+lidas por iffood/settings.py:
+
+- sqlite-padrao: SQLite sem ajustes (journal de rollback, sem conexões persistentes)
+- sqlite-wal: o perfil padrão do projeto (WAL, synchronous=NORMAL, IMMEDIATE...)
+- postgresql / postgresql-pool: precisam de DB_NAME, DB_USER, DB_HOST... no ambiente
+
+Exemplo: python -m benchmarks.banco --perfis sqlite-padrao sqlite-wal --duracao 10
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from decimal import Decimal
+
+from benchmarks._ambiente import banco_de_teste, configurar_django
+
+PERFIS = {
+    'sqlite-padrao': {'DB_ENGINE': 'sqlite', 'SQLITE_OTIMIZADO': 'False', 'DB_CONN_MAX_AGE': '0'},
+    'sqlite-wal': {'DB_ENGINE': 'sqlite'},
+    'postgresql': {'DB_ENGINE': 'postgresql', 'DB_POOL': 'False', 'DB_CONN_MAX_AGE': '0'},
+    'postgresql-pool': {'DB_ENGINE': 'postgresql', 'DB_POOL': 'True'},
+}
+
+
+def semear(produtos, pedidos):
+    from django.contrib.auth.models import User
+    from restaurant.models import Produto
+    from store.models import ItemPedido, Pedido
+
+    clientes = User.objects.bulk_create(User(username=f'cliente{n}') for n in range(50))
+    catalogo = Produto.objects.bulk_create(
+        Produto(nome=f'Produto {n}', descricao='Descrição ' * 10, preco=Decimal('10.00') + n)
+        for n in range(produtos)
+    )
+    # A maior parte do histórico já saiu do painel
+    status = ['solicitado', 'em_preparo', 'saiu_para_entrega', 'entregue'] + ['limpo'] * 96
+    lista = Pedido.objects.bulk_create(
+        Pedido(cliente=clientes[n % len(clientes)], finalizado=True, status=status[n % len(status)],
+               total=Decimal('20.00'), quantidade_total=2)
+        for n in range(pedidos)
+    )
+    ItemPedido.objects.bulk_create(
+        ItemPedido(pedido=pedido, produto=catalogo[n % produtos], quantidade=2,
+                   preco_unitario=Decimal('10.00'), nome_produto=f'Produto {n % produtos}')
+        for n, pedido in enumerate(lista)
+    )
+    return [cliente.id for cliente in clientes], [produto.id for produto in catalogo], [pedido.id for pedido in lista]
+
+
+def operacoes(clientes, produtos, pedidos):
+    from django.db import transaction
+    from restaurant.kanban import carregar_kanban
+    from restaurant.models import Produto
+    from restaurant.paginacao import Pagina
+    from store.models import ItemPedido, Pedido
+
+    def leitura_kanban():
+        carregar_kanban()
+
+    def leitura_catalogo():
+        list(Pagina(Produto.objects.filter(ativo=True)).itens)
+
+    def escrita_status():
+        with transaction.atomic():
+            Pedido.objects.filter(id=random.choice(pedidos)).update(
+                status=random.choice(['em_preparo', 'saiu_para_entrega', 'entregue', 'limpo'])
+            )
+
+    def escrita_pedido():
+        with transaction.atomic():
+            pedido = Pedido.objects.create(cliente_id=random.choice(clientes), finalizado=True, status='solicitado')
+            ItemPedido.objects.bulk_create(
+                ItemPedido(pedido=pedido, produto_id=produto_id, quantidade=1)
+                for produto_id in random.sample(produtos, 2)
+            )
+            pedido.registrar_precos()
+            pedido.atualizar_totais()
+
+    return [leitura_kanban, leitura_catalogo], [escrita_status, escrita_pedido]
+
+
+def trabalhar(funcoes, prazo, resultados):
+    from django.db import close_old_connections, connection
+
+    amostras = {funcao.__name__: [] for funcao in funcoes}
+    erros = {funcao.__name__: 0 for funcao in funcoes}
+    while time.perf_counter() < prazo:
+        funcao = random.choice(funcoes)
+        inicio = time.perf_counter()
+        try:
+            funcao()
+        except Exception:
+            erros[funcao.__name__] += 1
+        else:
+            amostras[funcao.__name__].append((time.perf_counter() - inicio) * 1000)
+        # O que o Django faz ao fim de cada requisição
+        close_old_connections()
+    connection.close()
+    resultados.append((amostras, erros))
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))]
+
+
+def executar(args):
+    """ Roda a carga no perfil do ambiente atual e imprime o resultado em JSON. """
+    configurar_django()
+    with banco_de_teste():
+        leituras, escritas = operacoes(*semear(args.produtos, args.pedidos))
+        prazo = time.perf_counter() + args.duracao
+        resultados = []
+        threads = [
+            threading.Thread(target=trabalhar, args=(leituras, prazo, resultados)) for _ in range(args.leitores)
+        ] + [
+            threading.Thread(target=trabalhar, args=(escritas, prazo, resultados)) for _ in range(args.escritores)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    relatorio = {}
+    for funcao in leituras + escritas:
+        nome = funcao.__name__
+        amostras = [ms for parcial, _ in resultados for ms in parcial.get(nome, [])]
+        relatorio[nome] = {
+            'operacoes': len(amostras),
+            'por_segundo': len(amostras) / args.duracao,
+            'p50_ms': percentil(amostras, 50),
+            'p99_ms': percentil(amostras, 99),
+            'media_ms': statistics.fmean(amostras) if amostras else 0.0,
+            'erros': sum(erros.get(nome, 0) for _, erros in resultados),
+        }
+    print(json.dumps(relatorio))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--perfis', nargs='+', choices=PERFIS, default=['sqlite-padrao', 'sqlite-wal'])
+    parser.add_argument('--duracao', type=float, default=10, help='Segundos de carga por perfil.')
+    parser.add_argument('--leitores', type=int, default=6)
+    parser.add_argument('--escritores', type=int, default=2)
+    parser.add_argument('--produtos', type=int, default=500)
+    parser.add_argument('--pedidos', type=int, default=5000)
+    parser.add_argument('--executar', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.executar:
+        return executar(args)
+
+    repassar = [
+        f'--{opcao}={getattr(args, opcao)}' for opcao in ('duracao', 'leitores', 'escritores', 'produtos', 'pedidos')
+    ]
+    print(f"{'perfil':16} {'operação':18} {'ops/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'erros':>6}")
+    for perfil in args.perfis:
+        with tempfile.TemporaryDirectory() as pasta:
+            # No SQLite o banco precisa estar em arquivo para o modo WAL valer
+            ambiente = {**os.environ, **PERFIS[perfil], 'DB_TEST_NAME': os.path.join(pasta, 'benchmark.sqlite3')}
+            if perfil.startswith('postgresql'):
+                del ambiente['DB_TEST_NAME']
+            saida = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.banco', '--executar', *repassar],
+                env=ambiente, capture_output=True, text=True, check=True,
+            )
+        for nome, linha in json.loads(saida.stdout.strip().splitlines()[-1]).items():
+            print(f"{perfil:16} {nome:18} {linha['por_segundo']:>8.1f} {linha['p50_ms']:>8.2f} "
+                  f"{linha['p99_ms']:>8.2f} {linha['erros']:>6}")
+
+
+if __name__ == '__main__':
+    main()
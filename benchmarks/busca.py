@@ -0,0 +1,90 @@
+"""
+Compara a busca por índice de texto completo (restaurant.busca) com o
+filtro icontains anterior num catálogo sintético, medindo o tempo para
+obter a primeira página de resultados (já ordenada) e o total encontrado.
+"""
+import argparse
+import random
+import time
+from decimal import Decimal
+
+from benchmarks._ambiente import banco_de_teste, configurar_django
+
+PALAVRAS = (
+    'pizza calabresa frango catupiry pão queijo mussarela presunto tomate manjericão '
+    'hambúrguer bacon cheddar salada maionese batata frita refrigerante suco laranja '
+    'limão açaí granola banana morango chocolate brigadeiro pudim coxinha pastel carne '
+    'palmito milho ervilha azeitona orégano cebola alho picanha costela feijão arroz'
+).split()
+
+CONSULTAS = ['pizza', 'pao queijo', 'choc', 'açaí banana', 'costela feijão arroz']
+
+SILABAS = 'ba be bi bo bu ca co cu da de di do la le li lo ma me mi mo na ne ni no pa pe pi po ra re ri ro sa se si ta te ti to'.split()
+
+
+def vocabulario(gerador, total=5000):
+    """ Palavras de cardápio comuns seguidas de palavras raras sintéticas (ingredientes, marcas, sabores). """
+    raras = {''.join(gerador.choices(SILABAS, k=3)) for _ in range(total)}
+    return PALAVRAS + sorted(raras)
+
+
+def semear(total):
+    from restaurant.models import Produto
+
+    gerador = random.Random(42)
+    palavras = vocabulario(gerador)
+    # Distribuição de Zipf: poucas palavras muito comuns e uma cauda longa de raras
+    pesos = [1 / (posicao + 1) for posicao in range(len(palavras))]
+    Produto.objects.bulk_create(
+        (
+            Produto(
+                nome=' '.join(gerador.choices(palavras, weights=pesos, k=3)).title(),
+                descricao=' '.join(gerador.choices(palavras, weights=pesos, k=25)),
+                preco=Decimal(gerador.randint(500, 9000)) / 100,
+            )
+            for _ in range(total)
+        ),
+        batch_size=2000,
+    )
+
+
+def cronometrar(funcao, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        resultado = funcao()
+    return (time.perf_counter() - inicio) / repeticoes * 1000, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--produtos', type=int, default=20000)
+    parser.add_argument('--repeticoes', type=int, default=10)
+    parser.add_argument('--pagina', type=int, default=24)
+    args = parser.parse_args()
+
+    configurar_django()
+    from django.db.models import Q
+    from restaurant import busca
+    from restaurant.models import Produto
+
+    with banco_de_teste():
+        semear(args.produtos)
+        busca.reconstruir()
+        ativos = Produto.objects.filter(ativo=True)
+        # Além das palavras comuns, busca termos da cauda longa (palavra inteira, prefixo e dois termos)
+        raras = vocabulario(random.Random(42))[len(PALAVRAS):]
+        consultas = CONSULTAS + [raras[100], raras[1500][:4], f'{raras[10]} {raras[30]}']
+
+        print(f'{args.produtos} produtos')
+        print(f"{'consulta':24} {'icontains ms':>13} {'n':>6} {'índice ms':>10} {'n':>6}")
+        for consulta in consultas:
+            # O caminho anterior só casava a frase inteira, sem ranking
+            antigo = ativos.filter(Q(nome__icontains=consulta) | Q(descricao__icontains=consulta))
+            novo = busca.buscar(ativos, consulta)
+            ms_antigo, _ = cronometrar(lambda: list(antigo[:args.pagina]), args.repeticoes)
+            ms_novo, _ = cronometrar(lambda: list(novo[:args.pagina]), args.repeticoes)
+            print(f'{consulta:24} {ms_antigo:>13.2f} {antigo.count():>6} {ms_novo:>10.2f} {novo.count():>6}')
+
+
+if __name__ == '__main__':
+    main()
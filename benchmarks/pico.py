@@ -0,0 +1,298 @@
+"""
+Carga de horário de pico, por endpoint.
+
+Semeia um banco descartável (produtos, clientes e histórico de pedidos) e
+roda, em paralelo, usuários virtuais com o cliente de testes do Django:
+
+- navegacao: abre o catálogo e o revalida a cada 10 s (If-None-Match);
+- carrinho: rajadas de cliques em adicionar, aumentar e remover itens;
+- checkout: monta o carrinho, finaliza e acompanha o status do pedido;
+- kanban: o painel da cozinha revalidado a cada 10 s;
+- cozinha: aceita, despacha e entrega os pedidos que chegam.
+
+Os intervalos de polling são comprimidos por ``--escala-tempo`` (0.01: os
+10 s viram 100 ms). O resultado é um JSON com vazão, p50/p95/p99 e consultas
+por requisição de cada endpoint (pelo nome da view), mais os parâmetros e o
+commit, para comparar execuções:
+
+    python -m benchmarks --duracao 30 --saida antes.json
+    python -m benchmarks --comparar antes.json depois.json
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from benchmarks._ambiente import banco_de_teste, configurar_django
+
+FORMATO = 1
+INTERVALO_POLLING = 10
+
+# Usuários virtuais de cada cenário
+USUARIOS = {'navegacao': 12, 'carrinho': 4, 'checkout': 3, 'kanban': 2, 'cozinha': 1}
+# Cenários da equipe (todos com a mesma conta); nos demais, cada usuário virtual tem o seu cliente
+CENARIOS_EQUIPE = ('kanban', 'cozinha')
+CLIENTES_VIRTUAIS = sum(quantidade for cenario, quantidade in USUARIOS.items() if cenario not in CENARIOS_EQUIPE)
+
+
+def semear(produtos, clientes, pedidos):
+    from django.contrib.auth.models import User
+    from restaurant.models import Produto
+    from store.models import ItemPedido, Pedido
+
+    User.objects.create_user('cozinha', is_staff=True)
+    contas = User.objects.bulk_create(User(username=f'cliente{n}') for n in range(clientes))
+    catalogo = Produto.objects.bulk_create(
+        Produto(nome=f'Produto {n}', descricao='Descrição ' * 10, preco=Decimal('10.00') + n % 50)
+        for n in range(produtos)
+    )
+    # Histórico: quase tudo já saiu do painel
+    lista = Pedido.objects.bulk_create(
+        Pedido(cliente=contas[n % clientes], finalizado=True, status='limpo', total=Decimal('20.00'), quantidade_total=2)
+        for n in range(pedidos)
+    )
+    ItemPedido.objects.bulk_create(
+        ItemPedido(pedido=pedido, produto=catalogo[n % produtos], quantidade=2,
+                   preco_unitario=Decimal('10.00'), nome_produto=f'Produto {n % produtos}')
+        for n, pedido in enumerate(lista)
+    )
+
+
+class Medidor:
+    """ Latência, status e consultas de cada requisição, agrupados pelo nome da view. """
+
+    def __init__(self):
+        self.amostras = defaultdict(list)
+        self.trava = threading.Lock()
+
+    def requisitar(self, client, metodo, url, **kwargs):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from django.urls import resolve
+
+        with CaptureQueriesContext(connection) as consultas:
+            inicio = time.perf_counter()
+            response = getattr(client, metodo)(url, **kwargs)
+            duracao = (time.perf_counter() - inicio) * 1000
+        nome = resolve(url.split('?')[0]).view_name
+        if kwargs.get('HTTP_HX_REQUEST'):
+            nome += ' [htmx]'
+        with self.trava:
+            self.amostras[nome].append((duracao, response.status_code, len(consultas)))
+        return response
+
+
+def _cliente(usuario):
+    from django.test import Client
+
+    client = Client()
+    client.force_login(usuario)
+    return client
+
+
+def _esperar(args, segundos):
+    time.sleep(segundos * args.escala_tempo)
+
+
+def navegacao(medidor, args, aleatorio, usuario):
+    from django.urls import reverse
+
+    client = _cliente(usuario)
+    url = reverse('store:lista_produtos')
+    etag = medidor.requisitar(client, 'get', url).get('ETag')
+    while not args.parar.is_set():
+        _esperar(args, INTERVALO_POLLING)
+        response = medidor.requisitar(client, 'get', url, HTTP_IF_NONE_MATCH=etag or '')
+        etag = response.get('ETag', etag)
+        if aleatorio.random() < 0.2:
+            medidor.requisitar(client, 'get', url, data={'q': f'produto {aleatorio.randrange(50)}'})
+
+
+def carrinho(medidor, args, aleatorio, usuario):
+    from django.urls import reverse
+
+    client = _cliente(usuario)
+    while not args.parar.is_set():
+        escolhidos = aleatorio.sample(args.produtos_ids, 3)
+        for produto_id in escolhidos * 2:
+            medidor.requisitar(client, 'post', reverse('store:adicionar_ao_carrinho', args=[produto_id]))
+        medidor.requisitar(client, 'post', reverse('store:atualizar_carrinho', args=[escolhidos[0]]), data={'action': 'inc'})
+        medidor.requisitar(client, 'get', reverse('store:visualizar_carrinho'))
+        for produto_id in escolhidos:
+            medidor.requisitar(client, 'post', reverse('store:remover_do_carrinho', args=[produto_id]))
+        _esperar(args, 2)
+
+
+def checkout(medidor, args, aleatorio, usuario):
+    from django.urls import reverse
+
+    client = _cliente(usuario)
+    while not args.parar.is_set():
+        for produto_id in aleatorio.sample(args.produtos_ids, 2):
+            medidor.requisitar(client, 'post', reverse('store:adicionar_ao_carrinho', args=[produto_id]))
+        response = medidor.requisitar(client, 'post', reverse('store:finalizar_pedido'))
+        medidor.requisitar(client, 'get', response['Location'])
+        status = response['Location'].replace('acompanhar/', 'hx-status/')
+        etag = ''
+        for _ in range(3):
+            _esperar(args, INTERVALO_POLLING)
+            etag = medidor.requisitar(client, 'get', status, HTTP_HX_REQUEST='true', HTTP_IF_NONE_MATCH=etag).get('ETag', etag)
+
+
+def kanban(medidor, args, aleatorio, usuario):
+    from django.urls import reverse
+
+    client = _cliente(usuario)
+    url = reverse('restaurant:gestao_pedidos')
+    etag = ''
+    while not args.parar.is_set():
+        etag = medidor.requisitar(client, 'get', url, HTTP_HX_REQUEST='true', HTTP_IF_NONE_MATCH=etag).get('ETag', etag)
+        _esperar(args, INTERVALO_POLLING)
+
+
+def cozinha(medidor, args, aleatorio, usuario):
+    from django.urls import reverse
+    from store.models import Pedido
+
+    client = _cliente(usuario)
+    proximo = {'solicitado': 'aceitar_pedido', 'em_preparo': 'marcar_como_em_entrega', 'saiu_para_entrega': 'marcar_como_finalizado'}
+    while not args.parar.is_set():
+        pedidos = list(Pedido.objects.filter(finalizado=True, status__in=proximo).values_list('id', 'status')[:5])
+        for pedido_id, status in pedidos:
+            medidor.requisitar(client, 'post', reverse(f'restaurant:{proximo[status]}', args=[pedido_id]), HTTP_HX_REQUEST='true')
+        if aleatorio.random() < 0.1:
+            medidor.requisitar(client, 'post', reverse('restaurant:limpar_finalizados'), HTTP_HX_REQUEST='true')
+        _esperar(args, 5)
+
+
+CENARIOS = {'navegacao': navegacao, 'carrinho': carrinho, 'checkout': checkout, 'kanban': kanban, 'cozinha': cozinha}
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))]
+
+
+def _usuario_virtual(cenario, medidor, args, semente, usuario):
+    from django.db import connection
+
+    try:
+        CENARIOS[cenario](medidor, args, random.Random(semente), usuario)
+    finally:
+        connection.close()
+
+
+def executar(args):
+    configurar_django()
+    from django.contrib.auth.models import User
+    from restaurant.models import Produto
+
+    with banco_de_teste():
+        semear(args.produtos, args.clientes, args.pedidos)
+        args.produtos_ids = list(Produto.objects.values_list('id', flat=True))
+        staff = User.objects.get(username='cozinha')
+        clientes = iter(User.objects.filter(is_staff=False).order_by('id')[:CLIENTES_VIRTUAIS])
+        args.parar = threading.Event()
+        medidor = Medidor()
+        threads = []
+        for cenario, quantidade in USUARIOS.items():
+            for n in range(quantidade):
+                usuario = staff if cenario in CENARIOS_EQUIPE else next(clientes)
+                semente = args.semente * 1000 + len(threads)
+                threads.append(threading.Thread(target=_usuario_virtual, args=(cenario, medidor, args, semente, usuario)))
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duracao)
+        args.parar.set()
+        for thread in threads:
+            thread.join()
+
+    endpoints = {}
+    for nome, amostras in sorted(medidor.amostras.items()):
+        latencias = [ms for ms, _, _ in amostras]
+        consultas = [quantidade for _, _, quantidade in amostras]
+        status = defaultdict(int)
+        for _, codigo, _ in amostras:
+            status[str(codigo)] += 1
+        endpoints[nome] = {
+            'requisicoes': len(amostras),
+            'por_segundo': round(len(amostras) / args.duracao, 2),
+            'p50_ms': round(percentil(latencias, 50), 2),
+            'p95_ms': round(percentil(latencias, 95), 2),
+            'p99_ms': round(percentil(latencias, 99), 2),
+            'consultas_media': round(sum(consultas) / len(consultas), 2),
+            'consultas_max': max(consultas),
+            'status': dict(sorted(status.items())),
+        }
+    return {
+        'formato': FORMATO,
+        'commit': _commit(),
+        'parametros': {
+            opcao: getattr(args, opcao) for opcao in ('duracao', 'produtos', 'clientes', 'pedidos', 'escala_tempo', 'semente')
+        } | {'usuarios': USUARIOS},
+        'endpoints': endpoints,
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(antes, depois):
+    """ p95 e consultas por requisição de cada endpoint, lado a lado. """
+    print(f"{'endpoint':52} {'p95 antes':>10} {'p95 depois':>10} {'var.':>7} {'consultas':>13}")
+    for nome in sorted(set(antes['endpoints']) | set(depois['endpoints'])):
+        a, d = antes['endpoints'].get(nome), depois['endpoints'].get(nome)
+        if not a or not d:
+            print(f"{nome:52} {'(só em ' + ('depois' if d else 'antes') + ')':>10}")
+            continue
+        variacao = (d['p95_ms'] - a['p95_ms']) / a['p95_ms'] * 100 if a['p95_ms'] else 0.0
+        print(f"{nome:52} {a['p95_ms']:>10.2f} {d['p95_ms']:>10.2f} {variacao:>+6.0f}% "
+              f"{a['consultas_media']:>6.1f} → {d['consultas_media']:<5.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duracao', type=float, default=20, help='Segundos de carga.')
+    parser.add_argument('--produtos', type=int, default=500)
+    parser.add_argument('--clientes', type=int, default=200)
+    parser.add_argument('--pedidos', type=int, default=20000, help='Pedidos no histórico.')
+    parser.add_argument('--escala-tempo', type=float, default=0.01, help='Fator aplicado aos intervalos de polling.')
+    parser.add_argument('--semente', type=int, default=1)
+    parser.add_argument('--saida', help='Grava o JSON neste arquivo em vez de imprimi-lo.')
+    parser.add_argument('--comparar', nargs=2, metavar=('ANTES', 'DEPOIS'), help='Compara dois resultados gravados.')
+    args = parser.parse_args(argv)
+    if args.clientes < CLIENTES_VIRTUAIS:
+        parser.error(f'--clientes precisa ser pelo menos {CLIENTES_VIRTUAIS}, um por usuário virtual que compra')
+
+    if args.comparar:
+        with open(args.comparar[0]) as antes, open(args.comparar[1]) as depois:
+            return comparar(json.load(antes), json.load(depois))
+
+    with tempfile.TemporaryDirectory() as pasta:
+        # Banco em arquivo (os usuários virtuais são threads, cada uma com a sua conexão),
+        # carrinhos numa pasta própria e sem o perfil de requisições medindo junto
+        os.environ.setdefault('DB_TEST_NAME', os.path.join(pasta, 'benchmark.sqlite3'))
+        os.environ.setdefault('CARRINHO_CACHE_LOCATION', os.path.join(pasta, 'carrinhos'))
+        os.environ.setdefault('PERFIL_AMOSTRAGEM', '0')
+        resultado = json.dumps(executar(args), indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, 'w') as arquivo:
+            arquivo.write(resultado + '\n')
+    else:
+        sys.stdout.write(resultado + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Custo de uma requisição de polling com e sem If-None-Match.
+
+Para cada tela com polling (catálogo, Kanban e status do pedido) mede o
+tempo médio e o número de consultas de uma resposta completa (200) e de
+uma revalidação que não mudou (304).
+"""
+import argparse
+import time
+from decimal import Decimal
+
+from benchmarks._ambiente import banco_de_teste, configurar_django
+
+
+def semear(produtos, pedidos):
+    from django.contrib.auth.models import User
+    from restaurant.models import Produto
+    from store.models import ItemPedido, Pedido
+
+    staff = User.objects.create_user('cozinha', password='senha', is_staff=True)
+    cliente = User.objects.create_user('cliente', password='senha')
+    catalogo = Produto.objects.bulk_create(
+        Produto(nome=f'Produto {n}', descricao='Descrição ' * 10, preco=Decimal('10.00') + n)
+        for n in range(produtos)
+    )
+    status = ['solicitado', 'em_preparo', 'saiu_para_entrega', 'entregue']
+    lista = Pedido.objects.bulk_create(
+        Pedido(cliente=cliente, finalizado=True, status=status[n % 4], total=Decimal('20.00'), quantidade_total=2)
+        for n in range(pedidos)
+    )
+    ItemPedido.objects.bulk_create(
+        ItemPedido(pedido=pedido, produto=catalogo[n % produtos], quantidade=2,
+                   preco_unitario=Decimal('10.00'), nome_produto=f'Produto {n % produtos}')
+        for n, pedido in enumerate(lista)
+    )
+    return staff, cliente, lista[0]
+
+
+def medir(client, url, repeticoes, **headers):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    inicio = time.perf_counter()
+    with CaptureQueriesContext(connection) as consultas:
+        for _ in range(repeticoes):
+            response = client.get(url, **headers)
+    duracao = (time.perf_counter() - inicio) / repeticoes
+    return response.status_code, duracao * 1000, len(consultas) / repeticoes, len(response.content)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--produtos', type=int, default=200)
+    parser.add_argument('--pedidos', type=int, default=150)
+    parser.add_argument('--repeticoes', type=int, default=50)
+    args = parser.parse_args()
+
+    configurar_django()
+    from django.test import Client
+    from django.urls import reverse
+
+    with banco_de_teste():
+        staff, cliente, pedido = semear(args.produtos, args.pedidos)
+        cozinha, loja = Client(), Client()
+        cozinha.force_login(staff)
+        loja.force_login(cliente)
+        cenarios = [
+            ('lista_produtos', loja, reverse('store:lista_produtos'), {}),
+            ('gestao_pedidos', cozinha, reverse('restaurant:gestao_pedidos'), {'HTTP_HX_REQUEST': 'true'}),
+            ('hx_acompanhar_pedido_status', loja,
+             reverse('store:hx_acompanhar_pedido_status', args=[pedido.id]), {'HTTP_HX_REQUEST': 'true'}),
+        ]
+
+        print(f"{'view':30} {'status':>6} {'ms/req':>8} {'consultas':>9} {'bytes':>8}")
+        for nome, client, url, headers in cenarios:
+            etag = client.get(url, **headers)['ETag']
+            for rotulo, extra in (('200', {}), ('304', {'HTTP_IF_NONE_MATCH': etag})):
+                status, ms, consultas, tamanho = medir(client, url, args.repeticoes, **headers, **extra)
+                print(f'{nome:30} {status:>6} {ms:>8.2f} {consultas:>9.1f} {tamanho:>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,316 @@
+"""
+Milhares de clientes em polling: WSGI (gunicorn com threads) contra ASGI (uvicorn).
+
+Semeia um banco SQLite e um cache em arquivos descartáveis, sobe cada
+servidor num subprocesso e mantém ``--pollers`` conexões keep-alive
+abertas ao mesmo tempo, cada uma repetindo a cada ``--intervalo`` segundos
+o polling de uma tela (com If-None-Match, como o htmx faz):
+
+- status: o status do próprio pedido (``hx_acompanhar_pedido_status``);
+- carrinho: o contador do carrinho (``hx_contagem_carrinho``);
+- kanban: o painel da cozinha (``gestao_pedidos``), para 1% dos pollers.
+
+Enquanto isso a cozinha aceita um pedido por segundo, então parte das
+revalidações volta com 200. O cliente HTTP é um event loop só, sem
+dependências, para não ser ele o gargalo. O resultado é um JSON com, por
+servidor, vazão, p50/p95/p99, erros (conexões recusadas, tempo esgotado,
+respostas 5xx) e quantos pollers chegaram a ser atendidos:
+
+    pip install gunicorn uvicorn
+    python -m benchmarks.servidores --pollers 1000 --duracao 30 --saida servidores.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from decimal import Decimal
+from pathlib import Path
+
+from benchmarks._ambiente import configurar_django
+from benchmarks.pico import _commit, percentil
+
+FORMATO = 1
+RAIZ = Path(__file__).resolve().parent.parent
+HOST = '127.0.0.1'
+
+
+def comando(servidor, args, porta):
+    endereco = f'{HOST}:{porta}'
+    if servidor == 'wsgi':
+        # worker-connections alto: o limite medido é o das threads, não o de conexões aceitas
+        return [
+            sys.executable, '-m', 'gunicorn', 'iffood.wsgi:application', '--bind', endereco,
+            '--worker-class', 'gthread', '--workers', str(args.workers), '--threads', str(args.threads),
+            '--worker-connections', str(args.pollers * 2), '--keep-alive', str(int(args.intervalo) + 5),
+            '--backlog', '4096', '--log-level', 'warning',
+        ]
+    return [
+        sys.executable, '-m', 'uvicorn', 'iffood.asgi:application', '--host', HOST, '--port', str(porta),
+        '--workers', str(args.workers), '--timeout-keep-alive', str(int(args.intervalo) + 5),
+        '--backlog', '4096', '--log-level', 'warning', '--no-access-log',
+    ]
+
+
+def ambiente(pasta, servidor):
+    """ Variáveis de ambiente comuns aos servidores e a este processo. """
+    variaveis = {
+        'DJANGO_SETTINGS_MODULE': 'iffood.settings',
+        'SECRET_KEY': 'benchmark',
+        'DEBUG': 'False',
+        'ALLOWED_HOSTS': HOST,
+        'DB_NAME': str(pasta / 'benchmark.sqlite3'),
+        # Os workers precisam ver os mesmos carimbos de versão (ETags)
+        'CACHE_BACKEND': 'iffood.cache.FileBasedCache',
+        'CACHE_LOCATION': str(pasta / 'cache'),
+        'CACHE_MAX_ENTRIES': '100000',
+        'CARRINHO_CACHE_LOCATION': str(pasta / 'carrinhos'),
+        'PERFIL_AMOSTRAGEM': '0',
+    }
+    if servidor == 'asgi':
+        # Sob ASGI cada requisição tem a sua thread de ORM: conexões persistentes não são reaproveitadas
+        variaveis['DB_CONN_MAX_AGE'] = '0'
+    return variaveis
+
+
+def semear(clientes):
+    """ Um pedido aguardando e uma sessão para cada cliente; devolve [(tipo, url, sessionid)]. """
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.test import Client
+    from django.urls import reverse
+    from restaurant.models import Produto
+    from store.models import ItemPedido, Pedido
+
+    call_command('migrate', verbosity=0)
+    staff = User.objects.create_user('cozinha', is_staff=True)
+    contas = User.objects.bulk_create(User(username=f'cliente{n}') for n in range(clientes))
+    pizza = Produto.objects.create(nome='Pizza', descricao='Calabresa', preco=Decimal('30.00'))
+    pedidos = Pedido.objects.bulk_create(
+        Pedido(cliente=conta, finalizado=True, status='solicitado', total=Decimal('30.00'), quantidade_total=1)
+        for conta in contas
+    )
+    ItemPedido.objects.bulk_create(
+        ItemPedido(pedido=pedido, produto=pizza, quantidade=1, preco_unitario=Decimal('30.00'), nome_produto='Pizza')
+        for pedido in pedidos
+    )
+
+    def sessao(usuario):
+        client = Client()
+        client.force_login(usuario)
+        return client.cookies['sessionid'].value
+
+    cozinha = sessao(staff)
+    pollers = []
+    for n, (conta, pedido) in enumerate(zip(contas, pedidos)):
+        if n % 100 == 99:
+            pollers.append(('kanban', reverse('restaurant:gestao_pedidos'), cozinha))
+        elif n % 4 == 3:
+            pollers.append(('carrinho', reverse('store:hx_contagem_carrinho'), sessao(conta)))
+        else:
+            pollers.append(('status', reverse('store:hx_acompanhar_pedido_status', args=[pedido.id]), sessao(conta)))
+    return pollers
+
+
+class Conexao:
+    """ Cliente HTTP/1.1 mínimo, com keep-alive, para um único servidor. """
+
+    def __init__(self, porta):
+        self.porta = porta
+        self.reader = self.writer = None
+
+    async def abrir(self):
+        self.reader, self.writer = await asyncio.open_connection(HOST, self.porta)
+
+    def fechar(self):
+        if self.writer:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def get(self, url, cabecalhos):
+        linhas = [f'GET {url} HTTP/1.1', f'Host: {HOST}'] + [f'{nome}: {valor}' for nome, valor in cabecalhos.items()]
+        self.writer.write(('\r\n'.join(linhas) + '\r\n\r\n').encode())
+        await self.writer.drain()
+        inicio = (await self.reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+        status = int(inicio[0].split()[1])
+        resposta = {}
+        for linha in inicio[1:]:
+            if linha:
+                nome, _, valor = linha.partition(':')
+                resposta[nome.strip().lower()] = valor.strip()
+        if resposta.get('transfer-encoding') == 'chunked':
+            while tamanho := int((await self.reader.readline()).split(b';')[0], 16):
+                await self.reader.readexactly(tamanho + 2)
+            await self.reader.readline()
+        elif 'content-length' in resposta:
+            await self.reader.readexactly(int(resposta['content-length']))
+        if resposta.get('connection', '').lower() == 'close':
+            self.fechar()
+        return status, resposta
+
+
+async def polling(porta, tipo, url, sessao, args, fim, amostras):
+    conexao = Conexao(porta)
+    etag = ''
+    # Chegadas espalhadas pelo primeiro intervalo, como abas abertas em momentos diferentes
+    await asyncio.sleep(random.uniform(0, args.intervalo))
+    while time.monotonic() < fim:
+        inicio = time.perf_counter()
+        cabecalhos = {'Cookie': f'sessionid={sessao}', 'HX-Request': 'true'}
+        if etag:
+            cabecalhos['If-None-Match'] = etag
+        reaproveitada = conexao.writer is not None
+        try:
+            if not reaproveitada:
+                await asyncio.wait_for(conexao.abrir(), args.tempo_limite)
+            status, resposta = await asyncio.wait_for(conexao.get(url, cabecalhos), args.tempo_limite)
+        except (ConnectionError, asyncio.IncompleteReadError) as erro:
+            conexao.fechar()
+            if reaproveitada:
+                # O servidor fechou a conexão ociosa: tenta de novo numa nova
+                continue
+            amostras.append((tipo, None, type(erro).__name__))
+        except (OSError, asyncio.TimeoutError) as erro:
+            conexao.fechar()
+            amostras.append((tipo, None, 'TimeoutError' if isinstance(erro, asyncio.TimeoutError) else type(erro).__name__))
+        else:
+            amostras.append((tipo, (time.perf_counter() - inicio) * 1000, status))
+            etag = resposta.get('etag', etag)
+        await asyncio.sleep(max(0.0, args.intervalo - (time.perf_counter() - inicio)))
+    conexao.fechar()
+
+
+async def cozinha(fim):
+    """ Aceita um pedido por segundo, mudando o status (e o ETag) de parte dos pollers. """
+    from store.estados import mudar_status
+    from store.models import Pedido
+
+    ids = await asyncio.to_thread(lambda: list(Pedido.objects.filter(status='solicitado').values_list('id', flat=True)))
+    random.shuffle(ids)
+    while ids and time.monotonic() < fim:
+        await asyncio.to_thread(mudar_status, 'em_preparo', [ids.pop()])
+        await asyncio.sleep(1)
+
+
+async def carga(porta, pollers, args):
+    amostras = []
+    fim = time.monotonic() + args.duracao
+    await asyncio.gather(
+        cozinha(fim),
+        *(polling(porta, tipo, url, sessao, args, fim, amostras) for tipo, url, sessao in pollers),
+    )
+    return amostras
+
+
+def _esperar_servidor(processo, porta, url, sessao):
+    async def testar():
+        conexao = Conexao(porta)
+        await conexao.abrir()
+        try:
+            return await conexao.get(url, {'Cookie': f'sessionid={sessao}'})
+        finally:
+            conexao.fechar()
+
+    limite = time.monotonic() + 30
+    while time.monotonic() < limite:
+        if processo.poll() is not None:
+            raise RuntimeError(f'O servidor terminou ao iniciar (código {processo.returncode}).')
+        try:
+            status, _ = asyncio.run(testar())
+        except OSError:
+            time.sleep(0.2)
+            continue
+        if status >= 400:
+            raise RuntimeError(f'O servidor respondeu {status} a {url}.')
+        return
+    raise RuntimeError('O servidor não começou a responder em 30 s.')
+
+
+def resumir(amostras, pollers, duracao):
+    respondidas = [(tipo, ms, status) for tipo, ms, status in amostras if ms is not None]
+    latencias = [ms for _, ms, _ in respondidas]
+    erros = Counter(str(status) for _, ms, status in amostras if ms is None or status >= 500)
+    resumo = {
+        'requisicoes': len(amostras),
+        'por_segundo': round(len(respondidas) / duracao, 2),
+        'p50_ms': round(percentil(latencias, 50), 2) if latencias else None,
+        'p95_ms': round(percentil(latencias, 95), 2) if latencias else None,
+        'p99_ms': round(percentil(latencias, 99), 2) if latencias else None,
+        'erros': dict(sorted(erros.items())),
+        'status': dict(sorted(Counter(str(status) for _, _, status in respondidas).items())),
+        'pollers': pollers,
+    }
+    por_tipo = {}
+    for tipo in sorted({tipo for tipo, _, _ in respondidas}):
+        valores = [ms for t, ms, _ in respondidas if t == tipo]
+        por_tipo[tipo] = {'requisicoes': len(valores), 'p95_ms': round(percentil(valores, 95), 2)}
+    resumo['por_tela'] = por_tipo
+    return resumo
+
+
+def executar(args, pasta):
+    os.environ.update(ambiente(pasta, 'wsgi'))
+    configurar_django()
+    from django.core.cache import cache
+
+    pollers = semear(args.pollers)
+    resultados = {}
+    for numero, servidor in enumerate(args.servidores):
+        cache.clear()
+        porta = args.porta + numero
+        processo = subprocess.Popen(
+            comando(servidor, args, porta), cwd=RAIZ, env={**os.environ, **ambiente(pasta, servidor)},
+        )
+        try:
+            _tipo, url, sessao = pollers[0]
+            _esperar_servidor(processo, porta, url, sessao)
+            amostras = asyncio.run(carga(porta, pollers, args))
+        finally:
+            processo.terminate()
+            processo.wait(timeout=30)
+        resultados[servidor] = resumir(amostras, len(pollers), args.duracao)
+    return {
+        'formato': FORMATO,
+        'commit': _commit(),
+        'parametros': {
+            opcao: getattr(args, opcao) for opcao in ('pollers', 'duracao', 'intervalo', 'workers', 'threads', 'tempo_limite')
+        },
+        'servidores': resultados,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.servidores', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pollers', type=int, default=1000, help='Conexões simultâneas em polling.')
+    parser.add_argument('--duracao', type=float, default=120, help='Segundos de carga em cada servidor.')
+    parser.add_argument('--intervalo', type=float, default=60, help='Segundos entre dois pollings de uma conexão.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Processos de cada servidor.')
+    parser.add_argument('--threads', type=int, default=8, help='Threads por processo do gunicorn.')
+    parser.add_argument('--tempo-limite', type=float, default=10, help='Segundos até desistir de uma requisição.')
+    parser.add_argument('--servidores', nargs='+', choices=('wsgi', 'asgi'), default=['wsgi', 'asgi'])
+    parser.add_argument('--porta', type=int, default=8701)
+    parser.add_argument('--saida', help='Grava o JSON neste arquivo em vez de imprimi-lo.')
+    args = parser.parse_args(argv)
+
+    # Cada poller é um descritor de arquivo aqui e outro no servidor
+    _atual, maximo = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (maximo, maximo))
+
+    with tempfile.TemporaryDirectory() as pasta:
+        resultado = json.dumps(executar(args, Path(pasta)), indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, 'w') as arquivo:
+            arquivo.write(resultado + '\n')
+    else:
+        sys.stdout.write(resultado + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Teste de carga do canal SSE: abre milhares de assinantes ociosos num único
+event loop (como um worker ASGI) e mede memória por conexão, custo de CPU
+enquanto ociosos e o tempo para um evento chegar a todos eles.
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+from benchmarks._ambiente import configurar_django
+
+
+async def executar(total, eventos):
+    from store.eventos import CANAL_KANBAN, broker, transmitir
+
+    recebidos = 0
+    todos_receberam = asyncio.Event()
+
+    async def assinante():
+        nonlocal recebidos
+        fluxo = transmitir([CANAL_KANBAN], intervalo_ping=3600)
+        await anext(fluxo)  # cabeçalho "retry"
+        async for mensagem in fluxo:
+            if mensagem.startswith('event:'):
+                recebidos += 1
+                if recebidos == total * eventos:
+                    todos_receberam.set()
+
+    tracemalloc.start()
+    memoria_inicial = tracemalloc.get_traced_memory()[0]
+    tarefas = [asyncio.create_task(assinante()) for _ in range(total)]
+    while broker().total_assinaturas(CANAL_KANBAN) < total:
+        await asyncio.sleep(0.01)
+    memoria_por_conexao = (tracemalloc.get_traced_memory()[0] - memoria_inicial) / total
+    tracemalloc.stop()
+
+    # Assinantes ociosos não devem consumir CPU
+    cpu_inicial = time.process_time()
+    await asyncio.sleep(1)
+    cpu_ocioso = time.process_time() - cpu_inicial
+
+    inicio = time.perf_counter()
+    for numero in range(eventos):
+        broker().publicar(CANAL_KANBAN, {'tipo': 'status', 'pedido': numero, 'status': 'em_preparo'})
+    await asyncio.wait_for(todos_receberam.wait(), timeout=60)
+    entrega = time.perf_counter() - inicio
+
+    for tarefa in tarefas:
+        tarefa.cancel()
+    await asyncio.gather(*tarefas, return_exceptions=True)
+
+    print(f'assinantes:              {total}')
+    print(f'memória por conexão:     {memoria_por_conexao / 1024:.1f} KiB')
+    print(f'CPU em 1s ocioso:        {cpu_ocioso * 1000:.1f} ms')
+    print(f'entrega de {eventos} evento(s): {entrega * 1000:.1f} ms ({entrega / (total * eventos) * 1e6:.1f} µs/mensagem)')
+    print(f'assinaturas restantes:   {broker().total_assinaturas(CANAL_KANBAN)}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--assinantes', type=int, default=5000)
+    parser.add_argument('--eventos', type=int, default=1)
+    args = parser.parse_args()
+    configurar_django()
+    asyncio.run(executar(args.assinantes, args.eventos))
+
+
+if __name__ == '__main__':
+    main()
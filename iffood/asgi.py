@@ -3,6 +3,11 @@ ASGI config for iffood project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The order-status push channels (``restaurant:eventos_kanban`` and
+``store:eventos_pedido``) are long-lived Server-Sent Events streams and need
+an ASGI server, e.g. ``uvicorn iffood.asgi:application``. Under WSGI they
+answer 204 and the pages fall back to slow polling.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
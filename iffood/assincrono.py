@@ -0,0 +1,76 @@
+"""
+Decoradores para views assíncronas.
+
+Os decoradores de autenticação do Django aceitam views assíncronas, mas
+chamam o teste do usuário (``lambda u: u.is_staff``) numa thread, e o
+``etag`` chama a função do ETag de forma síncrona. Estes fazem tudo no
+event loop: o usuário vem de ``request.auser()`` e o ETag de uma função
+assíncrona, então uma requisição de polling respondida com 304 não ocupa
+nenhuma thread além das consultas ao banco e ao cache.
+
+O usuário carregado fica em ``request.user``, para que os templates (e o
+context processor de autenticação) não tentem buscá-lo de forma síncrona.
+
+``iterar_em_thread`` adapta o conteúdo de uma resposta em fluxo para o
+servidor ASGI.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+
+from django.contrib.auth.views import redirect_to_login
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+
+def _exigir_usuario(teste):
+    def decorador(view):
+        @wraps(view)
+        async def _view(request, *args, **kwargs):
+            usuario = await request.auser()
+            if not teste(usuario):
+                return redirect_to_login(request.get_full_path())
+            request.user = usuario
+            return await view(request, *args, **kwargs)
+        return _view
+    return decorador
+
+
+# login_required e, para o painel do restaurante, user_passes_test(is_staff) + login_required
+login_requerido = _exigir_usuario(lambda usuario: usuario.is_authenticated)
+equipe_requerida = _exigir_usuario(lambda usuario: usuario.is_authenticated and usuario.is_staff)
+
+
+def etag_assincrono(funcao_etag):
+    """ Como django.views.decorators.http.etag, com uma funcao_etag assíncrona. """
+    def decorador(view):
+        @wraps(view)
+        async def _view(request, *args, **kwargs):
+            etag = quote_etag(await funcao_etag(request, *args, **kwargs))
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD'):
+                response.headers.setdefault('ETag', etag)
+            return response
+        return _view
+    return decorador
+
+
+async def iterar_em_thread(iteravel):
+    """
+    Um iterador síncrono (que consulta o banco) como iterador assíncrono,
+    para um StreamingHttpResponse sob ASGI: com um iterador síncrono, o
+    Django consome tudo antes de enviar. Cada item é produzido fora do
+    event loop, sempre na mesma thread, a da conexão com o banco.
+    """
+    iterador = iter(iteravel)
+    proximo = sync_to_async(next, thread_sensitive=True)
+    fim = object()
+    try:
+        while (item := await proximo(iterador, fim)) is not fim:
+            yield item
+    finally:
+        # Cliente que desconectou no meio: fecha o gerador (e o cursor) na mesma thread
+        if hasattr(iterador, 'close'):
+            await sync_to_async(iterador.close, thread_sensitive=True)()
@@ -0,0 +1,62 @@
+"""
+Backends de cache do projeto.
+"""
+import os
+import tempfile
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache as _FileBasedCache
+
+
+class FileBasedCache(_FileBasedCache):
+    """
+    FileBasedCache cujo ``add`` é atômico também entre processos: o valor é
+    gravado num arquivo temporário e ligado ao nome final com ``os.link``,
+    que falha se o arquivo já existir. No backend do Django o ``add`` é um
+    ``has_key`` seguido de ``set``, e dois processos podem ganhar juntos.
+
+    No do Django, todo ``set`` também lista a pasta inteira para ver se
+    passou de ``MAX_ENTRIES``: com milhares de carrinhos, cada clique (e cada
+    tentativa de pegar a trava) varreria a pasta. Aqui ``set`` e ``add`` só
+    gravam; as entradas expiradas e o excesso são apagados por ``podar``,
+    chamado periodicamente pelo comando ``podar_cache``.
+    """
+
+    def _cull(self):
+        # Fora do caminho das requisições: ver podar()
+        pass
+
+    def podar(self):
+        """
+        Apaga as entradas expiradas e, se as restantes ainda passarem de
+        MAX_ENTRIES, descarta parte delas (como o _cull do Django). Devolve
+        quantos arquivos restaram.
+        """
+        for nome in self._list_cache_files():
+            try:
+                with open(nome, 'rb') as arquivo:
+                    # Apaga o arquivo se ele estiver expirado
+                    self._is_expired(arquivo)
+            except FileNotFoundError:
+                pass
+        super()._cull()
+        return len(self._list_cache_files())
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._createdir()
+        fname = self._key_to_file(key, version)
+        fd, tmp_path = tempfile.mkstemp(dir=self._dir)
+        try:
+            with open(fd, 'wb') as f:
+                self._write_content(f, timeout, value)
+            for _ in range(2):
+                try:
+                    os.link(tmp_path, fname)
+                    return True
+                except FileExistsError:
+                    # has_key apaga o arquivo se ele estiver expirado; aí vale tentar de novo
+                    if self.has_key(key, version):
+                        return False
+            return False
+        finally:
+            os.remove(tmp_path)
@@ -0,0 +1,113 @@
+"""
+Orçamento de consultas por view, para os testes.
+
+``OrcamentoConsultasMixin`` mede uma requisição em dois tamanhos de dados
+(``TAMANHOS``) e falha se ela passar do máximo de consultas combinado para
+a view ou se o número de consultas crescer de um tamanho para o outro, o
+sinal de um N+1. A mensagem de erro lista o SQL repetido dentro da
+requisição, que costuma apontar direto para o laço culpado.
+"""
+import re
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+
+
+def normalizar(sql):
+    """ SQL sem os valores: a mesma consulta com outros parâmetros (a cada volta de um laço) fica igual. """
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'"s\d+_x\d+"', '"?"', sql)
+    sql = re.sub(r'\b\d+(?:\.\d+)?\b', '?', sql)
+    return re.sub(r'\(\?(?:, \?)*\)', '(...)', sql)
+
+
+def consultas_repetidas(consultas):
+    """ [(sql, vezes)] das consultas executadas mais de uma vez, da mais para a menos repetida. """
+    vezes = Counter(normalizar(consulta['sql']) for consulta in consultas)
+    return [(sql, n) for sql, n in vezes.most_common() if n > 1]
+
+
+def _descrever(consultas):
+    repetidas = consultas_repetidas(consultas)
+    if not repetidas:
+        linhas = [f'  {consulta["sql"]}' for consulta in consultas]
+        return 'Consultas:\n' + '\n'.join(linhas)
+    return 'Consultas repetidas:\n' + '\n'.join(f'  {n}x {sql}' for sql, n in repetidas)
+
+
+def nomes_de_urls(modulo):
+    """ Nomes (com o namespace do app) de todas as URLs de um urls.py. """
+    resolver = get_resolver(modulo)
+    app = getattr(resolver.urlconf_module, 'app_name', None)
+    nomes = []
+    for padrao in resolver.url_patterns:
+        if isinstance(padrao, URLPattern) and padrao.name:
+            nomes.append(f'{app}:{padrao.name}' if app else padrao.name)
+        elif isinstance(padrao, URLResolver):
+            nomes += nomes_de_urls(padrao.urlconf_name)
+    return nomes
+
+
+class OrcamentoConsultasMixin:
+    # Linhas acrescentadas a cada tabela antes de cada medição (acumuladas)
+    TAMANHOS = (2, 10)
+
+    def povoar(self, quantidade):
+        """ Acrescenta ``quantidade`` linhas a cada tabela lida pelas views testadas. """
+        raise NotImplementedError
+
+    def requisicao(self, usuario, metodo, nome, *args, preparar=None, **kwargs):
+        """
+        preparar(n) para assertOrcamento: faz login como usuario (None: visitante),
+        chama o preparo opcional e devolve a requisição ao URL nome. Argumentos
+        do URL que forem funções são chamados na hora (ids de linhas criadas em povoar).
+        """
+        def preparar_requisicao(tamanho):
+            self.client.logout()
+            if usuario:
+                self.client.force_login(usuario)
+            if preparar:
+                preparar(tamanho)
+            url = reverse(nome, args=[valor() if callable(valor) else valor for valor in args])
+            return lambda: getattr(self.client, metodo)(url, **kwargs)
+        return preparar_requisicao
+
+    def assertOrcamento(self, maximo, preparar, rotulo=''):
+        """
+        preparar(n) deixa tudo pronto para a requisição (login, carrinho...)
+        e devolve uma função sem argumentos que a faz; só essa função é medida.
+        """
+        medicoes = []
+        povoado = 0
+        for tamanho in self.TAMANHOS:
+            self.povoar(tamanho - povoado)
+            povoado = tamanho
+            # Cache frio: o pior caso de cada view
+            cache.clear()
+            requisitar = preparar(tamanho)
+            with CaptureQueriesContext(connection) as consultas:
+                response = requisitar()
+            self.assertLess(response.status_code, 400, f'{rotulo}: resposta {response.status_code}')
+            if len(consultas) > maximo:
+                self.fail(
+                    f'{rotulo}: {len(consultas)} consultas com {tamanho} linhas por tabela '
+                    f'(orçamento: {maximo}).\n{_descrever(consultas.captured_queries)}'
+                )
+            medicoes.append((tamanho, consultas.captured_queries))
+
+        (menor, antes), (maior, depois) = medicoes[0], medicoes[-1]
+        if len(depois) > len(antes):
+            self.fail(
+                f'{rotulo}: o número de consultas cresce com os dados '
+                f'({len(antes)} com {menor} linhas, {len(depois)} com {maior}).\n{_descrever(depois)}'
+            )
+
+    def assertOrcamentos(self, orcamentos):
+        """ assertOrcamento para cada (nome, máximo, preparar), cada um sobre os dados iniciais do teste. """
+        for nome, maximo, preparar in orcamentos:
+            with self.subTest(nome), transaction.atomic():
+                self.assertOrcamento(maximo, preparar, rotulo=nome)
+                transaction.set_rollback(True)
@@ -0,0 +1,213 @@
+"""
+Perfil das requisições: consultas, SQL, templates e tamanho da resposta por view.
+
+``PerfilMiddleware`` mede uma fração das requisições (``PERFIL_AMOSTRAGEM``,
+de 0 a 1) e guarda as últimas ``JANELA`` medições de cada view na memória do
+processo; ``relatorio`` calcula os percentis sobre essa janela. As demais
+requisições passam direto, então o custo fora da amostra é um sorteio.
+
+Cada medição registra:
+
+- número de consultas e quantas repetem o SQL de outra da mesma requisição
+  (mesmo texto, parâmetros diferentes: o padrão de um N+1);
+- tempo gasto no banco e renderizando templates;
+- tempo total e tamanho do corpo da resposta.
+
+As consultas são medidas por um ``execute_wrapper`` instalado em toda
+conexão e os templates pelo ``render`` do backend do Django (só o template
+de nível mais alto; os incluídos entram no tempo dele). Os dois só fazem
+algo quando há uma medição em andamento no contexto atual, o que inclui as
+consultas que uma view assíncrona faz via ``sync_to_async``.
+"""
+import random
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from statistics import quantiles
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import Template
+
+# Medições guardadas por view
+JANELA = 500
+# Endpoints guardados; acima disso, os novos entram juntos em OUTROS (a memória não cresce sem limite)
+MAX_ENDPOINTS = 200
+# URLs que não resolvem (404 de robôs e scanners) são todas um único endpoint
+NAO_RESOLVIDO = '<não resolvido>'
+OUTROS = '<outros>'
+
+_medicao = ContextVar('perfil_medicao', default=None)
+_registros = {}
+_trava = threading.Lock()
+
+
+class Medicao:
+    __slots__ = ('consultas', 'tempo_sql', 'tempo_templates', 'renderizando')
+
+    def __init__(self):
+        self.consultas = []
+        self.tempo_sql = 0.0
+        self.tempo_templates = 0.0
+        self.renderizando = False
+
+    @property
+    def repetidas(self):
+        return sum(vezes - 1 for vezes in Counter(self.consultas).values())
+
+
+def _medir_consulta(execute, sql, params, many, context):
+    medicao = _medicao.get()
+    if medicao is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicao.tempo_sql += time.perf_counter() - inicio
+        medicao.consultas.append(sql)
+
+
+def _instalar(conexao):
+    # No início da lista: connection.execute_wrapper() desempilha pelo fim
+    if _medir_consulta not in conexao.execute_wrappers:
+        conexao.execute_wrappers.insert(0, _medir_consulta)
+
+
+@receiver(connection_created)
+def _instalar_na_conexao(sender, connection, **kwargs):
+    _instalar(connection)
+
+
+_render_original = Template.render
+
+
+def _render_medido(self, context=None, request=None):
+    medicao = _medicao.get()
+    if medicao is None or medicao.renderizando:
+        return _render_original(self, context, request)
+    medicao.renderizando = True
+    inicio = time.perf_counter()
+    try:
+        return _render_original(self, context, request)
+    finally:
+        medicao.tempo_templates += time.perf_counter() - inicio
+        medicao.renderizando = False
+
+
+Template.render = _render_medido
+
+
+def _nome_endpoint(request):
+    match = getattr(request, 'resolver_match', None)
+    nome = (match.view_name if match else None) or NAO_RESOLVIDO
+    return f'{nome} [htmx]' if getattr(request, 'htmx', False) else nome
+
+
+def registrar(endpoint, amostra):
+    registro = _registros.get(endpoint)
+    if registro is None:
+        with _trava:
+            if endpoint not in _registros and len(_registros) >= MAX_ENDPOINTS:
+                endpoint = OUTROS
+            registro = _registros.setdefault(endpoint, deque(maxlen=JANELA))
+    registro.append(amostra)
+
+
+def _percentil(valores, p):
+    if len(valores) == 1:
+        return valores[0]
+    return quantiles(valores, n=100, method='inclusive')[p - 1]
+
+
+def relatorio():
+    """ Uma linha por endpoint, do maior para o menor p95 de tempo total. """
+    linhas = []
+    for endpoint, registro in list(_registros.items()):
+        amostras = list(registro)
+        if not amostras:
+            continue
+        coluna = {campo: [amostra[campo] for amostra in amostras] for campo in amostras[0]}
+        linhas.append({
+            'endpoint': endpoint,
+            'amostras': len(amostras),
+            'tempo_p50': _percentil(coluna['tempo'], 50),
+            'tempo_p95': _percentil(coluna['tempo'], 95),
+            'tempo_p99': _percentil(coluna['tempo'], 99),
+            'consultas_p95': _percentil(coluna['consultas'], 95),
+            'repetidas_max': max(coluna['repetidas']),
+            'sql_p95': _percentil(coluna['sql'], 95),
+            'templates_p95': _percentil(coluna['templates'], 95),
+            'bytes_p95': _percentil(coluna['bytes'], 95),
+        })
+    return sorted(linhas, key=lambda linha: linha['tempo_p95'], reverse=True)
+
+
+def limpar():
+    _registros.clear()
+
+
+class PerfilMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._sortear():
+            return self.get_response(request)
+        medicao, token, inicio = self._iniciar()
+        try:
+            response = self.get_response(request)
+        finally:
+            _medicao.reset(token)
+        self._registrar(request, response, medicao, inicio)
+        return response
+
+    async def __acall__(self, request):
+        if not self._sortear():
+            return await self.get_response(request)
+        medicao, token, inicio = self._iniciar()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _medicao.reset(token)
+        self._registrar(request, response, medicao, inicio)
+        return response
+
+    @staticmethod
+    def _sortear():
+        amostragem = settings.PERFIL_AMOSTRAGEM
+        return amostragem >= 1 or (amostragem > 0 and random.random() < amostragem)
+
+    @staticmethod
+    def _iniciar():
+        # Conexões abertas antes deste módulo ser carregado não passaram pelo sinal
+        for conexao in connections.all():
+            _instalar(conexao)
+        medicao = Medicao()
+        return medicao, _medicao.set(medicao), time.perf_counter()
+
+    @staticmethod
+    def _registrar(request, response, medicao, inicio):
+        # Respostas em fluxo (SSE) ficam abertas por minutos e não têm tamanho conhecido
+        if response.streaming:
+            return
+        # Tempos em milissegundos
+        registrar(_nome_endpoint(request), {
+            'tempo': (time.perf_counter() - inicio) * 1000,
+            'consultas': len(medicao.consultas),
+            'repetidas': medicao.repetidas,
+            'sql': medicao.tempo_sql * 1000,
+            'templates': medicao.tempo_templates * 1000,
+            'bytes': len(response.content),
+        })
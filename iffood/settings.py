@@ -1,5 +1,5 @@
 from pathlib import Path
-from decouple import config # Importe a função config
+from decouple import Csv, config # Importe a função config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -14,7 +14,7 @@ SECRET_KEY = config('SECRET_KEY')
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = config('DEBUG', default=False, cast=bool)
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = config('ALLOWED_HOSTS', default='', cast=Csv())
 
 
 # Application definition
@@ -28,6 +28,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'restaurant.apps.RestaurantConfig',
     'store.apps.StoreConfig',
+    'tarefas.apps.TarefasConfig',
     
 ]
 
@@ -40,6 +41,8 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django_htmx.middleware.HtmxMiddleware',
+    'iffood.perfil.PerfilMiddleware',
+    'store.replicas.ReplicaMiddleware',
 ]
 
 ROOT_URLCONF = 'iffood.urls'
@@ -65,14 +68,109 @@ WSGI_APPLICATION = 'iffood.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE escolhe o perfil: 'sqlite' (padrão) ou 'postgresql'.
+DB_ENGINE = config('DB_ENGINE', default='sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME', default='iffood'),
+            'USER': config('DB_USER', default='iffood'),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': config('DB_HOST', default='localhost'),
+            'PORT': config('DB_PORT', default='5432'),
+            'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=600, cast=int),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    if config('DB_POOL', default=False, cast=bool):
+        # Pool de conexões do psycopg 3 (pacote psycopg[pool]); substitui as
+        # conexões persistentes, então CONN_MAX_AGE precisa ser 0
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': config('DB_POOL_MIN', default=2, cast=int),
+            'max_size': config('DB_POOL_MAX', default=20, cast=int),
+            'timeout': config('DB_POOL_TIMEOUT', default=10, cast=int),
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('DB_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+            'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=600, cast=int),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+            # Sem DB_TEST_NAME os testes usam um banco em memória
+            'TEST': {'NAME': config('DB_TEST_NAME', default=None)},
+        }
     }
+    if config('SQLITE_OTIMIZADO', default=True, cast=bool):
+        DATABASES['default']['OPTIONS'] = {
+            # WAL: leitores não esperam pelo escritor (e vice-versa); com WAL,
+            # synchronous=NORMAL só arrisca a última transação numa queda de energia
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                f"PRAGMA mmap_size={config('SQLITE_MMAP_SIZE', default=128 * 1024 * 1024, cast=int)};"
+                'PRAGMA temp_store=MEMORY;'
+            ),
+            # Tempo (s) que uma escrita espera pela trava antes de falhar com "database is locked"
+            'timeout': config('SQLITE_BUSY_TIMEOUT', default=20, cast=int),
+            # A trava de escrita é pedida no início da transação: duas transações que
+            # leem e depois escrevem não ficam presas no upgrade de trava (que ignora o timeout)
+            'transaction_mode': 'IMMEDIATE',
+        }
+
+# Réplicas de leitura (opcional): DB_REPLICAS lista, separados por vírgula, os
+# arquivos SQLite (no PostgreSQL, os hosts) de cada réplica. As telas de
+# consulta leem delas; ver store/replicas.py. Com SQLite, as cópias são
+# atualizadas por "python manage.py sincronizar_replicas".
+REPLICAS = []
+for numero, endereco in enumerate(config('DB_REPLICAS', default='', cast=Csv()), start=1):
+    replica = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+    replica['HOST' if DB_ENGINE == 'postgresql' else 'NAME'] = endereco
+    DATABASES[f'replica{numero}'] = replica
+    REPLICAS.append(f'replica{numero}')
+
+DATABASE_ROUTERS = ['store.replicas.RoteadorReplicas']
+# Segundos em que as leituras ficam no principal depois de uma escrita do usuário
+# (ou de uma mudança nos dados da tela), tempo para as réplicas alcançarem
+REPLICA_FIXAR = config('DB_REPLICA_FIXAR', default=5, cast=int)
+
+
+# Cache
+# O padrão (memória local) funciona sem nenhum serviço externo; com vários
+# processos use um backend compartilhado, por exemplo:
+#   CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+#   CACHE_LOCATION=/var/tmp/iffood_cache
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='iffood'),
+        # Cada pedido acompanhado tem o seu carimbo de versão; acima disso o backend descarta entradas ao acaso
+        'OPTIONS': {'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=300, cast=int)},
+    },
+    # Carrinhos de compras em aberto (ver store/carrinho.py). Ficam fora do banco
+    # e precisam sobreviver a reinícios, por isso o padrão é em arquivos, numa
+    # pasta do projeto (não no /tmp, que o sistema limpa). Outro backend precisa
+    # de um add atômico (Redis e Memcached têm), usado como trava. Os testes
+    # usam uma pasta temporária (iffood/testes.py)
+    'carrinhos': {
+        'BACKEND': config('CARRINHO_CACHE_BACKEND', default='iffood.cache.FileBasedCache'),
+        'LOCATION': config('CARRINHO_CACHE_LOCATION', default=str(BASE_DIR / 'var' / 'carrinhos')),
+        'TIMEOUT': 60 * 60 * 24 * 30,
+        # O padrão (300) faria o backend em arquivos descartar carrinhos ao acaso
+        'OPTIONS': {'MAX_ENTRIES': config('CARRINHO_CACHE_MAX_ENTRIES', default=100_000, cast=int)},
+    },
 }
 
 
+# Testes: os carrinhos vão para uma pasta temporária de cada execução
+TEST_RUNNER = 'iffood.testes.TestRunner'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -124,3 +222,20 @@ STATICFILES_DIRS = [
 # ---GERENCIAR UPLOADS ---
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# --- TAREFAS EM SEGUNDO PLANO ---
+# Executadas pelo comando processar_tarefas. Com TAREFAS_IMEDIATAS, rodam no
+# próprio processo logo após o commit, sem worker.
+TAREFAS_IMEDIATAS = config('TAREFAS_IMEDIATAS', default=False, cast=bool)
+# Uma tarefa que passa disso (segundos) é interrompida; uma que segue em execução depois é de um worker que morreu
+TAREFAS_TEMPO_LIMITE = config('TAREFAS_TEMPO_LIMITE', default=600, cast=int)
+
+# --- PERFIL DAS REQUISIÇÕES ---
+# Fração das requisições medidas pelo PerfilMiddleware (0 desliga, 1 mede todas).
+# Relatório em /restaurante/desempenho/.
+PERFIL_AMOSTRAGEM = config('PERFIL_AMOSTRAGEM', default=1.0 if DEBUG else 0.01, cast=float)
+
+# --- EVENTOS DE PEDIDOS (SSE) ---
+# Backend que distribui as mudanças de status para o painel e para os clientes.
+# O broker local só alcança conexões do próprio processo.
+EVENTOS_BACKEND = config('EVENTOS_BACKEND', default='store.eventos.BrokerLocal')
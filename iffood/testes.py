@@ -0,0 +1,32 @@
+"""
+Runner dos testes.
+
+Os testes limpam o cache de carrinhos à vontade; ele passa a apontar para
+uma pasta temporária da execução, para nunca apagar os carrinhos reais da
+máquina em que os testes rodam.
+"""
+import os
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._carrinhos = tempfile.TemporaryDirectory(prefix='iffood_carrinhos_')
+        # Sempre o backend em arquivos: com outro (Redis, por exemplo), os testes limpariam o servidor de verdade.
+        # Também no ambiente, para os processos do --parallel que carregam as configurações de novo
+        carrinhos = {'BACKEND': 'iffood.cache.FileBasedCache', 'LOCATION': self._carrinhos.name}
+        os.environ['CARRINHO_CACHE_BACKEND'] = carrinhos['BACKEND']
+        os.environ['CARRINHO_CACHE_LOCATION'] = carrinhos['LOCATION']
+        caches = {**settings.CACHES, 'carrinhos': {**settings.CACHES['carrinhos'], **carrinhos}}
+        self._configuracao = override_settings(CACHES=caches)
+        self._configuracao.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._configuracao.disable()
+        self._carrinhos.cleanup()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,91 @@
+"""
+Busca de produtos por texto completo.
+
+- SQLite: tabela virtual FTS5 ``restaurant_produto_busca`` (tokenizer
+  unicode61 sem acentos), mantida pelos sinais de ``Produto``.
+- PostgreSQL: índice GIN sobre um tsvector com a configuração
+  ``pt_unaccent`` (português + unaccent), mantido pelo próprio banco.
+- Outros bancos: ``icontains`` em nome e descrição.
+
+Os termos buscados casam por prefixo ("piz" encontra "pizza") e sem
+acentos ("pao" encontra "pão"); os resultados vêm ordenados por
+relevância, com o nome pesando mais que a descrição.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+TABELA_FTS = 'restaurant_produto_busca'
+
+# Mesma expressão do índice GIN criado na migração (precisa ser idêntica para ser usada)
+VETOR_PG = (
+    "setweight(to_tsvector('pt_unaccent', nome), 'A') || "
+    "setweight(to_tsvector('pt_unaccent', descricao), 'B')"
+)
+
+def _termos(texto):
+    return re.findall(r'\w+', texto.lower())
+
+
+def buscar(produtos, texto):
+    """
+    Filtra o queryset de produtos pelo texto, do mais para o menos relevante.
+    O índice entra na mesma consulta (junção com a tabela FTS5 ou filtro
+    sobre o tsvector), então o resultado continua sendo um queryset que pode
+    ser filtrado e fatiado.
+    """
+    termos = _termos(texto)
+    if not termos:
+        return produtos.none()
+    if connection.vendor == 'sqlite':
+        return produtos.extra(
+            tables=[TABELA_FTS],
+            where=[f'{TABELA_FTS}.rowid = restaurant_produto.id', f'{TABELA_FTS} MATCH %s'],
+            params=[' '.join(f'"{termo}"*' for termo in termos)],
+            select={'relevancia': f'bm25({TABELA_FTS}, 10.0, 1.0)'},
+            order_by=['relevancia', 'id'],
+        )
+    if connection.vendor == 'postgresql':
+        consulta = ' & '.join(f'{termo}:*' for termo in termos)
+        return produtos.extra(
+            where=[f"({VETOR_PG}) @@ to_tsquery('pt_unaccent', %s)"],
+            params=[consulta],
+            select={'relevancia': f"-ts_rank({VETOR_PG}, to_tsquery('pt_unaccent', %s))"},
+            select_params=[consulta],
+            order_by=['relevancia', 'id'],
+        )
+    return produtos.filter(Q(nome__icontains=texto) | Q(descricao__icontains=texto))
+
+
+def indexar(produto):
+    """ Atualiza o produto no índice FTS5 (no PostgreSQL o índice se mantém sozinho). """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABELA_FTS} WHERE rowid = %s', [produto.pk])
+        cursor.execute(
+            f'INSERT INTO {TABELA_FTS} (rowid, nome, descricao) VALUES (%s, %s, %s)',
+            [produto.pk, produto.nome, produto.descricao],
+        )
+
+
+def remover(produto_id):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABELA_FTS} WHERE rowid = %s', [produto_id])
+
+
+def reconstruir():
+    """ Recria o índice inteiro a partir da tabela de produtos. """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'DELETE FROM {TABELA_FTS}')
+            cursor.execute(
+                f'INSERT INTO {TABELA_FTS} (rowid, nome, descricao) '
+                f'SELECT id, nome, descricao FROM restaurant_produto'
+            )
+            cursor.execute(f"INSERT INTO {TABELA_FTS} ({TABELA_FTS}) VALUES ('optimize')")
+        elif connection.vendor == 'postgresql':
+            cursor.execute('REINDEX INDEX restaurant_produto_busca_gin')
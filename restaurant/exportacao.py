@@ -0,0 +1,117 @@
+"""
+Exportação dos pedidos para a contabilidade, em CSV ou JSON lines.
+
+Uma linha por item de pedido finalizado, com os dados do pedido repetidos
+em cada item: primeiro os pedidos arquivados (store/arquivo.py), depois os
+da tabela de pedidos, cada parte em ordem de data.
+
+As linhas são lidas do banco em lotes (``.iterator``) e saem em blocos de
+texto à medida que ficam prontas: a memória não cresce com o número de
+linhas e o cabeçalho sai antes de a consulta terminar.
+"""
+import csv
+from datetime import datetime, time, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from store.models import ItemPedido, ItemPedidoArquivado
+
+CAMPOS = [
+    'pedido', 'data', 'status', 'cliente', 'total_pedido',
+    'produto', 'nome_produto', 'quantidade', 'preco_unitario', 'subtotal',
+]
+FORMATOS = {'csv': 'text/csv; charset=utf-8', 'jsonl': 'application/x-ndjson; charset=utf-8'}
+
+# Linhas lidas do banco por vez e tamanho (caracteres) dos blocos enviados
+TAMANHO_LOTE = 2000
+TAMANHO_BLOCO = 64 * 1024
+
+
+def _inicio_do_dia(data):
+    return timezone.make_aware(datetime.combine(data, time.min))
+
+
+def _itens(modelo, inicio, fim, status, produtos, banco):
+    itens = modelo.objects.using(banco).filter(
+        pedido__data_pedido__gte=_inicio_do_dia(inicio),
+        pedido__data_pedido__lt=_inicio_do_dia(fim + timedelta(days=1)),
+    )
+    if modelo is ItemPedido:
+        # Carrinhos em aberto não são vendas
+        itens = itens.filter(pedido__finalizado=True)
+    if status:
+        itens = itens.filter(pedido__status__in=status)
+    if produtos:
+        itens = itens.filter(produto_id__in=produtos)
+    return itens.order_by('pedido__data_pedido', 'pedido_id', 'id').values_list(
+        'pedido_id', 'pedido__data_pedido', 'pedido__status', 'pedido__cliente__username', 'pedido__total',
+        'produto_id', 'nome_produto', 'quantidade', 'preco_unitario',
+    )
+
+
+def linhas(inicio, fim, status=(), produtos=(), banco=None):
+    """ Tuplas na ordem de CAMPOS dos itens vendidos entre as datas inicio e fim, inclusive. """
+    for modelo in (ItemPedidoArquivado, ItemPedido):
+        consulta = _itens(modelo, inicio, fim, status, produtos, banco)
+        for pedido_id, data, status_pedido, cliente, total, produto_id, nome, quantidade, preco in consulta.iterator(
+            chunk_size=TAMANHO_LOTE
+        ):
+            subtotal = (preco or 0) * quantidade
+            yield (
+                pedido_id, timezone.localtime(data).isoformat(), status_pedido, cliente, total,
+                produto_id, nome, quantidade, preco, subtotal,
+            )
+
+
+class _Eco:
+    """ "Arquivo" do csv.writer que devolve a linha formatada em vez de guardá-la. """
+
+    def write(self, valor):
+        return valor
+
+
+# Início de célula que uma planilha interpreta como fórmula
+INICIO_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _celula(valor):
+    """ Texto digitado por usuários (nome do cliente, do produto) nunca vira fórmula na planilha. """
+    if isinstance(valor, str) and valor.startswith(INICIO_FORMULA):
+        return "'" + valor
+    return valor
+
+
+def _csv(linhas):
+    escritor = csv.writer(_Eco())
+    return (escritor.writerow([_celula(valor) for valor in linha]) for linha in linhas)
+
+
+def _jsonl(linhas):
+    codificador = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    return (codificador.encode(dict(zip(CAMPOS, linha))) + '\n' for linha in linhas)
+
+
+def _em_blocos(textos):
+    bloco, tamanho = [], 0
+    for texto in textos:
+        bloco.append(texto)
+        tamanho += len(texto)
+        if tamanho >= TAMANHO_BLOCO:
+            yield ''.join(bloco)
+            bloco, tamanho = [], 0
+    if bloco:
+        yield ''.join(bloco)
+
+
+def exportar(formato, inicio, fim, status=(), produtos=(), banco=None):
+    """ Blocos de texto do arquivo no formato ('csv' ou 'jsonl'); só consulta o banco quando consumido. """
+    if formato == 'csv':
+        yield next(_csv([CAMPOS]))
+        yield from _em_blocos(_csv(linhas(inicio, fim, status, produtos, banco)))
+    else:
+        yield from _em_blocos(_jsonl(linhas(inicio, fim, status, produtos, banco)))
+
+
+def nome_arquivo(formato, inicio, fim):
+    return f'pedidos-{inicio.isoformat()}-a-{fim.isoformat()}.{formato}'
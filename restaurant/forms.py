@@ -1,5 +1,7 @@
 from django import forms
+from . import imagens
 from .models import Produto
+from store.models import Pedido
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 
@@ -27,4 +29,37 @@ class ProdutoForm(forms.ModelForm):
             'preco': forms.NumberInput(attrs={'class': 'form-control'}),
             'ativo': forms.CheckboxInput(attrs={'class': 'form-check-input'}),           
             'imagem': forms.ClearableFileInput(attrs={'class': 'form-control'}),
-        }
\ No newline at end of file
+        }
+
+    def save(self, commit=True):
+        produto = super().save(commit=False)
+        gerar = False
+        if 'imagem' in self.changed_data:
+            arquivo = self.cleaned_data['imagem']
+            if arquivo:
+                # Guarda pelo hash do conteúdo; as variantes são geradas depois, fora da requisição
+                gerar = imagens.substituir(produto, arquivo)
+            else:
+                produto.imagem_hash, produto.imagem_variantes = '', {}
+        if commit:
+            produto.save()
+            if gerar:
+                imagens.agendar(produto)
+        return produto
+
+class PeriodoForm(forms.Form):
+    inicio = forms.DateField(required=False, label="De", widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
+    fim = forms.DateField(required=False, label="Até", widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
+
+class ExportacaoForm(forms.Form):
+    inicio = forms.DateField(label="De")
+    fim = forms.DateField(label="Até")
+    status = forms.MultipleChoiceField(choices=Pedido.STATUS_CHOICES, required=False)
+    produto = forms.ModelMultipleChoiceField(Produto.objects.all(), required=False)
+    formato = forms.ChoiceField(choices=[('csv', 'CSV'), ('jsonl', 'JSON lines')], required=False)
+
+    def clean(self):
+        dados = super().clean()
+        if dados.get('inicio') and dados.get('fim') and dados['inicio'] > dados['fim']:
+            raise forms.ValidationError('A data inicial é posterior à final.')
+        return dados
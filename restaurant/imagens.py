@@ -0,0 +1,132 @@
+"""
+Imagens dos produtos.
+
+O arquivo enviado no formulário é guardado pelo hash do conteúdo
+(``produtos/<hash>.<ext>``): reenviar a mesma foto, para o mesmo ou para
+outro produto, reaproveita o arquivo que já existe em vez de criar mais uma
+cópia.
+
+Uma tarefa em segundo plano (ver ``tarefas``) converte o original em
+variantes de larguras fixas nos formatos AVIF, WebP e JPEG
+(``produtos/variantes/<hash>/<largura>.<ext>``); AVIF e WebP só quando o
+Pillow instalado sabe gravá-los. Enquanto as variantes não ficam prontas os
+templates usam o original; depois, um ``<picture>`` com ``srcset`` deixa o
+navegador baixar só o tamanho e o formato de que precisa.
+"""
+import hashlib
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+from store.versoes import incrementar
+from tarefas.fila import tarefa
+from .models import Produto
+
+PASTA = 'produtos'
+
+# Larguras geradas; os cards do catálogo ocupam de 1/4 a toda a largura da tela
+LARGURAS = (320, 640, 960)
+
+# Do formato preferido para o de reserva: (formato do Pillow, extensão, opções de gravação)
+FORMATOS = (
+    ('AVIF', 'avif', {'quality': 50}),
+    ('WEBP', 'webp', {'quality': 75, 'method': 6}),
+    ('JPEG', 'jpg', {'quality': 80, 'optimize': True, 'progressive': True}),
+)
+
+
+def formatos_disponiveis():
+    """ FORMATOS que o Pillow instalado consegue gravar (AVIF e WebP dependem de como ele foi compilado). """
+    return [(formato, extensao, opcoes) for formato, extensao, opcoes in FORMATOS
+            if formato == 'JPEG' or features.check(formato.lower())]
+
+
+def calcular_hash(arquivo):
+    sha = hashlib.sha256()
+    arquivo.seek(0)
+    for pedaco in iter(lambda: arquivo.read(64 * 1024), b''):
+        sha.update(pedaco)
+    arquivo.seek(0)
+    return sha.hexdigest()
+
+
+def guardar_original(arquivo):
+    """ Grava o arquivo enviado pelo hash do conteúdo, se ainda não existir. Devolve (nome, hash). """
+    hash_ = calcular_hash(arquivo)
+    extensao = os.path.splitext(arquivo.name)[1].lower()
+    nome = f'{PASTA}/{hash_}{extensao}'
+    if not default_storage.exists(nome):
+        nome = default_storage.save(nome, arquivo)
+    return nome, hash_
+
+
+def _nome_variante(hash_, largura, extensao):
+    return f'{PASTA}/variantes/{hash_}/{largura}.{extensao}'
+
+
+def gerar_variantes(nome, hash_, forcar=False):
+    """
+    Cria as variantes do original que ainda não existirem (com forcar,
+    todas, sobrescrevendo as que existem) e devolve
+    ``{extensão: [[largura, nome], ...]}``. Nunca amplia a imagem: um
+    original estreito gera uma única variante, na própria largura.
+    """
+    with default_storage.open(nome) as arquivo:
+        original = ImageOps.exif_transpose(Image.open(arquivo))
+        original.load()
+    larguras = [largura for largura in LARGURAS if largura <= original.width] or [original.width]
+    original = original.convert('RGB')
+
+    formatos = formatos_disponiveis()
+    variantes = {}
+    for largura in larguras:
+        altura = round(original.height * largura / original.width)
+        redimensionada = original.resize((largura, altura), Image.Resampling.LANCZOS)
+        for formato, extensao, opcoes in formatos:
+            destino = _nome_variante(hash_, largura, extensao)
+            if forcar and default_storage.exists(destino):
+                default_storage.delete(destino)
+            if not default_storage.exists(destino):
+                conteudo = BytesIO()
+                redimensionada.save(conteudo, formato, **opcoes)
+                default_storage.save(destino, ContentFile(conteudo.getvalue()))
+            variantes.setdefault(extensao, []).append([largura, destino])
+    return variantes
+
+
+@tarefa
+def processar(produto_id, forcar=False):
+    """ Gera as variantes da imagem atual do produto (com forcar, de novo) e as registra nele. """
+    produto = Produto.objects.filter(pk=produto_id).only('imagem', 'imagem_hash').first()
+    if produto is None or not produto.imagem_hash:
+        return
+    variantes = gerar_variantes(produto.imagem.name, produto.imagem_hash, forcar)
+    # Condicionado ao hash: se outra imagem foi enviada nesse meio-tempo, ela terá as próprias variantes
+    if Produto.objects.filter(pk=produto_id, imagem_hash=produto.imagem_hash).update(imagem_variantes=variantes):
+        # O update não dispara sinais; o catálogo em cache precisa passar a usar as variantes
+        incrementar('produtos')
+
+
+def agendar(produto):
+    """ Enfileira a geração das variantes; a tarefa só é executada depois do commit. """
+    processar.enfileirar(produto.pk)
+
+
+def substituir(produto, arquivo):
+    """
+    Troca a imagem do produto pelo arquivo enviado (sem salvar o produto).
+    Se o mesmo conteúdo já tiver variantes prontas em outro produto, elas
+    são reaproveitadas e nada precisa ser gerado. Devolve True se as
+    variantes ainda precisam ser geradas.
+    """
+    nome, hash_ = guardar_original(arquivo)
+    produto.imagem = nome
+    produto.imagem_hash = hash_
+    produto.imagem_variantes = (
+        Produto.objects.filter(imagem_hash=hash_).exclude(imagem_variantes={})
+        .values_list('imagem_variantes', flat=True).first()
+    ) or {}
+    return not produto.imagem_variantes
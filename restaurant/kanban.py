@@ -0,0 +1,145 @@
+"""
+Painel de pedidos (Kanban) da cozinha.
+
+A página carrega o painel inteiro uma vez (``carregar_kanban``) e guarda a
+versão do carimbo ``pedidos`` em que foi renderizada. Depois, a cada aviso
+SSE, polling ou ação, manda essa versão e recebe só o que mudou desde então
+(``carregar_mudancas``): os cards que saíram de uma coluna são apagados, as
+colunas que receberam cards vêm inteiras (na mesma ordem da renderização
+completa) e os contadores vêm todos, como fragmentos ``hx-swap-oob``. Se as
+mudanças não estiverem mais registradas, ou forem muitas, o painel é
+renderizado inteiro de novo.
+
+``acarregar_kanban`` e ``acarregar_mudancas`` fazem o mesmo pelo ORM e pelo
+cache assíncronos, para a view de polling (assíncrona).
+"""
+from django.db.models import Count
+
+from store.models import Pedido
+from store.versoes import amudancas_desde, aversao, mudancas_desde, versao
+
+# Colunas do painel: (chave no contexto, status do pedido)
+COLUNAS_KANBAN = (
+    ('pedidos_solicitados', 'solicitado'),
+    ('pedidos_em_preparo', 'em_preparo'),
+    ('pedidos_em_entrega', 'saiu_para_entrega'),
+    ('pedidos_finalizados', 'entregue'),
+)
+
+# Como cada coluna aparece: título, classes do contador, texto da coluna vazia e
+# a ação em lote dos cards (status de destino, ou None para "Limpar", e o rótulo do botão)
+APRESENTACAO = {
+    'solicitado': ('🔔 Solicitados', 'bg-warning text-dark', 'Nenhum pedido solicitado.', 'em_preparo', 'Aceitar selecionados'),
+    'em_preparo': ('🍳 Em Preparo', 'bg-info text-dark', 'Nenhum pedido em preparo.', 'saiu_para_entrega', 'Despachar selecionados'),
+    'saiu_para_entrega': ('🛵 Saiu para Entrega', 'bg-primary', 'Nenhum pedido em rota.', 'entregue', 'Marcar selecionados como entregues'),
+    'entregue': ('✅ Finalizados', 'bg-success', 'Nenhum pedido finalizado.', None, 'Limpar Finalizados'),
+}
+
+# Versões de atraso a partir das quais sai mais barato mandar o painel inteiro
+LIMITE_MUDANCAS = 50
+
+
+def pedidos_do_kanban():
+    """ Pedidos que aparecem no painel, de cada status do mais antigo para o mais recente. """
+    # Ordenar por status primeiro não muda as colunas (são separadas em Python)
+    # e deixa a consulta ler tudo em ordem do índice pedido_kanban_idx, sem ordenação extra
+    return (
+        Pedido.objects
+        .filter(finalizado=True, status__in=[status for _, status in COLUNAS_KANBAN])
+        .select_related('cliente')
+        .prefetch_related('itempedido_set')
+        .order_by('status', 'data_pedido')
+    )
+
+
+def _colunas(totais, pedidos=None):
+    colunas = []
+    for _, status in COLUNAS_KANBAN:
+        titulo, cor, vazio, lote, acao = APRESENTACAO[status]
+        colunas.append({
+            'status': status, 'titulo': titulo, 'cor': cor, 'vazio': vazio, 'lote': lote, 'acao': acao,
+            'total': totais.get(status, 0), 'pedidos': (pedidos or {}).get(status, []),
+        })
+    return colunas
+
+
+def _separar(pedidos):
+    colunas = {status: [] for _, status in COLUNAS_KANBAN}
+    for pedido in pedidos:
+        colunas[pedido.status].append(pedido)
+    # Os finalizados aparecem do mais recente para o mais antigo
+    colunas['entregue'].reverse()
+    return colunas
+
+
+def _montar_kanban(versao_atual, pedidos):
+    colunas = _separar(pedidos)
+    context = {chave: colunas[status] for chave, status in COLUNAS_KANBAN}
+    context['colunas'] = _colunas({status: len(pedidos) for status, pedidos in colunas.items()}, colunas)
+    context['versao'] = versao_atual
+    return context
+
+
+def carregar_kanban():
+    """
+    Carrega todos os pedidos do painel com uma única consulta de pedidos
+    (com o cliente e os totais já gravados) e uma de itens,
+    separando-os por status em Python.
+    """
+    # Lida antes dos pedidos: o painel está pelo menos tão novo quanto a versão
+    versao_atual = versao('pedidos')
+    return _montar_kanban(versao_atual, pedidos_do_kanban())
+
+
+async def acarregar_kanban():
+    versao_atual = await aversao('pedidos')
+    return _montar_kanban(versao_atual, [pedido async for pedido in pedidos_do_kanban()])
+
+
+def _totais_das_colunas():
+    return (
+        Pedido.objects.filter(finalizado=True, status__in=[status for _, status in COLUNAS_KANBAN])
+        .values_list('status').annotate(total=Count('id')).order_by()
+    )
+
+
+def _colunas_com_entradas(ids):
+    """ Todos os pedidos das colunas em que algum dos pedidos ids está agora (numa só consulta). """
+    if not ids:
+        return Pedido.objects.none()
+    return pedidos_do_kanban().filter(status__in=Pedido.objects.filter(id__in=ids, finalizado=True).values('status'))
+
+
+def _montar_mudancas(versao_atual, ids, pedidos, totais):
+    colunas = _colunas(totais, _separar(pedidos))
+    recebidas = {pedido.status for pedido in pedidos}
+    return {
+        'versao': versao_atual,
+        'alterados': sorted(ids),
+        'recebidas': [coluna for coluna in colunas if coluna['status'] in recebidas],
+        'colunas': colunas,
+    }
+
+
+def carregar_mudancas(desde):
+    """
+    Pedidos que mudaram depois da versão desde e o total de cada coluna, ou
+    None se o painel precisar ser carregado inteiro. Os pedidos em 'alterados'
+    saem do lugar onde estavam; as colunas em 'recebidas' (as do status atual
+    deles) são trocadas inteiras, para os cards ficarem na ordem certa.
+    """
+    mudancas = mudancas_desde('pedidos', desde, LIMITE_MUDANCAS)
+    if mudancas is None:
+        return None
+    versao_atual, ids = mudancas
+    return _montar_mudancas(versao_atual, ids, list(_colunas_com_entradas(ids)), dict(_totais_das_colunas()))
+
+
+async def acarregar_mudancas(desde):
+    mudancas = await amudancas_desde('pedidos', desde, LIMITE_MUDANCAS)
+    if mudancas is None:
+        return None
+    versao_atual, ids = mudancas
+    pedidos = [pedido async for pedido in _colunas_com_entradas(ids)]
+    totais = {status: total async for status, total in _totais_das_colunas()}
+    return _montar_mudancas(versao_atual, ids, pedidos, totais)
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from restaurant import exportacao
+from store.models import Pedido
+
+
+def _data(valor):
+    data = parse_date(valor)
+    if data is None:
+        raise ValueError(f'data inválida: {valor}')
+    return data
+
+
+class Command(BaseCommand):
+    help = 'Exporta os itens dos pedidos finalizados de um período em CSV ou JSON lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--inicio', type=_data, required=True, help='Primeiro dia (AAAA-MM-DD).')
+        parser.add_argument('--fim', type=_data, required=True, help='Último dia (AAAA-MM-DD).')
+        parser.add_argument(
+            '--status', action='append', default=[], choices=[valor for valor, _ in Pedido.STATUS_CHOICES],
+            help='Só pedidos com este status (pode repetir).',
+        )
+        parser.add_argument('--produto', type=int, action='append', default=[], help='Só itens deste produto (id; pode repetir).')
+        parser.add_argument('--formato', choices=sorted(exportacao.FORMATOS), default='csv')
+        parser.add_argument('--saida', help='Arquivo de destino (padrão: a saída padrão).')
+
+    def handle(self, *args, **options):
+        if options['inicio'] > options['fim']:
+            raise CommandError('A data inicial é posterior à final.')
+        blocos = exportacao.exportar(
+            options['formato'], options['inicio'], options['fim'], options['status'], options['produto'],
+        )
+        if not options['saida']:
+            for bloco in blocos:
+                self.stdout.write(bloco, ending='')
+            return
+        with open(options['saida'], 'w', encoding='utf-8', newline='') as arquivo:
+            for bloco in blocos:
+                arquivo.write(bloco)
+        self.stdout.write(self.style.SUCCESS(f'Pedidos exportados para {options["saida"]}.'))
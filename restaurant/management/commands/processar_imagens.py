@@ -0,0 +1,28 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from restaurant import imagens
+from restaurant.models import Produto
+
+
+class Command(BaseCommand):
+    help = 'Guarda pelo hash as imagens enviadas antes do pipeline e gera as variantes que faltarem.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todas', action='store_true', help='Regera também as imagens que já têm variantes, sobrescrevendo os arquivos das variantes.')
+
+    def handle(self, *args, **options):
+        produtos = Produto.objects.exclude(imagem='').exclude(imagem__isnull=True)
+        if not options['todas']:
+            produtos = produtos.filter(imagem_variantes={})
+        total = 0
+        for produto in produtos.iterator():
+            if not default_storage.exists(produto.imagem.name):
+                self.stderr.write(f'{produto}: arquivo {produto.imagem.name} não encontrado.')
+                continue
+            with default_storage.open(produto.imagem.name) as arquivo:
+                imagens.substituir(produto, arquivo)
+            produto.save(update_fields=['imagem', 'imagem_hash', 'imagem_variantes'])
+            imagens.processar(produto.pk, forcar=options['todas'])
+            total += 1
+        self.stdout.write(self.style.SUCCESS(f'{total} imagens processadas.'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from restaurant import busca
+
+
+class Command(BaseCommand):
+    help = 'Recria o índice de busca de produtos a partir da tabela de produtos.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            busca.reconstruir()
+        self.stdout.write(self.style.SUCCESS('Índice de busca reconstruído.'))
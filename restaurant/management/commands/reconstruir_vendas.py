@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from restaurant import vendas
+
+
+def _data(valor):
+    data = parse_date(valor)
+    if data is None:
+        raise ValueError(f'data inválida: {valor}')
+    return data
+
+
+class Command(BaseCommand):
+    help = 'Recalcula as tabelas de resumo de vendas a partir dos pedidos (todo o histórico ou um intervalo).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--inicio', type=_data, help='Primeiro dia (AAAA-MM-DD).')
+        parser.add_argument('--fim', type=_data, help='Último dia (AAAA-MM-DD).')
+
+    def handle(self, *args, **options):
+        vendas.reconstruir(options['inicio'], options['fim'])
+        self.stdout.write(self.style.SUCCESS('Resumos de vendas reconstruídos.'))
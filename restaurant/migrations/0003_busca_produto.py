@@ -0,0 +1,50 @@
+from django.db import migrations
+
+SQLITE_CRIAR = [
+    "CREATE VIRTUAL TABLE restaurant_produto_busca USING fts5("
+    "nome, descricao, tokenize = 'unicode61 remove_diacritics 2')",
+    "INSERT INTO restaurant_produto_busca (rowid, nome, descricao) "
+    "SELECT id, nome, descricao FROM restaurant_produto",
+]
+SQLITE_REMOVER = ["DROP TABLE IF EXISTS restaurant_produto_busca"]
+
+POSTGRES_CRIAR = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    """
+    DO $$ BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'pt_unaccent') THEN
+            CREATE TEXT SEARCH CONFIGURATION pt_unaccent (COPY = portuguese);
+            ALTER TEXT SEARCH CONFIGURATION pt_unaccent
+                ALTER MAPPING FOR hword, hword_part, word WITH unaccent, portuguese_stem;
+        END IF;
+    END $$
+    """,
+    "CREATE INDEX restaurant_produto_busca_gin ON restaurant_produto USING GIN (("
+    "setweight(to_tsvector('pt_unaccent', nome), 'A') || "
+    "setweight(to_tsvector('pt_unaccent', descricao), 'B')))",
+]
+POSTGRES_REMOVER = ["DROP INDEX IF EXISTS restaurant_produto_busca_gin"]
+
+
+def _executar(schema_editor, por_banco):
+    for sql in por_banco.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def criar_indice(apps, schema_editor):
+    _executar(schema_editor, {'sqlite': SQLITE_CRIAR, 'postgresql': POSTGRES_CRIAR})
+
+
+def remover_indice(apps, schema_editor):
+    _executar(schema_editor, {'sqlite': SQLITE_REMOVER, 'postgresql': POSTGRES_REMOVER})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0002_produto_imagem'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
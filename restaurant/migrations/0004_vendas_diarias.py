@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0003_busca_produto'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(unique=True, verbose_name='Data')),
+                ('pedidos', models.PositiveIntegerField(default=0, verbose_name='Pedidos')),
+                ('receita', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Receita')),
+            ],
+            options={
+                'verbose_name': 'Venda Diária',
+                'verbose_name_plural': 'Vendas Diárias',
+                'ordering': ['data'],
+            },
+        ),
+        migrations.CreateModel(
+            name='VendaProdutoDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(verbose_name='Data')),
+                ('nome_produto', models.CharField(blank=True, max_length=100, verbose_name='Nome do Produto')),
+                ('quantidade', models.PositiveIntegerField(default=0, verbose_name='Quantidade')),
+                ('receita', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Receita')),
+                ('produto', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='restaurant.produto', verbose_name='Produto')),
+            ],
+            options={
+                'verbose_name': 'Venda de Produto por Dia',
+                'verbose_name_plural': 'Vendas de Produtos por Dia',
+                'ordering': ['data'],
+                'unique_together': {('data', 'produto')},
+            },
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.core.files.storage import default_storage
 
 class Produto(models.Model):    
     nome = models.CharField(max_length=100, verbose_name="Nome")
@@ -7,11 +8,73 @@ class Produto(models.Model):
     preco = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Preço")    
     ativo = models.BooleanField(default=True, verbose_name="Ativo")
     imagem = models.ImageField(upload_to='produtos/', blank=True, null=True, verbose_name="Imagem")
+    # Preenchidos por restaurant.imagens: hash do conteúdo e {extensão: [[largura, arquivo], ...]}
+    imagem_hash = models.CharField(max_length=64, blank=True, editable=False, db_index=True)
+    imagem_variantes = models.JSONField(default=dict, blank=True, editable=False)
 
     class Meta:
         verbose_name = "Produto"
         verbose_name_plural = "Produtos"
         ordering = ['nome']
+        indexes = [
+            # Páginas do catálogo (ativos) e do painel (todos), na ordem do cursor (nome, id)
+            models.Index(fields=['nome', 'id'], condition=models.Q(ativo=True), name='produto_ativo_nome_idx'),
+            models.Index(fields=['nome', 'id'], name='produto_nome_idx'),
+        ]
 
     def __str__(self):
-        return self.nome
\ No newline at end of file
+        return self.nome
+
+    def _srcset(self, extensao):
+        return ', '.join(
+            f'{default_storage.url(nome)} {largura}w' for largura, nome in self.imagem_variantes.get(extensao, [])
+        )
+
+    @property
+    def imagem_fontes(self):
+        """ (tipo MIME, srcset) de cada formato moderno, para os <source> de um <picture>. """
+        return [(f'image/{extensao}', self._srcset(extensao)) for extensao in ('avif', 'webp') if extensao in self.imagem_variantes]
+
+    @property
+    def imagem_srcset(self):
+        return self._srcset('jpg')
+
+    @property
+    def imagem_url(self):
+        """ Menor variante JPEG (a que o <img> usa sem srcset); o original enquanto não houver variantes. """
+        if self.imagem_variantes.get('jpg'):
+            return default_storage.url(self.imagem_variantes['jpg'][0][1])
+        return self.imagem.url if self.imagem else ''
+
+
+class VendaDiaria(models.Model):
+    """ Resumo de pedidos e receita por dia, atualizado quando os pedidos são finalizados. """
+    data = models.DateField(unique=True, verbose_name="Data")
+    pedidos = models.PositiveIntegerField(default=0, verbose_name="Pedidos")
+    receita = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Receita")
+
+    class Meta:
+        verbose_name = "Venda Diária"
+        verbose_name_plural = "Vendas Diárias"
+        ordering = ['data']
+
+    def __str__(self):
+        return f"{self.data}: {self.pedidos} pedidos"
+
+
+class VendaProdutoDiaria(models.Model):
+    """ Unidades e receita de cada produto por dia. """
+    data = models.DateField(verbose_name="Data")
+    produto = models.ForeignKey(Produto, on_delete=models.SET_NULL, null=True, verbose_name="Produto")
+    nome_produto = models.CharField(max_length=100, blank=True, verbose_name="Nome do Produto")
+    quantidade = models.PositiveIntegerField(default=0, verbose_name="Quantidade")
+    receita = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Receita")
+
+    class Meta:
+        verbose_name = "Venda de Produto por Dia"
+        verbose_name_plural = "Vendas de Produtos por Dia"
+        unique_together = ('data', 'produto')
+        ordering = ['data']
+
+    def __str__(self):
+        return f"{self.data}: {self.quantidade}x {self.nome_produto}"
@@ -0,0 +1,77 @@
+"""
+Paginação por cursor das listagens de produtos.
+
+A listagem normal usa keyset em (nome, id): cada página é uma consulta
+``WHERE (nome, id) > (último nome, último id) ORDER BY nome, id LIMIT n``,
+que lê só as linhas da página, não importa o tamanho do catálogo. Os
+resultados de busca já vêm ordenados por relevância, então ali o cursor
+guarda a posição na lista ranqueada.
+
+A página é avaliada só quando o template acessa ``itens``, para que um
+fragmento em cache não dispare a consulta.
+"""
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+TAMANHO_PAGINA = 24
+
+
+def codificar_cursor(valor):
+    return base64.urlsafe_b64encode(json.dumps(valor, separators=(',', ':')).encode()).decode()
+
+
+def decodificar_cursor(cursor):
+    """ Valor guardado no cursor; None se ele estiver ausente ou inválido (volta para a primeira página). """
+    if not cursor:
+        return None
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, binascii.Error):
+        return None
+
+
+def _chave_valida(posicao):
+    """ [nome, id] como gerado por proximo_cursor; um cursor forjado com outros tipos volta para a primeira página. """
+    if not (isinstance(posicao, list) and len(posicao) == 2):
+        return False
+    nome, id_ = posicao
+    return isinstance(nome, str) and isinstance(id_, int) and not isinstance(id_, bool)
+
+
+class Pagina:
+    def __init__(self, queryset, cursor=None, tamanho=TAMANHO_PAGINA, ranqueada=False):
+        self.queryset = queryset
+        self.tamanho = tamanho
+        self.ranqueada = ranqueada
+        posicao = decodificar_cursor(cursor)
+        # Busca: deslocamento na lista ranqueada; listagem: último (nome, id) já exibido
+        self.inicio = posicao if isinstance(posicao, int) and posicao > 0 else 0
+        self.depois_de = posicao if _chave_valida(posicao) else None
+
+    @cached_property
+    def _linhas(self):
+        # Busca um item a mais só para saber se existe próxima página
+        if self.ranqueada:
+            return list(self.queryset[self.inicio:self.inicio + self.tamanho + 1])
+        queryset = self.queryset.order_by('nome', 'id')
+        if self.depois_de:
+            nome, id_ = self.depois_de
+            queryset = queryset.filter(Q(nome__gt=nome) | Q(nome=nome, id__gt=id_))
+        return list(queryset[:self.tamanho + 1])
+
+    @property
+    def itens(self):
+        return self._linhas[:self.tamanho]
+
+    @property
+    def proximo_cursor(self):
+        if len(self._linhas) <= self.tamanho:
+            return None
+        if self.ranqueada:
+            return codificar_cursor(self.inicio + self.tamanho)
+        ultimo = self._linhas[self.tamanho - 1]
+        return codificar_cursor([ultimo.nome, ultimo.id])
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from store.versoes import incrementar
+from . import busca
+from .models import Produto
+
+
+@receiver(post_save, sender=Produto)
+def produto_salvo(sender, instance, **kwargs):
+    busca.indexar(instance)
+    incrementar('produtos')
+
+
+@receiver(post_delete, sender=Produto)
+def produto_excluido(sender, instance, **kwargs):
+    busca.remover(instance.pk)
+    incrementar('produtos')
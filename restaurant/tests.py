@@ -1,3 +1,755 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import re
+import tempfile
+import tracemalloc
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image, features
+
+from store.estados import mudar_status
+from store.models import ItemPedido, ItemPedidoArquivado, Pedido, PedidoArquivado, PedidoEvento
+from iffood import perfil
+from iffood.orcamento import OrcamentoConsultasMixin, nomes_de_urls
+from . import busca, exportacao, imagens
+from .kanban import carregar_kanban
+from . import vendas
+from .models import Produto, VendaDiaria, VendaProdutoDiaria
+from .paginacao import Pagina, codificar_cursor
+
+
+def criar_pedidos(cliente, produtos, quantidade, status='solicitado'):
+    for _ in range(quantidade):
+        pedido = Pedido.objects.create(cliente=cliente, finalizado=True, status=status)
+        for produto in produtos:
+            ItemPedido.objects.create(pedido=pedido, produto=produto, quantidade=2)
+        pedido.registrar_precos()
+        pedido.atualizar_totais()
+
+
+class KanbanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('cozinha', password='senha', is_staff=True)
+        cls.cliente = User.objects.create_user('cliente', password='senha')
+        cls.produtos = [
+            Produto.objects.create(nome='Pizza', descricao='Calabresa', preco=Decimal('30.00')),
+            Produto.objects.create(nome='Refri', descricao='Lata', preco=Decimal('5.50')),
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_separa_pedidos_por_status(self):
+        criar_pedidos(self.cliente, self.produtos, 2, status='solicitado')
+        criar_pedidos(self.cliente, self.produtos, 1, status='em_preparo')
+        criar_pedidos(self.cliente, self.produtos, 1, status='limpo')
+
+        context = carregar_kanban()
+
+        self.assertEqual(len(context['pedidos_solicitados']), 2)
+        self.assertEqual(len(context['pedidos_em_preparo']), 1)
+        self.assertEqual(context['pedidos_em_entrega'], [])
+        self.assertEqual(context['pedidos_finalizados'], [])
+        self.assertEqual(context['pedidos_solicitados'][0].total_pedido, Decimal('71.00'))
+
+    def test_numero_de_consultas_nao_cresce_com_os_pedidos(self):
+        self.client.force_login(self.staff)
+        url = reverse('restaurant:gestao_pedidos')
+
+        criar_pedidos(self.cliente, self.produtos, 2)
+        with CaptureQueriesContext(connection) as poucos:
+            self.client.get(url, HTTP_HX_REQUEST='true')
+
+        for status in ('solicitado', 'em_preparo', 'saiu_para_entrega', 'entregue'):
+            criar_pedidos(self.cliente, self.produtos, 10, status=status)
+        with CaptureQueriesContext(connection) as muitos:
+            response = self.client.get(url, HTTP_HX_REQUEST='true')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'R$ 71.00')
+        self.assertEqual(len(poucos), len(muitos))
+
+    def test_carregamento_usa_duas_consultas(self):
+        criar_pedidos(self.cliente, self.produtos, 5)
+        with self.assertNumQueries(2):
+            context = carregar_kanban()
+            for pedido in context['pedidos_solicitados']:
+                pedido.cliente.username
+                [item.nome_produto for item in pedido.itempedido_set.all()]
+
+    def test_kanban_responde_304_ate_um_pedido_mudar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            criar_pedidos(self.cliente, self.produtos, 1)
+        self.client.force_login(self.staff)
+        url = reverse('restaurant:gestao_pedidos')
+        etag = self.client.get(url, HTTP_HX_REQUEST='true')['ETag']
+        response = self.client.get(url, HTTP_HX_REQUEST='true', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        pedido = Pedido.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('restaurant:aceitar_pedido', args=[pedido.id]))
+        response = self.client.get(url, HTTP_HX_REQUEST='true', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+    def test_polling_com_a_versao_traz_so_os_cards_alterados(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            criar_pedidos(self.cliente, self.produtos, 3)
+        aceito, recusado, parado = Pedido.objects.order_by('id')
+        self.client.force_login(self.staff)
+        url = reverse('restaurant:gestao_pedidos')
+        versao = self.client.get(url).context['versao']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            mudar_status('em_preparo', [aceito.id])
+            mudar_status('cancelado', [recusado.id])
+        response = self.client.get(url, {'versao': versao}, HTTP_HX_REQUEST='true')
+
+        self.assertEqual(response['HX-Reswap'], 'none')
+        conteudo = response.content.decode()
+        self.assertIn(f'<div id="pedido-{aceito.id}" hx-swap-oob="delete">', conteudo)
+        self.assertIn(f'<div id="pedido-{recusado.id}" hx-swap-oob="delete">', conteudo)
+        self.assertIn('hx-swap-oob="innerHTML:#coluna-em_preparo"', conteudo)
+        # O card aceito volta na nova coluna; o recusado e o que não mudou não vêm
+        self.assertEqual(conteudo.count('class="card order-card'), 1)
+        self.assertNotIn(f'pedido-{parado.id}', conteudo)
+        self.assertInHTML(
+            '<span id="contador-solicitado" class="badge bg-warning text-dark rounded-pill" hx-swap-oob="true">1</span>', conteudo
+        )
+        self.assertEqual(response.context['versao'], versao + 2)
+
+        # Já em dia: nada para trocar
+        response = self.client.get(url, {'versao': versao + 2}, HTTP_HX_REQUEST='true')
+        self.assertEqual(response.status_code, 204)
+
+    def test_colunas_atualizadas_ficam_na_ordem_da_renderizacao_completa(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            criar_pedidos(self.cliente, self.produtos, 4)
+        primeiro, segundo, terceiro, quarto = Pedido.objects.order_by('data_pedido')
+        self.client.force_login(self.staff)
+        url = reverse('restaurant:gestao_pedidos')
+        with self.captureOnCommitCallbacks(execute=True):
+            mudar_status('em_preparo', [quarto.id, terceiro.id])
+            mudar_status('saiu_para_entrega', [terceiro.id])
+            mudar_status('entregue', [terceiro.id])
+        versao = self.client.get(url).context['versao']
+
+        # Pedidos mais antigos chegam depois às colunas: entram na posição da data, não no fim (ou no início)
+        with self.captureOnCommitCallbacks(execute=True):
+            mudar_status('em_preparo', [primeiro.id, segundo.id])
+            mudar_status('saiu_para_entrega', [segundo.id])
+            mudar_status('entregue', [segundo.id])
+        conteudo = self.client.get(url, {'versao': versao}, HTTP_HX_REQUEST='true').content.decode()
+        completo = self.client.get(url, HTTP_HX_REQUEST='true').content.decode()
+        self.assertEqual(self.cards_da_coluna(conteudo, 'em_preparo'), [primeiro.id, quarto.id])
+        self.assertEqual(self.cards_da_coluna(conteudo, 'entregue'), [terceiro.id, segundo.id])
+        for status in ('em_preparo', 'entregue'):
+            self.assertEqual(self.cards_da_coluna(conteudo, status), self.cards_da_coluna(completo, status))
+        self.assertNotIn('#coluna-solicitado', conteudo)
+
+    def cards_da_coluna(self, conteudo, status):
+        # Da coluna até o fim do seu bloco, os ids dos cards na ordem em que aparecem
+        inicio = re.search(rf'(id="coluna-{status}"|#coluna-{status}")', conteudo).end()
+        bloco = conteudo[inicio:]
+        fim = re.search(r'(id="coluna-|#coluna-|id="rodape-|id="contador-)', bloco)
+        return [int(id_) for id_ in re.findall(r'id="pedido-(\d+)"', bloco[:fim.start()] if fim else bloco)]
+
+    def test_sem_as_mudancas_registradas_manda_o_painel_inteiro(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            criar_pedidos(self.cliente, self.produtos, 2)
+        self.client.force_login(self.staff)
+        url = reverse('restaurant:gestao_pedidos')
+        versao = self.client.get(url).context['versao']
+
+        # Cache reiniciado: o carimbo recomeça adiante e as mudanças se perdem
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            mudar_status('em_preparo', [Pedido.objects.first().id])
+        response = self.client.get(url, {'versao': versao}, HTTP_HX_REQUEST='true')
+        self.assertFalse(response.has_header('HX-Reswap'))
+        self.assertContains(response, 'class="card order-card', count=2)
+
+        # Sem versão (primeira requisição de uma aba antiga), também
+        response = self.client.get(url, HTTP_HX_REQUEST='true')
+        self.assertContains(response, 'class="card order-card', count=2)
+
+    def test_consultas_da_atualizacao_nao_crescem_com_as_mudancas(self):
+        self.client.force_login(self.staff)
+        url = reverse('restaurant:gestao_pedidos')
+        medidas = []
+        for quantidade in (1, 10):
+            with self.captureOnCommitCallbacks(execute=True):
+                criar_pedidos(self.cliente, self.produtos, quantidade)
+            versao = self.client.get(url).context['versao']
+            with self.captureOnCommitCallbacks(execute=True):
+                mudar_status('em_preparo')
+            with CaptureQueriesContext(connection) as consultas:
+                response = self.client.get(url, {'versao': versao}, HTTP_HX_REQUEST='true')
+            self.assertEqual(response['HX-Reswap'], 'none')
+            medidas.append(len(consultas))
+        self.assertEqual(medidas[0], medidas[1])
+
+    async def test_painel_assincrono_exige_a_equipe(self):
+        url = reverse('restaurant:gestao_pedidos')
+        self.assertEqual((await self.async_client.get(url)).status_code, 302)
+        await self.async_client.aforce_login(self.cliente)
+        self.assertEqual((await self.async_client.get(url)).status_code, 302)
+
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(url, headers={'HX-Request': 'true'})
+        self.assertEqual(response.status_code, 200)
+        response = await self.async_client.get(url, headers={'HX-Request': 'true', 'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+
+class BuscaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.pao = Produto.objects.create(nome='Pão de Queijo', descricao='Porção com 10 unidades', preco=Decimal('12.00'))
+        cls.pizza = Produto.objects.create(nome='Pizza Italiana', descricao='Massa de pão fininha', preco=Decimal('40.00'))
+        cls.suco = Produto.objects.create(nome='Suco', descricao='Laranja', preco=Decimal('8.00'))
+
+    def buscar(self, texto):
+        return list(busca.buscar(Produto.objects.all(), texto))
+
+    def test_ignora_acentos_e_casa_por_prefixo(self):
+        self.assertEqual(self.buscar('pao'), [self.pao, self.pizza])
+        self.assertEqual(self.buscar('PÃO'), [self.pao, self.pizza])
+        self.assertEqual(self.buscar('piz ital'), [self.pizza])
+        self.assertEqual(self.buscar('lasanha'), [])
+        self.assertEqual(self.buscar('!!!'), [])
+
+    def test_indice_acompanha_alteracoes_e_exclusoes(self):
+        self.suco.nome = 'Suco de Caju'
+        self.suco.save()
+        self.assertEqual(self.buscar('caju'), [self.suco])
+        self.suco.delete()
+        self.assertEqual(self.buscar('caju'), [])
+
+    def test_reconstruir_indice(self):
+        Produto.objects.filter(id=self.suco.id).update(nome='Limonada')
+        self.assertEqual(self.buscar('limonada'), [])
+        call_command('reconstruir_busca', stdout=StringIO())
+        self.assertEqual(self.buscar('limonada'), [Produto.objects.get(id=self.suco.id)])
+
+
+class PaginacaoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Nomes repetidos garantem que o desempate pelo id funciona
+        Produto.objects.bulk_create(
+            Produto(nome=f'Produto {n % 4}', descricao='Teste', preco=Decimal('1.00')) for n in range(11)
+        )
+
+    def percorrer(self, queryset, **kwargs):
+        vistos, cursor = [], None
+        while True:
+            with self.assertNumQueries(1):
+                pagina = Pagina(queryset, cursor, tamanho=3, **kwargs)
+                vistos += [produto.id for produto in pagina.itens]
+                cursor = pagina.proximo_cursor
+            if cursor is None:
+                return vistos
+
+    def test_percorre_o_catalogo_sem_repetir_nem_pular(self):
+        todos = list(Produto.objects.order_by('nome', 'id').values_list('id', flat=True))
+        self.assertEqual(self.percorrer(Produto.objects.all()), todos)
+
+    def test_resultados_ranqueados_mantem_a_ordem_da_busca(self):
+        resultados = busca.buscar(Produto.objects.all(), 'produto')
+        self.assertEqual(self.percorrer(resultados, ranqueada=True), [produto.id for produto in resultados])
+
+    def test_cursor_invalido_volta_para_a_primeira_pagina(self):
+        primeira = Pagina(Produto.objects.all(), tamanho=3).itens
+        self.assertEqual(Pagina(Produto.objects.all(), 'lixo!', tamanho=3).itens, primeira)
+
+    def test_cursor_forjado_volta_para_a_primeira_pagina(self):
+        primeira = list(Produto.objects.order_by('nome', 'id')[:24])
+        for valor in (['a', 'x'], ['a', [1]], [1, 2], ['a', True], {'a': 1}):
+            with self.subTest(valor):
+                cursor = codificar_cursor(valor)
+                self.assertEqual(Pagina(Produto.objects.all(), cursor, tamanho=3).itens, primeira[:3])
+                response = self.client.get(reverse('store:lista_produtos'), {'cursor': cursor})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(list(response.context['pagina'].itens), primeira)
+
+    def test_carregar_mais_no_painel(self):
+        Produto.objects.bulk_create(
+            Produto(nome=f'Extra {n:02}', descricao='Teste', preco=Decimal('1.00')) for n in range(20)
+        )
+        staff = User.objects.create_user('cozinha', password='senha', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(reverse('restaurant:visualizar_produto'))
+        self.assertEqual(response.content.decode().count('card-title'), 24)
+
+        cursor = response.context['pagina'].proximo_cursor
+        response = self.client.get(reverse('restaurant:visualizar_produto'), {'cursor': cursor})
+        self.assertEqual(response.content.decode().count('card-title'), 7)
+        self.assertNotContains(response, 'Carregar mais produtos')
+
+
+class VendasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('cozinha', password='senha', is_staff=True)
+        cls.cliente = User.objects.create_user('cliente', password='senha')
+        cls.pizza = Produto.objects.create(nome='Pizza', descricao='Calabresa', preco=Decimal('30.00'))
+        cls.refri = Produto.objects.create(nome='Refri', descricao='Lata', preco=Decimal('5.50'))
+
+    def setUp(self):
+        caches['carrinhos'].clear()
+
+    def comprar(self, *produtos):
+        self.client.force_login(self.cliente)
+        for produto in produtos:
+            self.client.post(reverse('store:adicionar_ao_carrinho', args=[produto.id]))
+        self.client.post(reverse('store:finalizar_pedido'))
+        return Pedido.objects.filter(cliente=self.cliente, finalizado=True).latest('id')
+
+    def test_finalizar_e_recusar_atualizam_os_resumos(self):
+        self.comprar(self.pizza, self.refri)
+        pedido = self.comprar(self.pizza)
+        dia = VendaDiaria.objects.get()
+        self.assertEqual((dia.pedidos, dia.receita), (2, Decimal('65.50')))
+        self.assertEqual(VendaProdutoDiaria.objects.get(produto=self.pizza).quantidade, 2)
+
+        self.client.force_login(self.staff)
+        self.client.post(reverse('restaurant:recusar_pedido', args=[pedido.id]))
+        self.client.post(reverse('restaurant:recusar_pedido', args=[pedido.id]))
+        dia.refresh_from_db()
+        self.assertEqual((dia.pedidos, dia.receita), (1, Decimal('35.50')))
+
+    def test_reconstruir_confere_com_o_incremental(self):
+        self.comprar(self.pizza, self.refri)
+        self.comprar(self.refri)
+        esperado = list(VendaProdutoDiaria.objects.order_by('produto_id').values_list('produto_id', 'quantidade', 'receita'))
+        VendaDiaria.objects.update(pedidos=0)
+        call_command('reconstruir_vendas', stdout=StringIO())
+        self.assertEqual(VendaDiaria.objects.get().pedidos, 2)
+        self.assertEqual(
+            list(VendaProdutoDiaria.objects.order_by('produto_id').values_list('produto_id', 'quantidade', 'receita')),
+            esperado,
+        )
+
+    def test_dashboard_le_apenas_os_resumos(self):
+        self.comprar(self.pizza, self.refri)
+        self.client.force_login(self.staff)
+        url = reverse('restaurant:dashboard')
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url)
+        self.assertContains(response, 'Pizza')
+        self.assertEqual(response.context['pedidos_hoje'], 1)
+        self.assertEqual(response.context['receita_periodo'], Decimal('35.50'))
+        tabelas = ' '.join(consulta['sql'] for consulta in consultas)
+        self.assertNotIn('"store_pedido"', tabelas)
+        self.assertNotIn('"store_itempedido"', tabelas)
+
+        response = self.client.get(url, {'inicio': '2000-01-01', 'fim': '2000-12-31'})
+        self.assertEqual(response.context['pedidos_periodo'], 0)
+        self.assertEqual(response.context['produtos_mais_pedidos'], [])
+
+
+def foto(largura, altura, cor='red', nome='foto.jpg'):
+    conteudo = BytesIO()
+    Image.new('RGB', (largura, altura), cor).save(conteudo, 'JPEG')
+    return SimpleUploadedFile(nome, conteudo.getvalue(), content_type='image/jpeg')
+
+
+class ImagensTests(TestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.media = pasta.name
+        configuracao = override_settings(MEDIA_ROOT=self.media, TAREFAS_IMEDIATAS=True)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        cache.clear()
+        self.client.force_login(User.objects.create_user('cozinha', password='senha', is_staff=True))
+
+    def enviar(self, nome, imagem):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('restaurant:adicionar_produto'), {
+                'nome': nome, 'descricao': 'Teste', 'preco': '10.00', 'ativo': 'on', 'imagem': imagem,
+            })
+        return Produto.objects.get(nome=nome)
+
+    def arquivos(self):
+        return sorted(
+            os.path.relpath(os.path.join(raiz, nome), self.media)
+            for raiz, _, nomes in os.walk(self.media) for nome in nomes
+        )
+
+    @skipUnless(features.check('avif'), 'Pillow sem suporte a AVIF')
+    def test_gera_variantes_nas_larguras_fixas(self):
+        produto = self.enviar('Pizza', foto(1200, 800))
+        self.assertEqual(produto.imagem.name, f'produtos/{produto.imagem_hash}.jpg')
+        self.assertEqual(set(produto.imagem_variantes), {'avif', 'webp', 'jpg'})
+        self.assertEqual([largura for largura, _ in produto.imagem_variantes['webp']], list(imagens.LARGURAS))
+        with Image.open(os.path.join(self.media, produto.imagem_variantes['avif'][1][1])) as variante:
+            self.assertEqual((variante.format, variante.size), ('AVIF', (640, 427)))
+
+        response = self.client.get(reverse('store:lista_produtos'))
+        self.assertContains(response, 'type="image/avif"')
+        self.assertContains(response, f'/media/produtos/variantes/{produto.imagem_hash}/960.webp 960w')
+        self.assertNotContains(response, produto.imagem.url + '"')
+
+    def test_pula_formatos_que_o_pillow_nao_grava(self):
+        with mock.patch.object(imagens.features, 'check', side_effect=lambda nome: nome != 'avif'):
+            produto = self.enviar('Pizza', foto(800, 600))
+        self.assertEqual(set(produto.imagem_variantes), {'webp', 'jpg'})
+        response = self.client.get(reverse('store:lista_produtos'))
+        self.assertNotContains(response, 'type="image/avif"')
+        self.assertContains(response, 'type="image/webp"')
+
+    def test_nao_amplia_imagens_pequenas(self):
+        produto = self.enviar('Refri', foto(200, 200))
+        self.assertEqual([largura for largura, _ in produto.imagem_variantes['jpg']], [200])
+
+    def test_mesmo_conteudo_reaproveita_arquivo_e_variantes(self):
+        primeiro = self.enviar('Coca', foto(800, 600, nome='coca.jpg'))
+        arquivos = self.arquivos()
+        with mock.patch.object(imagens, 'gerar_variantes') as gerar:
+            segundo = self.enviar('Coca Zero', foto(800, 600, nome='coca_zero.jpg'))
+        gerar.assert_not_called()
+        self.assertEqual(segundo.imagem.name, primeiro.imagem.name)
+        self.assertEqual(segundo.imagem_variantes, primeiro.imagem_variantes)
+        self.assertEqual(self.arquivos(), arquivos)
+
+    def test_processar_imagens_antigas(self):
+        caminho = os.path.join(self.media, 'produtos', 'antiga.jpg')
+        os.makedirs(os.path.dirname(caminho))
+        Image.new('RGB', (700, 500), 'blue').save(caminho)
+        produto = Produto.objects.create(nome='Antiga', descricao='Teste', preco=Decimal('1.00'), imagem='produtos/antiga.jpg')
+
+        call_command('processar_imagens', stdout=StringIO())
+        produto.refresh_from_db()
+        self.assertEqual(produto.imagem.name, f'produtos/{produto.imagem_hash}.jpg')
+        self.assertEqual([largura for largura, _ in produto.imagem_variantes['jpg']], [320, 640])
+
+    def test_processar_todas_regera_as_variantes(self):
+        produto = self.enviar('Pizza', foto(400, 300))
+        variante = os.path.join(self.media, produto.imagem_variantes['jpg'][0][1])
+        with open(variante, 'wb') as arquivo:
+            arquivo.write(b'corrompida')
+
+        call_command('processar_imagens', stdout=StringIO())
+        with open(variante, 'rb') as arquivo:
+            self.assertEqual(arquivo.read(), b'corrompida')
+
+        arquivos = self.arquivos()
+        call_command('processar_imagens', '--todas', stdout=StringIO())
+        with Image.open(variante) as imagem:
+            self.assertEqual(imagem.size, (320, 240))
+        # Sobrescritas no mesmo nome, sem cópias ao lado
+        self.assertEqual(self.arquivos(), arquivos)
+        produto.refresh_from_db()
+        self.assertEqual(produto.imagem_variantes['jpg'][0][1], os.path.relpath(variante, self.media))
+
+
+@override_settings(PERFIL_AMOSTRAGEM=1.0)
+class PerfilTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('cozinha', password='senha', is_staff=True)
+        cls.cliente = User.objects.create_user('cliente', password='senha')
+        cls.produtos = [Produto.objects.create(nome=f'Produto {n}', descricao='Teste', preco=Decimal('1.00')) for n in range(3)]
+
+    def setUp(self):
+        perfil.limpar()
+        self.addCleanup(perfil.limpar)
+        cache.clear()
+
+    def test_mede_consultas_templates_e_tamanho_por_endpoint(self):
+        criar_pedidos(self.cliente, self.produtos, 3)
+        self.client.force_login(self.staff)
+        for _ in range(3):
+            self.client.get(reverse('restaurant:gestao_pedidos'), HTTP_HX_REQUEST='true')
+        response = self.client.get(reverse('restaurant:gestao_pedidos'))
+
+        linhas = {linha['endpoint']: linha for linha in perfil.relatorio()}
+        parcial = linhas['restaurant:gestao_pedidos [htmx]']
+        self.assertEqual(parcial['amostras'], 3)
+        self.assertGreater(parcial['consultas_p95'], 0)
+        self.assertEqual(parcial['repetidas_max'], 0)
+        self.assertGreater(parcial['templates_p95'], 0)
+        self.assertGreater(linhas['restaurant:gestao_pedidos']['bytes_p95'], parcial['bytes_p95'])
+        self.assertEqual(linhas['restaurant:gestao_pedidos']['bytes_p95'], len(response.content))
+
+    def test_detecta_consultas_repetidas(self):
+        def n_mais_um(request):
+            for produto in Produto.objects.all():
+                Produto.objects.filter(id=produto.id).exists()
+            return HttpResponse('ok')
+
+        request = RequestFactory().get('/produtos/')
+        perfil.PerfilMiddleware(n_mais_um)(request)
+        linha, = perfil.relatorio()
+        self.assertEqual((linha['endpoint'], linha['consultas_p95'], linha['repetidas_max']), (perfil.NAO_RESOLVIDO, 4, 2))
+
+    def test_urls_desconhecidas_nao_criam_endpoints(self):
+        for n in range(50):
+            self.client.get(f'/nao-existe-{n}/')
+        self.assertEqual([linha['endpoint'] for linha in perfil.relatorio()], [perfil.NAO_RESOLVIDO])
+
+        with mock.patch.object(perfil, 'MAX_ENDPOINTS', 2):
+            for n in range(5):
+                perfil.registrar(f'view{n}', {'tempo': 0.0})
+        self.assertEqual(set(perfil._registros), {perfil.NAO_RESOLVIDO, 'view0', perfil.OUTROS})
+
+    @override_settings(PERFIL_AMOSTRAGEM=0)
+    def test_sem_amostragem_nada_e_medido(self):
+        self.client.get(reverse('store:lista_produtos'))
+        self.assertEqual(perfil.relatorio(), [])
+
+    def test_relatorio_so_para_a_equipe(self):
+        self.client.get(reverse('store:lista_produtos'))
+        self.client.force_login(self.cliente)
+        self.assertEqual(self.client.get(reverse('restaurant:desempenho')).status_code, 302)
+
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('restaurant:desempenho'))
+        self.assertContains(response, 'store:lista_produtos')
+        # Depois de zerar, só sobra a medição do próprio POST
+        self.client.post(reverse('restaurant:desempenho'))
+        self.assertEqual([linha['endpoint'] for linha in perfil.relatorio()], ['restaurant:desempenho'])
+
+
+class ExportacaoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('cozinha', password='senha', is_staff=True)
+        cls.cliente = User.objects.create_user('cliente', password='senha')
+        cls.pizza = Produto.objects.create(nome='Pizza', descricao='Calabresa', preco=Decimal('30.00'))
+        cls.refri = Produto.objects.create(nome='Refri', descricao='Lata', preco=Decimal('5.50'))
+        criar_pedidos(cls.cliente, [cls.pizza, cls.refri], 2, status='entregue')
+        criar_pedidos(cls.cliente, [cls.pizza], 1, status='cancelado')
+        # Um carrinho em aberto e um pedido já arquivado, de ontem
+        Pedido.objects.create(cliente=cls.cliente)
+        ontem = timezone.now() - timedelta(days=1)
+        arquivado = PedidoArquivado.objects.create(
+            id=9000, cliente=cls.cliente, data_pedido=ontem, status='entregue', total=Decimal('11.00'), quantidade_total=2,
+        )
+        ItemPedidoArquivado.objects.create(
+            pedido=arquivado, produto=cls.refri, quantidade=2, preco_unitario=Decimal('5.50'),
+            nome_produto='Refri', data_adicionado=ontem,
+        )
+        cls.hoje = timezone.localdate()
+        cls.ontem = cls.hoje - timedelta(days=1)
+
+    def exportar(self, **parametros):
+        self.client.force_login(self.staff)
+        parametros = {'inicio': self.ontem.isoformat(), 'fim': self.hoje.isoformat(), **parametros}
+        return self.client.get(reverse('restaurant:exportar_pedidos'), parametros)
+
+    def test_csv(self):
+        response = self.exportar()
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn(f'pedidos-{self.ontem}-a-{self.hoje}.csv', response['Content-Disposition'])
+        linhas = list(csv.reader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(linhas[0], exportacao.CAMPOS)
+        # Arquivado primeiro; o carrinho em aberto fica de fora
+        self.assertEqual(len(linhas), 1 + 1 + 5)
+        self.assertEqual(linhas[1][0], '9000')
+        self.assertEqual(linhas[1][-4:], ['Refri', '2', '5.50', '11.00'])
+        self.assertEqual([linha[2] for linha in linhas[2:]], ['entregue'] * 4 + ['cancelado'])
+
+    def test_csv_neutraliza_formulas(self):
+        atacante = User.objects.create_user('=HYPERLINK("http://exemplo.com","x")', password='senha')
+        produto = Produto.objects.create(nome='@SUM(1+1)', descricao='Teste', preco=Decimal('-1.00'))
+        criar_pedidos(atacante, [produto], 1)
+        response = self.exportar(produto=produto.id, inicio=self.hoje.isoformat())
+        linha = list(csv.reader(StringIO(b''.join(response.streaming_content).decode())))[1]
+        self.assertEqual(linha[3], '\'=HYPERLINK("http://exemplo.com","x")')
+        self.assertEqual(linha[6], "'@SUM(1+1)")
+        # Números continuam números
+        self.assertEqual(linha[8], '-1.00')
+
+    def test_jsonl_com_filtros(self):
+        response = self.exportar(formato='jsonl', status='entregue', produto=self.pizza.id, inicio=self.hoje.isoformat())
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        linhas = [json.loads(linha) for linha in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(linhas), 2)
+        self.assertEqual(
+            {(linha['nome_produto'], linha['status'], linha['quantidade'], linha['subtotal']) for linha in linhas},
+            {('Pizza', 'entregue', 2, '60.00')},
+        )
+
+    def test_parametros_invalidos_e_acesso(self):
+        self.assertEqual(self.exportar(inicio='ontem').status_code, 400)
+        self.assertEqual(self.exportar(inicio=self.hoje.isoformat(), fim=self.ontem.isoformat()).status_code, 400)
+        self.assertEqual(self.exportar(formato='xlsx').status_code, 400)
+        self.client.force_login(self.cliente)
+        response = self.client.get(reverse('restaurant:exportar_pedidos'), {'inicio': '2000-01-01', 'fim': '2000-01-02'})
+        self.assertEqual(response.status_code, 302)
+
+    async def test_streaming_assincrono(self):
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(
+            reverse('restaurant:exportar_pedidos'), {'inicio': self.ontem.isoformat(), 'fim': self.hoje.isoformat()}
+        )
+        self.assertTrue(response.is_async)
+        conteudo = b''.join([bloco async for bloco in response.streaming_content]).decode()
+        self.assertEqual(len(conteudo.splitlines()), 1 + 1 + 5)
+
+    def test_comando(self):
+        with tempfile.TemporaryDirectory() as pasta:
+            saida = os.path.join(pasta, 'pedidos.csv')
+            call_command(
+                'exportar_pedidos', '--inicio', self.hoje.isoformat(), '--fim', self.hoje.isoformat(),
+                '--status', 'cancelado', '--saida', saida, stdout=StringIO(),
+            )
+            with open(saida, encoding='utf-8', newline='') as arquivo:
+                linhas = list(csv.reader(arquivo))
+        self.assertEqual(len(linhas), 2)
+        self.assertEqual((linhas[1][2], linhas[1][6]), ('cancelado', 'Pizza'))
+
+        saida = StringIO()
+        call_command('exportar_pedidos', '--inicio', self.ontem.isoformat(), '--fim', self.ontem.isoformat(), '--formato', 'jsonl', stdout=saida)
+        self.assertEqual(json.loads(saida.getvalue())['pedido'], 9000)
+
+    def test_memoria_nao_cresce_com_as_linhas(self):
+        def pico(quantidade):
+            pedidos = Pedido.objects.bulk_create(
+                Pedido(cliente=self.cliente, finalizado=True, status='entregue', total=Decimal('30.00'), quantidade_total=1)
+                for _ in range(quantidade)
+            )
+            ItemPedido.objects.bulk_create(
+                ItemPedido(pedido=pedido, produto=self.pizza, quantidade=1, preco_unitario=Decimal('30.00'), nome_produto='Pizza')
+                for pedido in pedidos
+            )
+            tracemalloc.start()
+            try:
+                total = sum(len(bloco) for bloco in exportacao.exportar('csv', self.ontem, self.hoje))
+                return total, tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        with mock.patch.object(exportacao, 'TAMANHO_LOTE', 100), mock.patch.object(exportacao, 'TAMANHO_BLOCO', 4096):
+            pico(0)
+            tamanho_menor, menor = pico(1000)
+            tamanho_maior, maior = pico(4000)
+        self.assertGreater(tamanho_maior, 4 * tamanho_menor)
+        # Cinco vezes mais linhas, praticamente o mesmo pico de memória
+        self.assertLess(maior, menor * 1.5)
+
+
+class OrcamentoConsultasTests(OrcamentoConsultasMixin, TestCase):
+    """ Máximo de consultas de cada URL do restaurante, que não pode crescer com os dados. """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('cozinha', password='senha', is_staff=True)
+        cls.cliente = User.objects.create_user('cliente', password='senha')
+
+    def povoar(self, quantidade):
+        novos = Produto.objects.bulk_create(
+            Produto(nome=f'Produto {n}', descricao='Teste', preco=Decimal('10.00')) for n in range(quantidade)
+        )
+        # Pedidos em cada coluna do painel, um item cada, com o histórico até o status atual
+        etapas = ('solicitado', 'em_preparo', 'saiu_para_entrega', 'entregue')
+        for indice, status in enumerate(etapas):
+            pedidos = Pedido.objects.bulk_create(
+                Pedido(cliente=self.cliente, finalizado=True, status=status, total=Decimal('20.00'), quantidade_total=2)
+                for _ in range(quantidade)
+            )
+            ItemPedido.objects.bulk_create(
+                ItemPedido(pedido=pedido, produto=produto, quantidade=2, preco_unitario=produto.preco, nome_produto=produto.nome)
+                for pedido, produto in zip(pedidos, novos)
+            )
+            PedidoEvento.objects.bulk_create(
+                PedidoEvento(pedido_id=pedido.id, status=etapa) for pedido in pedidos for etapa in etapas[:indice + 1]
+            )
+        # Vendas de hoje a partir dos pedidos e um dia a mais de histórico por linha
+        hoje = timezone.localdate()
+        vendas.reconstruir(inicio=hoje)
+        dias = [hoje - timedelta(days=VendaDiaria.objects.count() + n) for n in range(quantidade)]
+        VendaDiaria.objects.bulk_create(VendaDiaria(data=dia, pedidos=1, receita=Decimal('20.00')) for dia in dias)
+        VendaProdutoDiaria.objects.bulk_create(
+            VendaProdutoDiaria(data=dia, produto=produto, nome_produto=produto.nome, quantidade=2, receita=Decimal('20.00'))
+            for dia in dias for produto in novos
+        )
+
+    def orcamentos(self):
+        staff = self.staff
+        produto = lambda: Produto.objects.order_by('id').first().id
+        pedido = lambda status: lambda: Pedido.objects.filter(status=status).first().id
+        todos = lambda status: list(Pedido.objects.filter(status=status).values_list('id', flat=True))
+        produto_novo = {'nome': 'Novo', 'descricao': 'Teste', 'preco': '12.50'}
+        hx = {'HTTP_HX_REQUEST': 'true'}
+
+        def em_lote(status, origem):
+            # Todos os pedidos da coluna de origem, que só existem depois de povoar
+            def preparar(tamanho):
+                self.client.force_login(staff)
+                dados = {'status': status, 'pedidos': todos(origem)}
+                return lambda: self.client.post(reverse('restaurant:mudar_status_em_lote'), dados, **hx)
+            return preparar
+
+        def exportar(filtros):
+            # A resposta é um stream: as consultas das linhas só rodam quando ela é lida
+            def preparar(tamanho):
+                self.client.force_login(staff)
+                hoje = timezone.localdate().isoformat()
+                dados = {'inicio': hoje, 'fim': hoje, **{campo: valor() if callable(valor) else valor for campo, valor in filtros.items()}}
+
+                def requisitar():
+                    response = self.client.get(reverse('restaurant:exportar_pedidos'), dados)
+                    b''.join(response.streaming_content)
+                    return response
+                return requisitar
+            return preparar
+
+        return [
+            ('restaurant:login', 0, self.requisicao(None, 'get', 'restaurant:login')),
+            ('restaurant:cadastro', 0, self.requisicao(None, 'get', 'restaurant:cadastro')),
+            ('restaurant:logout', 4, self.requisicao(staff, 'post', 'restaurant:logout')),
+            ('restaurant:visualizar_produto', 3, self.requisicao(staff, 'get', 'restaurant:visualizar_produto')),
+            ('restaurant:visualizar_produto', 3, self.requisicao(staff, 'get', 'restaurant:visualizar_produto', **hx)),
+            ('restaurant:adicionar_produto', 2, self.requisicao(staff, 'get', 'restaurant:adicionar_produto')),
+            ('restaurant:adicionar_produto', 5, self.requisicao(staff, 'post', 'restaurant:adicionar_produto', data=produto_novo)),
+            ('restaurant:editar_produto', 3, self.requisicao(staff, 'get', 'restaurant:editar_produto', produto)),
+            ('restaurant:editar_produto', 6, self.requisicao(staff, 'post', 'restaurant:editar_produto', produto, data=produto_novo)),
+            ('restaurant:deletar_produto', 3, self.requisicao(staff, 'get', 'restaurant:deletar_produto', produto)),
+            ('restaurant:deletar_produto', 8, self.requisicao(staff, 'post', 'restaurant:deletar_produto', produto)),
+            ('restaurant:gestao_pedidos', 4, self.requisicao(staff, 'get', 'restaurant:gestao_pedidos')),
+            ('restaurant:gestao_pedidos', 4, self.requisicao(staff, 'get', 'restaurant:gestao_pedidos', **hx)),
+            ('restaurant:eventos_kanban', 2, self.requisicao(staff, 'get', 'restaurant:eventos_kanban')),
+            ('restaurant:detalhes_pedido', 4, self.requisicao(staff, 'get', 'restaurant:detalhes_pedido', pedido('solicitado'), **hx)),
+            ('restaurant:aceitar_pedido', 10, self.requisicao(staff, 'post', 'restaurant:aceitar_pedido', pedido('solicitado'), **hx)),
+            ('restaurant:marcar_como_em_entrega', 10, self.requisicao(
+                staff, 'post', 'restaurant:marcar_como_em_entrega', pedido('em_preparo'), **hx)),
+            ('restaurant:marcar_como_finalizado', 10, self.requisicao(
+                staff, 'post', 'restaurant:marcar_como_finalizado', pedido('saiu_para_entrega'), **hx)),
+            ('restaurant:recusar_pedido', 15, self.requisicao(staff, 'post', 'restaurant:recusar_pedido', pedido('solicitado'), **hx)),
+            ('restaurant:mudar_status_em_lote', 9, em_lote('em_preparo', 'solicitado')),
+            ('restaurant:mudar_status_em_lote', 14, em_lote('cancelado', 'solicitado')),
+            ('restaurant:limpar_finalizados', 9, self.requisicao(staff, 'post', 'restaurant:limpar_finalizados', **hx)),
+            ('restaurant:dashboard', 6, self.requisicao(staff, 'get', 'restaurant:dashboard')),
+            ('restaurant:desempenho', 2, self.requisicao(staff, 'get', 'restaurant:desempenho')),
+            ('restaurant:historico_pedidos', 3, self.requisicao(staff, 'get', 'restaurant:historico_pedidos')),
+            ('restaurant:exportar_pedidos', 4, exportar({})),
+            ('restaurant:exportar_pedidos', 5, exportar({'formato': 'jsonl', 'status': 'entregue', 'produto': produto})),
+        ]
+
+    def test_todas_as_urls_tem_orcamento(self):
+        self.assertEqual(set(nomes_de_urls('restaurant.urls')), {nome for nome, _, _ in self.orcamentos()})
+
+    def test_orcamentos(self):
+        self.assertOrcamentos(self.orcamentos())
@@ -20,6 +20,7 @@ urlpatterns = [
 
     # PAINEL DE GESTÃO DE PEDIDOS (sem alterações aqui)
     path('pedidos/', views.gestao_pedidos, name='gestao_pedidos'),
+    path('pedidos/eventos/', views.eventos_kanban, name='eventos_kanban'),
     
     # URLS PARA HTMX do Kanban (ainda necessárias para o painel de pedidos)
     path('pedidos/detalhes/<int:pedido_id>/', views.detalhes_pedido, name='detalhes_pedido'),
@@ -29,8 +30,12 @@ urlpatterns = [
 
     # Adicione esta linha no início do urlpatterns
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('desempenho/', views.desempenho, name='desempenho'),
 
     # NOVAS ROTAS
     path('pedidos/recusar/<int:pedido_id>/', views.recusar_pedido, name='recusar_pedido'),
     path('pedidos/limpar-finalizados/', views.limpar_finalizados, name='limpar_finalizados'),
+    path('pedidos/status/', views.mudar_status_em_lote, name='mudar_status_em_lote'),
+    path('pedidos/historico/', views.historico_pedidos, name='historico_pedidos'),
+    path('pedidos/exportar/', views.exportar_pedidos, name='exportar_pedidos'),
 ]
\ No newline at end of file
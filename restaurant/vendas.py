@@ -0,0 +1,174 @@
+"""
+Tabelas de resumo de vendas (VendaDiaria e VendaProdutoDiaria).
+
+Cada pedido é somado ao resumo do dia quando o cliente o finaliza e
+estornado se a cozinha o recusar; o dashboard lê apenas essas tabelas,
+então o custo dele não cresce com o histórico de pedidos.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DecimalField, F, Max, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from store.models import ItemPedido, ItemPedidoArquivado, Pedido, PedidoArquivado
+from .models import VendaDiaria, VendaProdutoDiaria
+
+
+def _somar(modelo, chave, valores, padrao=None):
+    """ Incrementa os campos da linha (data, ...) com um UPDATE atômico, criando a linha se ainda não existir. """
+    incrementos = {campo: F(campo) + valor for campo, valor in valores.items()}
+    if modelo.objects.filter(**chave).update(**incrementos):
+        return
+    try:
+        with transaction.atomic():
+            modelo.objects.create(**chave, **valores, **(padrao or {}))
+    except IntegrityError:
+        # Outra requisição criou a linha primeiro
+        modelo.objects.filter(**chave).update(**incrementos)
+
+
+def _somar_produtos(data, itens, sinal):
+    """
+    Soma os itens às linhas (data, produto) com um número fixo de consultas,
+    qualquer que seja o número de itens: um UPDATE para as linhas que já
+    existem e um INSERT em lote para as que faltam.
+    """
+    valores, nomes = {}, {}
+    for item in itens:
+        quantidade, receita = valores.get(item.produto_id, (0, 0))
+        valores[item.produto_id] = (quantidade + sinal * item.quantidade, receita + sinal * item.subtotal)
+        nomes[item.produto_id] = item.nome_produto
+    linhas = VendaProdutoDiaria.objects.filter(data=data, produto_id__in=list(valores))
+    existentes = set(linhas.values_list('produto_id', flat=True))
+    if existentes:
+        def por_produto(indice, campo):
+            casos = [When(produto_id=produto_id, then=Value(valores[produto_id][indice])) for produto_id in existentes]
+            return F(campo) + Case(*casos, output_field=VendaProdutoDiaria._meta.get_field(campo))
+        linhas.filter(produto_id__in=existentes).update(
+            quantidade=por_produto(0, 'quantidade'), receita=por_produto(1, 'receita'),
+        )
+    novos = [produto_id for produto_id in valores if produto_id not in existentes]
+    if not novos:
+        return
+    try:
+        with transaction.atomic():
+            VendaProdutoDiaria.objects.bulk_create(
+                VendaProdutoDiaria(data=data, produto_id=produto_id, nome_produto=nomes[produto_id],
+                                   quantidade=valores[produto_id][0], receita=valores[produto_id][1])
+                for produto_id in novos
+            )
+    except IntegrityError:
+        # Outra requisição criou alguma dessas linhas primeiro: soma uma a uma
+        for produto_id in novos:
+            _somar(
+                VendaProdutoDiaria,
+                {'data': data, 'produto_id': produto_id},
+                {'quantidade': valores[produto_id][0], 'receita': valores[produto_id][1]},
+                padrao={'nome_produto': nomes[produto_id]},
+            )
+
+
+def registrar_vendas(pedidos, sinal=1):
+    """
+    Soma os pedidos ao resumo dos dias em que foram feitos (ou estorna, com
+    sinal=-1). As consultas crescem com o número de dias, não de pedidos;
+    os itens devem vir pré-carregados (prefetch_related('itempedido_set')).
+    """
+    por_dia = {}
+    for pedido in pedidos:
+        por_dia.setdefault(timezone.localdate(pedido.data_pedido), []).append(pedido)
+    for data, do_dia in por_dia.items():
+        receita = sum(pedido.total for pedido in do_dia)
+        _somar(VendaDiaria, {'data': data}, {'pedidos': sinal * len(do_dia), 'receita': sinal * receita})
+        itens = [item for pedido in do_dia for item in pedido.itempedido_set.all()]
+        _somar_produtos(data, [item for item in itens if item.produto_id is not None], sinal)
+        # Itens de produtos já excluídos (só num estorno): o NULL não casa na busca em lote
+        for item in itens:
+            if item.produto_id is None:
+                _somar(
+                    VendaProdutoDiaria,
+                    {'data': data, 'produto_id': None},
+                    {'quantidade': sinal * item.quantidade, 'receita': sinal * item.subtotal},
+                    padrao={'nome_produto': item.nome_produto},
+                )
+
+
+def registrar_venda(pedido, sinal=1):
+    """ Soma o pedido ao resumo do dia em que foi feito (ou estorna, com sinal=-1). """
+    registrar_vendas([pedido], sinal)
+
+
+def estornar_vendas(pedidos):
+    registrar_vendas(pedidos, sinal=-1)
+
+
+def _inicio_do_dia(data):
+    return timezone.make_aware(datetime.combine(data, time.min))
+
+
+def _resumir(pedidos, itens):
+    """ Pedidos/receita por dia e quantidade/receita por (dia, produto) de um par de querysets. """
+    resumo_dias = (
+        pedidos.annotate(dia=TruncDate('data_pedido')).values('dia')
+        .annotate(total_pedidos=Count('id'), total_receita=Sum('total'))
+        .order_by()
+    )
+    resumo_produtos = (
+        itens.annotate(dia=TruncDate('pedido__data_pedido')).values('dia', 'produto_id')
+        .annotate(
+            nome=Max('nome_produto'),
+            total_quantidade=Sum('quantidade'),
+            total_receita=Sum(
+                F('quantidade') * Coalesce('preco_unitario', 'produto__preco'),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
+        .order_by()
+    )
+    return resumo_dias, resumo_produtos
+
+
+def reconstruir(inicio=None, fim=None):
+    """
+    Recalcula os resumos a partir dos pedidos, no intervalo de datas
+    informado (ou em todo o histórico), somando os pedidos recentes e os arquivados.
+    """
+    fontes = [
+        Pedido.objects.filter(finalizado=True).exclude(status='cancelado'),
+        PedidoArquivado.objects.exclude(status='cancelado'),
+    ]
+    diarias = VendaDiaria.objects.all()
+    por_produto = VendaProdutoDiaria.objects.all()
+    # Limites como intervalos de data/hora, para o filtro usar o índice de data_pedido
+    if inicio:
+        fontes = [pedidos.filter(data_pedido__gte=_inicio_do_dia(inicio)) for pedidos in fontes]
+        diarias = diarias.filter(data__gte=inicio)
+        por_produto = por_produto.filter(data__gte=inicio)
+    if fim:
+        fontes = [pedidos.filter(data_pedido__lt=_inicio_do_dia(fim + timedelta(days=1))) for pedidos in fontes]
+        diarias = diarias.filter(data__lte=fim)
+        por_produto = por_produto.filter(data__lte=fim)
+
+    dias, produtos = {}, {}
+    for pedidos, modelo_item in zip(fontes, (ItemPedido, ItemPedidoArquivado)):
+        resumo_dias, resumo_produtos = _resumir(pedidos, modelo_item.objects.filter(pedido__in=pedidos))
+        for linha in resumo_dias:
+            dia = dias.setdefault(linha['dia'], VendaDiaria(data=linha['dia'], pedidos=0, receita=0))
+            dia.pedidos += linha['total_pedidos']
+            dia.receita += linha['total_receita'] or 0
+        for linha in resumo_produtos:
+            produto = produtos.setdefault(
+                (linha['dia'], linha['produto_id']),
+                VendaProdutoDiaria(data=linha['dia'], produto_id=linha['produto_id'], quantidade=0, receita=0),
+            )
+            produto.nome_produto = max(produto.nome_produto, linha['nome'] or '')
+            produto.quantidade += linha['total_quantidade']
+            produto.receita += linha['total_receita'] or 0
+
+    with transaction.atomic():
+        diarias.delete()
+        por_produto.delete()
+        VendaDiaria.objects.bulk_create(dias.values())
+        VendaProdutoDiaria.objects.bulk_create(produtos.values())
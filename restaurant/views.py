@@ -1,19 +1,35 @@
+from django.conf import settings
 from django.shortcuts import redirect, render, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.views import LoginView
 from django.http import JsonResponse
-from .models import Produto
+from .models import Produto, VendaDiaria, VendaProdutoDiaria
 from .forms import ProdutoForm
-from store.models import Pedido
-from django.http import HttpResponse
+from store.estados import TransicaoInvalida, mudar_status
+from store.historico import LIMITE_EVENTOS, eventos_desde, tempos_medios
+from store.eventos import CANAL_KANBAN, resposta_sse
+from store.models import ItemPedido, Pedido
+from store.replicas import ler_da_replica
+from store.versoes import aversao
+from django.core.handlers.asgi import ASGIRequest
+from django.db import router
+from django.http import HttpResponse, StreamingHttpResponse
+from django_htmx.http import reswap
 from django.utils import timezone
-from django.db.models import Count, Sum
-from store.models import ItemPedido
+from django.db.models import Max, Q, Sum
+from django.db.models.functions import Coalesce
 import json
+from decimal import Decimal
+from django.views.decorators.cache import cache_control
 from django.views.decorators.http import require_POST
 from django.contrib.auth import login
 from django.contrib.auth.decorators import user_passes_test
-from .forms import RestauranteCreationForm
+from .forms import ExportacaoForm, PeriodoForm, RestauranteCreationForm
+from .kanban import acarregar_kanban, acarregar_mudancas, carregar_kanban, carregar_mudancas
+from . import exportacao
+from .paginacao import Pagina
+from iffood import perfil
+from iffood.assincrono import equipe_requerida, etag_assincrono, iterar_em_thread
 
 
 # --- CADASTRO DO RESTAURANTE ---
@@ -36,8 +52,11 @@ class CustomLoginView(LoginView):
 @user_passes_test(lambda u: u.is_staff)
 @login_required
 def visualizar_produto(request):
-    produtos = Produto.objects.all().order_by('nome')
-    context = {'produtos': produtos}
+    # Página por cursor (nome, id); o "carregar mais" pede só os cards seguintes
+    cursor = request.GET.get('cursor', '')
+    context = {'pagina': Pagina(Produto.objects.all(), cursor), 'cursor': cursor}
+    if cursor:
+        return render(request, 'restaurant/partials/_pagina_produtos.html', context)
     return render(request, 'restaurant/product_list.html', context)
 
 @user_passes_test(lambda u: u.is_staff)
@@ -90,113 +109,225 @@ def deletar_produto(request, pk):
     context = {'object': produto}
     return render(request, 'restaurant/partials/_delete_partial.html', context)
 
-@user_passes_test(lambda u: u.is_staff)
-@login_required
-def gestao_pedidos(request):
-    pedidos_solicitados = Pedido.objects.filter(finalizado=True, status='solicitado').order_by('data_pedido')
-    pedidos_em_preparo = Pedido.objects.filter(finalizado=True, status='em_preparo').order_by('data_pedido')
-    pedidos_em_entrega = Pedido.objects.filter(finalizado=True, status='saiu_para_entrega').order_by('data_pedido')
-    # Não mostramos os limpos no painel principal
-    pedidos_finalizados = Pedido.objects.filter(finalizado=True, status='entregue').order_by('-data_pedido')
+async def _etag_kanban(request):
+    # Só o carimbo dos pedidos: um 304 não consulta nem renderiza o painel
+    return f"kanban-{await aversao('pedidos')}-{request.GET.get('versao', '')}-{request.user.pk}-{int(bool(request.htmx))}"
 
-    context = {
-        'pedidos_solicitados': pedidos_solicitados,
-        'pedidos_em_preparo': pedidos_em_preparo,
-        'pedidos_em_entrega': pedidos_em_entrega,
-        'pedidos_finalizados': pedidos_finalizados,
-    }
-    
-    # Se a requisição for do HTMX (polling), renderiza só o conteúdo do painel
+# Assíncrona: sob ASGI, os tablets da cozinha fazendo polling não ocupam uma thread cada
+@equipe_requerida
+@cache_control(private=True, no_cache=True)
+@etag_assincrono(_etag_kanban)
+@ler_da_replica('pedidos')
+async def gestao_pedidos(request):
+    # Se a requisição for do HTMX (polling), responde só com o que mudou no painel
     if request.htmx:
-        return render(request, 'restaurant/partials/_kanban_content_partial.html', context)
+        return await _aatualizar_kanban(request)
         
-    return render(request, 'restaurant/gestao_pedidos.html', context)
+    return render(request, 'restaurant/gestao_pedidos.html', await acarregar_kanban())
+
+# Canal SSE que avisa o painel quando algum pedido muda de status
+@equipe_requerida
+async def eventos_kanban(request):
+    return resposta_sse(request, [CANAL_KANBAN])
 
 @user_passes_test(lambda u: u.is_staff)
 @login_required
 def detalhes_pedido(request, pedido_id):
-    pedido = get_object_or_404(Pedido, id=pedido_id)
+    pedido = get_object_or_404(Pedido.objects.select_related('cliente').prefetch_related('itempedido_set'), id=pedido_id)
     return render(request, 'restaurant/partials/_modal_detalhes_pedido.html', {'pedido': pedido})
 
-def _recarregar_kanban(request):
-    """Função auxiliar para renderizar apenas o conteúdo do painel Kanban."""
-    pedidos_solicitados = Pedido.objects.filter(finalizado=True, status='solicitado').order_by('data_pedido')
-    pedidos_em_preparo = Pedido.objects.filter(finalizado=True, status='em_preparo').order_by('data_pedido')
-    pedidos_em_entrega = Pedido.objects.filter(finalizado=True, status='saiu_para_entrega').order_by('data_pedido')
-    pedidos_finalizados = Pedido.objects.filter(finalizado=True, status='entregue').order_by('-data_pedido')
-    context = {
-        'pedidos_solicitados': pedidos_solicitados,
-        'pedidos_em_preparo': pedidos_em_preparo,
-        'pedidos_em_entrega': pedidos_em_entrega,
-        'pedidos_finalizados': pedidos_finalizados,
-    }
-    return render(request, 'restaurant/partials/_kanban_content_partial.html', context)
+def _versao_do_cliente(request):
+    desde = request.POST.get('versao') or request.GET.get('versao') or ''
+    return int(desde) if desde.isdigit() else None
+
+def _resposta_mudancas(request, desde, mudancas):
+    if mudancas['versao'] == desde:
+        # Nada mudou: o HTMX não mexe no painel
+        return HttpResponse(status=204)
+    # O alvo da requisição (o painel inteiro) fica como está; só os fragmentos são trocados
+    return reswap(render(request, 'restaurant/partials/_kanban_mudancas.html', mudancas), 'none')
+
+def _atualizar_kanban(request):
+    """
+    Atualiza o painel a partir da versão que o cliente tem (parâmetro 'versao'):
+    só os cards que mudaram, como fragmentos fora de banda, ou o painel
+    inteiro se o cliente não mandou a versão ou ficou para trás demais.
+    """
+    desde = _versao_do_cliente(request)
+    mudancas = None if desde is None else carregar_mudancas(desde)
+    if mudancas is None:
+        return render(request, 'restaurant/partials/_kanban_content_partial.html', carregar_kanban())
+    return _resposta_mudancas(request, desde, mudancas)
+
+async def _aatualizar_kanban(request):
+    desde = _versao_do_cliente(request)
+    mudancas = None if desde is None else await acarregar_mudancas(desde)
+    if mudancas is None:
+        return render(request, 'restaurant/partials/_kanban_content_partial.html', await acarregar_kanban())
+    return _resposta_mudancas(request, desde, mudancas)
 
+def _mudar_status(request, novo_status, ids):
+    """ Aplica a transição e devolve o painel atualizado; 409 se nenhum pedido pôde mudar. """
+    if not mudar_status(novo_status, ids):
+        # Transição inválida ou já feita (ex.: clique duplo em "Aceitar")
+        return HttpResponse(status=409)
+    return _atualizar_kanban(request)
+
+@require_POST
 @user_passes_test(lambda u: u.is_staff)
 @login_required
 def aceitar_pedido(request, pedido_id):
-    pedido = get_object_or_404(Pedido, id=pedido_id)
-    pedido.status = 'em_preparo'
-    pedido.save()
-    return _recarregar_kanban(request)
+    get_object_or_404(Pedido, id=pedido_id)
+    return _mudar_status(request, 'em_preparo', [pedido_id])
 
 
+@require_POST
+@user_passes_test(lambda u: u.is_staff)
 @login_required
 def marcar_como_em_entrega(request, pedido_id):
-    pedido = get_object_or_404(Pedido, id=pedido_id)
-    pedido.status = 'saiu_para_entrega'
-    pedido.save()
-    return _recarregar_kanban(request)
+    get_object_or_404(Pedido, id=pedido_id)
+    return _mudar_status(request, 'saiu_para_entrega', [pedido_id])
 
+@require_POST
+@user_passes_test(lambda u: u.is_staff)
 @login_required
 def marcar_como_finalizado(request, pedido_id):
-    pedido = get_object_or_404(Pedido, id=pedido_id)
-    pedido.status = 'entregue'
-    pedido.save()
-    return _recarregar_kanban(request)
+    get_object_or_404(Pedido, id=pedido_id)
+    return _mudar_status(request, 'entregue', [pedido_id])
 
 @user_passes_test(lambda u: u.is_staff)
 @login_required
+@ler_da_replica()
 def dashboard(request):
-    today = timezone.now().date()
-    current_month = today.month
-    current_year = today.year
-
-    # Pedidos por período
-    pedidos_hoje = Pedido.objects.filter(data_pedido__date=today).count()
-    pedidos_mes = Pedido.objects.filter(data_pedido__year=current_year, data_pedido__month=current_month).count()
-    pedidos_ano = Pedido.objects.filter(data_pedido__year=current_year).count()
-
-    # Produtos mais pedidos (Top 5)
-    produtos_mais_pedidos = ItemPedido.objects.values('produto__nome') \
-        .annotate(total_vendido=Sum('quantidade')) \
+    # Tudo vem das tabelas de resumo diário: o custo não cresce com o histórico de pedidos
+    today = timezone.localdate()
+    inicio_mes = today.replace(day=1)
+    inicio_ano = today.replace(month=1, day=1)
+
+    # Período escolhido para o gráfico e o ranking (padrão: o ano corrente)
+    form = PeriodoForm(request.GET or None, initial={'inicio': inicio_ano, 'fim': today})
+    inicio, fim = inicio_ano, today
+    if form.is_valid():
+        inicio = form.cleaned_data['inicio'] or inicio
+        fim = form.cleaned_data['fim'] or fim
+
+    diarias = VendaDiaria.objects.filter(data__gte=inicio_ano, data__lte=today)
+    resumo = diarias.aggregate(
+        pedidos_hoje=Coalesce(Sum('pedidos', filter=Q(data=today)), 0),
+        pedidos_mes=Coalesce(Sum('pedidos', filter=Q(data__gte=inicio_mes)), 0),
+        pedidos_ano=Coalesce(Sum('pedidos'), 0),
+    )
+    periodo = VendaDiaria.objects.filter(data__gte=inicio, data__lte=fim).aggregate(
+        pedidos=Coalesce(Sum('pedidos'), 0),
+        receita=Coalesce(Sum('receita'), Decimal('0.00')),
+    )
+
+    # Produtos mais pedidos no período (Top 5)
+    produtos_mais_pedidos = list(
+        VendaProdutoDiaria.objects.filter(data__gte=inicio, data__lte=fim)
+        .values('produto_id')
+        .annotate(nome_produto=Max('nome_produto'), total_vendido=Sum('quantidade'))
         .order_by('-total_vendido')[:5]
+    )
+
+    # Tempos médios de preparo e de entrega no período, pelo histórico de status
+    tempos = tempos_medios(inicio, fim)
 
     # Prepara dados para o gráfico
-    chart_labels = [item['produto__nome'] for item in produtos_mais_pedidos]
+    chart_labels = [item['nome_produto'] for item in produtos_mais_pedidos]
     chart_data = [item['total_vendido'] for item in produtos_mais_pedidos]
 
     context = {
-        'pedidos_hoje': pedidos_hoje,
-        'pedidos_mes': pedidos_mes,
-        'pedidos_ano': pedidos_ano,
+        **resumo,
+        'form': form,
+        'inicio': inicio,
+        'fim': fim,
+        'pedidos_periodo': periodo['pedidos'],
+        'receita_periodo': periodo['receita'],
+        # Em minutos; None sem nenhuma etapa concluída no período
+        'tempo_preparo': None if tempos['preparo'] is None else round(tempos['preparo'].total_seconds() / 60),
+        'tempo_entrega': None if tempos['entrega'] is None else round(tempos['entrega'].total_seconds() / 60),
         'produtos_mais_pedidos': produtos_mais_pedidos,
         'chart_labels': json.dumps(chart_labels),
         'chart_data': json.dumps(chart_data),
     }
     return render(request, 'restaurant/dashboard.html', context)
 
+
 @require_POST
+@user_passes_test(lambda u: u.is_staff)
 @login_required
 def recusar_pedido(request, pedido_id):
-    pedido = get_object_or_404(Pedido, id=pedido_id)
-    pedido.status = 'cancelado' # Status final para pedidos recusados
-    pedido.save()
-    return _recarregar_kanban(request)
+    get_object_or_404(Pedido, id=pedido_id)
+    # Status final para pedidos recusados; as vendas do pedido são estornadas
+    return _mudar_status(request, 'cancelado', [pedido_id])
 
+# Ação em lote do painel: os pedidos marcados mudam de status numa requisição e num único UPDATE
 @require_POST
+@user_passes_test(lambda u: u.is_staff)
+@login_required
+def mudar_status_em_lote(request):
+    ids = [int(pedido_id) for pedido_id in request.POST.getlist('pedidos') if pedido_id.isdigit()]
+    try:
+        return _mudar_status(request, request.POST.get('status'), ids)
+    except TransicaoInvalida:
+        return HttpResponse(status=400)
+
+@require_POST
+@user_passes_test(lambda u: u.is_staff)
 @login_required
 def limpar_finalizados(request):
-    # Encontra todos os pedidos 'entregue' e muda o status para 'limpo'
-    Pedido.objects.filter(status='entregue').update(status='limpo')
-    return _recarregar_kanban(request)
+    # Tira do painel todos os pedidos 'entregue' (status 'limpo')
+    mudar_status('limpo')
+    return _atualizar_kanban(request)
+
+# Sincronização incremental: os eventos de status depois do cursor (id do último evento lido)
+@user_passes_test(lambda u: u.is_staff)
+@login_required
+def historico_pedidos(request):
+    cursor = request.GET.get('cursor', '0')
+    limite = request.GET.get('limite', str(LIMITE_EVENTOS))
+    if not (cursor.isdigit() and limite.isdigit()):
+        return HttpResponse(status=400)
+    limite = min(int(limite), LIMITE_EVENTOS) or LIMITE_EVENTOS
+    eventos = eventos_desde(int(cursor), limite)
+    # Compacto: os nomes dos campos vão uma vez só e as datas como timestamp Unix
+    return JsonResponse({
+        'cursor': eventos[-1][0] if eventos else int(cursor),
+        'mais': len(eventos) == limite,
+        'campos': ['id', 'pedido', 'status', 'em'],
+        'eventos': [[id_, pedido_id, status, round(criado_em.timestamp(), 3)] for id_, pedido_id, status, criado_em in eventos],
+    }, json_dumps_params={'separators': (',', ':')})
+
+# Exportação para a contabilidade: itens vendidos num período, em CSV ou JSON lines
+@user_passes_test(lambda u: u.is_staff)
+@login_required
+@ler_da_replica()
+def exportar_pedidos(request):
+    form = ExportacaoForm(request.GET)
+    if not form.is_valid():
+        return HttpResponse(form.errors.as_text(), status=400, content_type='text/plain; charset=utf-8')
+    dados = form.cleaned_data
+    formato = dados['formato'] or 'csv'
+    # As linhas são lidas enquanto a resposta é enviada, depois que a view retornou:
+    # o banco (réplica ou principal) é escolhido agora
+    blocos = exportacao.exportar(
+        formato, dados['inicio'], dados['fim'], dados['status'], [produto.id for produto in dados['produto']],
+        banco=router.db_for_read(ItemPedido),
+    )
+    if isinstance(request, ASGIRequest):
+        blocos = iterar_em_thread(blocos)
+    response = StreamingHttpResponse(blocos, content_type=exportacao.FORMATOS[formato])
+    arquivo = exportacao.nome_arquivo(formato, dados['inicio'], dados['fim'])
+    response['Content-Disposition'] = f'attachment; filename="{arquivo}"'
+    return response
+
+# Endpoints mais caros, pelas medições do PerfilMiddleware (apenas deste processo)
+@user_passes_test(lambda u: u.is_staff)
+@login_required
+def desempenho(request):
+    if request.method == 'POST':
+        perfil.limpar()
+        return redirect('restaurant:desempenho')
+    context = {'linhas': perfil.relatorio(), 'amostragem': settings.PERFIL_AMOSTRAGEM}
+    return render(request, 'restaurant/desempenho.html', context)
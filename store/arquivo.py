@@ -0,0 +1,92 @@
+"""
+Arquivamento dos pedidos encerrados.
+
+Pedidos fora do painel ('limpo') ou recusados ('cancelado') há mais de N
+dias saem de ``Pedido``/``ItemPedido`` para ``PedidoArquivado``/
+``ItemPedidoArquivado``, mantendo os ids. Os N dias contam de quando o
+pedido foi encerrado (o último ``PedidoEvento`` de entrega, recusa ou
+limpeza), não de quando foi feito: um pedido que ficou aberto por muito
+tempo não vai para o arquivo logo que é encerrado. Assim a tabela que o painel, o
+carrinho e o checkout consultam fica só com os pedidos recentes.
+
+A cópia é feita em lotes, cada um na sua transação: se o processo for
+interrompido, os lotes já feitos ficam arquivados e a próxima execução
+continua dos pedidos que faltam.
+"""
+from datetime import timedelta
+from itertools import chain
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import ItemPedido, ItemPedidoArquivado, Pedido, PedidoArquivado, PedidoEvento
+
+STATUS_ENCERRADOS = ('limpo', 'cancelado')
+# Eventos que encerram um pedido: a idade para o arquivo conta do último deles
+EVENTOS_ENCERRAMENTO = ('entregue', 'cancelado', 'limpo')
+DIAS_PADRAO = 30
+TAMANHO_LOTE = 500
+
+
+def arquivaveis(dias=DIAS_PADRAO):
+    limite = timezone.now() - timedelta(days=dias)
+    encerrado_depois = PedidoEvento.objects.filter(
+        pedido_id=OuterRef('id'), status__in=EVENTOS_ENCERRAMENTO, criado_em__gte=limite,
+    )
+    # Feito antes do limite (senão não pode ter sido encerrado antes dele) e sem encerramento depois;
+    # pedidos anteriores aos eventos contam só pela data do pedido
+    return Pedido.objects.filter(
+        finalizado=True, status__in=STATUS_ENCERRADOS, data_pedido__lt=limite,
+    ).exclude(Exists(encerrado_depois))
+
+
+def arquivar_lote(ids):
+    """ Move os pedidos informados (e os itens deles) para as tabelas de arquivo. Devolve quantos moveu. """
+    with transaction.atomic():
+        # Relê dentro da transação: um pedido que mudou desde a seleção fica de fora
+        pedidos = list(Pedido.objects.filter(id__in=ids, finalizado=True, status__in=STATUS_ENCERRADOS))
+        if not pedidos:
+            return 0
+        ids = [pedido.id for pedido in pedidos]
+        PedidoArquivado.objects.bulk_create(
+            [
+                PedidoArquivado(
+                    id=pedido.id, cliente_id=pedido.cliente_id, data_pedido=pedido.data_pedido,
+                    status=pedido.status, total=pedido.total, quantidade_total=pedido.quantidade_total,
+                )
+                for pedido in pedidos
+            ],
+            ignore_conflicts=True,
+        )
+        ItemPedidoArquivado.objects.filter(pedido_id__in=ids).delete()
+        ItemPedidoArquivado.objects.bulk_create(
+            ItemPedidoArquivado(
+                pedido_id=item.pedido_id, produto_id=item.produto_id, quantidade=item.quantidade,
+                preco_unitario=item.preco_unitario, nome_produto=item.nome_produto,
+                data_adicionado=item.data_adicionado,
+            )
+            for item in ItemPedido.objects.filter(pedido_id__in=ids)
+        )
+        ItemPedido.objects.filter(pedido_id__in=ids).delete()
+        Pedido.objects.filter(id__in=ids).delete()
+    return len(ids)
+
+
+def arquivar(dias=DIAS_PADRAO, tamanho_lote=TAMANHO_LOTE, max_lotes=None):
+    """ Arquiva os pedidos encerrados há mais de `dias` dias, lote a lote. Gera o total movido após cada lote. """
+    movidos = lotes = 0
+    while max_lotes is None or lotes < max_lotes:
+        ids = list(arquivaveis(dias).order_by('id').values_list('id', flat=True)[:tamanho_lote])
+        if not ids:
+            break
+        movidos += arquivar_lote(ids)
+        lotes += 1
+        yield movidos
+
+
+def pedidos_do_cliente(usuario):
+    """ Pedidos finalizados do cliente, dos recentes aos arquivados, do mais novo para o mais antigo. """
+    recentes = Pedido.objects.filter(cliente=usuario, finalizado=True).prefetch_related('itempedido_set')
+    arquivados = PedidoArquivado.objects.filter(cliente=usuario).prefetch_related('itempedido_set')
+    return sorted(chain(recentes, arquivados), key=lambda pedido: pedido.data_pedido, reverse=True)
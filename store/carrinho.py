@@ -0,0 +1,290 @@
+"""
+Carrinho de compras em aberto.
+
+O carrinho fica no cache ``carrinhos`` como um dicionário compacto
+``{produto_id: [quantidade, nome, preço]}``; adicionar, alterar e remover
+itens não escrevem nada no banco. Só ``finalizar_pedido`` grava o carrinho
+em ``Pedido``/``ItemPedido`` (ver ``gravar_pedido``), já com os preços
+atuais dos produtos. O nome e o preço guardados no carrinho são só os de
+quando o item foi adicionado: antes de exibir o carrinho ou fechar o
+pedido, ``atualizar_precos`` os troca pelos atuais.
+
+Clientes logados têm o carrinho na chave do usuário (o mesmo em qualquer
+dispositivo); visitantes, numa chave sorteada guardada na sessão, que é
+mesclada ao carrinho do usuário quando ele faz login.
+
+Toda alteração lê, modifica e grava o carrinho inteiro, então acontece
+dentro de ``travar``: dois toques rápidos no botão de adicionar são
+aplicados um depois do outro, sem que um apague o incremento do outro.
+Se a trava não sai a tempo, ``CarrinhoOcupado`` vira uma resposta 503 com
+``Retry-After`` nas views.
+"""
+import random
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.core.cache import caches
+from django.db import IntegrityError, OperationalError, transaction
+
+from restaurant.models import Produto
+from .models import ItemPedido, Pedido
+
+CHAVE_SESSAO = 'carrinho'
+
+# Quanto tempo uma requisição espera pela trava do carrinho e por quanto
+# tempo a trava vale se o processo que a tem morrer sem liberá-la
+ESPERA_TRAVA = 5
+VALIDADE_TRAVA = 10
+# Intervalo entre as tentativas de pegar a trava: dobra a cada tentativa, até o máximo.
+# Cada tentativa é um add no cache, que no backend em arquivos grava um arquivo
+INTERVALO_TRAVA = 0.01
+INTERVALO_TRAVA_MAXIMO = 0.25
+
+# Travas locais, para as threads do mesmo processo não disputarem o cache
+_travas_locais = [threading.Lock() for _ in range(64)]
+
+
+class CarrinhoOcupado(Exception):
+    """ A trava do carrinho não foi obtida a tempo. """
+
+
+def _cache():
+    return caches['carrinhos']
+
+
+def _chave_usuario(usuario_id):
+    return f'carrinho:usuario:{usuario_id}'
+
+
+def _chave_visitante(token):
+    return f'carrinho:visitante:{token}'
+
+
+class ItemCarrinho:
+    __slots__ = ('produto_id', 'quantidade', 'nome', 'preco')
+
+    def __init__(self, produto_id, quantidade, nome, preco):
+        self.produto_id = produto_id
+        self.quantidade = quantidade
+        self.nome = nome
+        self.preco = Decimal(preco)
+
+    @property
+    def subtotal(self):
+        return self.preco * self.quantidade
+
+
+class Carrinho:
+    def __init__(self, chave, dados):
+        self.chave = chave
+        self.dados = dados
+
+    @classmethod
+    def do_request(cls, request):
+        """ Carrinho de quem fez a requisição (vazio para um visitante que ainda não adicionou nada). """
+        return cls.da_chave(_chave_do_request(request), request.user)
+
+    @classmethod
+    async def ado_request(cls, request):
+        """ do_request() para views assíncronas, pelas APIs assíncronas da sessão, do cache e do ORM. """
+        usuario = await request.auser()
+        if usuario.is_authenticated:
+            chave = _chave_usuario(usuario.pk)
+        else:
+            token = await request.session.aget(CHAVE_SESSAO)
+            chave = _chave_visitante(token) if token else None
+        if chave is None:
+            return cls(None, {})
+        dados = await _cache().aget(chave)
+        if dados is None:
+            dados = await _acarrinho_do_banco(usuario) if usuario.is_authenticated else {}
+            await _cache().aset(chave, dados)
+        return cls(chave, dados)
+
+    @classmethod
+    def da_chave(cls, chave, usuario=None):
+        if chave is None:
+            return cls(None, {})
+        dados = _cache().get(chave)
+        if dados is None:
+            dados = _carrinho_do_banco(usuario) if usuario is not None and usuario.is_authenticated else {}
+            _cache().set(chave, dados)
+        return cls(chave, dados)
+
+    def __iter__(self):
+        for produto_id, (quantidade, nome, preco) in self.dados.items():
+            yield ItemCarrinho(produto_id, quantidade, nome, preco)
+
+    def __len__(self):
+        return len(self.dados)
+
+    @property
+    def total_itens(self):
+        return sum(quantidade for quantidade, _, _ in self.dados.values())
+
+    @property
+    def total(self):
+        return sum((item.subtotal for item in self), Decimal('0.00'))
+
+    def adicionar(self, produto, quantidade=1):
+        atual = self.dados.get(produto.id, [0])[0]
+        self.dados[produto.id] = [atual + quantidade, produto.nome, str(produto.preco)]
+
+    def alterar(self, produto_id, delta):
+        """ Soma delta à quantidade do item; o item sai do carrinho quando ela chega a zero. """
+        if produto_id not in self.dados:
+            return
+        self.dados[produto_id][0] += delta
+        if self.dados[produto_id][0] <= 0:
+            del self.dados[produto_id]
+
+    def atualizar_precos(self):
+        """
+        Troca o nome e o preço de cada item pelos atuais do produto, numa só
+        consulta, e tira do carrinho os produtos excluídos ou fora do
+        cardápio: o total exibido é o que será cobrado.
+        """
+        if not self.dados:
+            return
+        atuais = {
+            produto_id: [nome, str(preco)]
+            for produto_id, nome, preco in Produto.objects.filter(id__in=list(self.dados), ativo=True).values_list('id', 'nome', 'preco')
+        }
+        self.dados = {
+            produto_id: [quantidade, *atuais[produto_id]]
+            for produto_id, (quantidade, _, _) in self.dados.items() if produto_id in atuais
+        }
+
+    def remover(self, produto_id):
+        self.dados.pop(produto_id, None)
+
+    def salvar(self):
+        _cache().set(self.chave, self.dados)
+
+    def esvaziar(self):
+        self.dados = {}
+        if self.chave is not None:
+            self.salvar()
+
+
+def _chave_do_request(request, criar=False):
+    if request.user.is_authenticated:
+        return _chave_usuario(request.user.pk)
+    token = request.session.get(CHAVE_SESSAO)
+    if token is None and criar:
+        # Primeiro item de um visitante: sorteia a chave do carrinho dele
+        token = request.session[CHAVE_SESSAO] = secrets.token_urlsafe(16)
+    return _chave_visitante(token) if token else None
+
+
+@contextmanager
+def travar(chave):
+    """
+    Exclusão mútua sobre um carrinho: entre threads, por uma trava local, e
+    entre processos, por uma chave criada com ``add`` (atômico no cache).
+    """
+    with _travas_locais[hash(chave) % len(_travas_locais)]:
+        trava = f'{chave}:trava'
+        prazo = time.monotonic() + ESPERA_TRAVA
+        intervalo = INTERVALO_TRAVA
+        while not _cache().add(trava, 1, VALIDADE_TRAVA):
+            if time.monotonic() > prazo:
+                raise CarrinhoOcupado(chave)
+            # Com um pouco de acaso, para processos que esperam juntos não tentarem juntos
+            time.sleep(random.uniform(intervalo / 2, intervalo))
+            intervalo = min(intervalo * 2, INTERVALO_TRAVA_MAXIMO)
+        try:
+            yield
+        finally:
+            _cache().delete(trava)
+
+
+@contextmanager
+def alterar(request):
+    """ Carrinho da requisição travado para alteração; é gravado na saída do bloco. """
+    if request.user.is_authenticated and CHAVE_SESSAO in request.session:
+        # Mescla que o login não conseguiu fazer por encontrar um carrinho ocupado
+        mesclar_visitante(request, request.user)
+    chave = _chave_do_request(request, criar=True)
+    with travar(chave):
+        carrinho = Carrinho.da_chave(chave, request.user)
+        yield carrinho
+        carrinho.salvar()
+
+
+def _itens_do_banco(usuario):
+    return ItemPedido.objects.filter(
+        pedido__cliente=usuario, pedido__finalizado=False, produto__isnull=False,
+    ).values_list('produto_id', 'quantidade', 'produto__nome', 'produto__preco')
+
+
+def _carrinho_do_banco(usuario):
+    """ Carrinho aberto gravado no banco por versões anteriores, lido uma única vez para o cache. """
+    return {produto_id: [quantidade, nome, str(preco)] for produto_id, quantidade, nome, preco in _itens_do_banco(usuario)}
+
+
+async def _acarrinho_do_banco(usuario):
+    return {produto_id: [quantidade, nome, str(preco)] async for produto_id, quantidade, nome, preco in _itens_do_banco(usuario)}
+
+
+def mesclar_visitante(request, usuario):
+    """
+    Junta o carrinho montado antes do login ao carrinho do usuário. Com um
+    dos carrinhos ocupado, levanta CarrinhoOcupado sem mexer em nada: o
+    token fica na sessão e a mescla é refeita na próxima alteração.
+    """
+    token = request.session.get(CHAVE_SESSAO)
+    if token is None:
+        return
+    # Uma trava de cada vez: duas chaves podem cair na mesma trava local
+    with travar(_chave_visitante(token)):
+        visitante = _cache().get(_chave_visitante(token))
+    if visitante:
+        with travar(_chave_usuario(usuario.pk)):
+            carrinho = Carrinho.da_chave(_chave_usuario(usuario.pk), usuario)
+            for produto_id, (quantidade, nome, preco) in visitante.items():
+                atual = carrinho.dados.get(produto_id, [0])[0]
+                carrinho.dados[produto_id] = [atual + quantidade, nome, preco]
+            carrinho.salvar()
+    _cache().delete(_chave_visitante(token))
+    del request.session[CHAVE_SESSAO]
+
+
+def _erro_transitorio(erro):
+    # Conflito de unicidade com uma requisição simultânea ou SQLite ocupado por outro escritor
+    return isinstance(erro, IntegrityError) or 'locked' in str(erro)
+
+
+def repetir_em_conflito(funcao, tentativas=5, espera=0.05):
+    """
+    Executa funcao numa transação, repetindo-a (com espera crescente) se
+    ela falhar por conflito com outra transação.
+    """
+    for tentativa in range(tentativas):
+        try:
+            with transaction.atomic():
+                return funcao()
+        except (IntegrityError, OperationalError) as erro:
+            if tentativa == tentativas - 1 or not _erro_transitorio(erro):
+                raise
+            time.sleep(espera * 2 ** tentativa)
+
+
+def gravar_pedido(carrinho, usuario):
+    """
+    Grava o carrinho como o pedido aberto do usuário, substituindo os itens
+    que ele tiver no banco. As quantidades entram num único upsert por
+    (pedido, produto); produtos excluídos ou tirados do cardápio desde que
+    foram adicionados ficam de fora. Deve ser chamado dentro de uma transação.
+    """
+    pedido, _ = Pedido.objects.get_or_create(cliente=usuario, finalizado=False)
+    carrinho.atualizar_precos()
+    itens = [ItemPedido(pedido=pedido, produto_id=item.produto_id, quantidade=item.quantidade) for item in carrinho]
+    pedido.itempedido_set.exclude(produto_id__in=[item.produto_id for item in itens]).delete()
+    ItemPedido.objects.bulk_create(
+        itens, update_conflicts=True, unique_fields=['pedido', 'produto'], update_fields=['quantidade'],
+    )
+    return pedido
@@ -0,0 +1,68 @@
+"""
+Máquina de estados dos pedidos.
+
+Fluxo: o checkout grava ``solicitado``; a cozinha aceita (``em_preparo``)
+ou recusa (``cancelado``), despacha (``saiu_para_entrega``), entrega
+(``entregue``) e por fim tira o pedido do painel (``limpo``).
+
+``mudar_status`` é o único caminho para essas mudanças: valida a
+transição, muda qualquer quantidade de pedidos com um único UPDATE
+condicionado ao status de origem (um segundo clique em "Aceitar" não
+avança o pedido duas vezes) e cuida dos efeitos colaterais: histórico de
+status (PedidoEvento), carimbos de versão, eventos SSE e estorno das vendas
+de pedidos recusados.
+"""
+from django.db import transaction
+
+from restaurant.vendas import estornar_vendas
+from . import historico
+from .eventos import publicar_mudancas
+from .models import Pedido
+from .versoes import incrementar
+
+# Status de destino: status de origem de onde ele pode ser alcançado
+TRANSICOES = {
+    'em_preparo': ('solicitado',),
+    'cancelado': ('solicitado',),
+    'saiu_para_entrega': ('em_preparo',),
+    'entregue': ('saiu_para_entrega',),
+    'limpo': ('entregue',),
+}
+
+
+class TransicaoInvalida(ValueError):
+    pass
+
+
+def pode_mudar(status_atual, novo_status):
+    return status_atual in TRANSICOES.get(novo_status, ())
+
+
+def mudar_status(novo_status, ids=None):
+    """
+    Leva ao novo status os pedidos informados (ou todos os que estiverem no
+    status de origem, se ids for None) que puderem fazer essa transição.
+    Devolve os ids que de fato mudaram; os demais são ignorados.
+    """
+    if novo_status not in TRANSICOES:
+        raise TransicaoInvalida(novo_status)
+    origens = TRANSICOES[novo_status]
+    with transaction.atomic():
+        elegiveis = Pedido.objects.filter(finalizado=True, status__in=origens)
+        if ids is not None:
+            elegiveis = elegiveis.filter(id__in=ids)
+        # A trava das linhas (no SQLite, a da transação IMMEDIATE) garante que a lista
+        # abaixo é exatamente o que o UPDATE vai alterar
+        alterados = list(elegiveis.select_for_update().values_list('id', flat=True))
+        if not alterados:
+            return []
+        Pedido.objects.filter(id__in=alterados, status__in=origens).update(status=novo_status)
+        historico.registrar(novo_status, alterados)
+
+        if novo_status == 'cancelado':
+            # Pedido recusado não conta como venda
+            estornar_vendas(Pedido.objects.filter(id__in=alterados).prefetch_related('itempedido_set'))
+        # O update não dispara sinais, então os carimbos são avançados aqui
+        incrementar('pedidos', *[f'pedido:{pedido_id}' for pedido_id in alterados], mudancas={'pedidos': alterados})
+        publicar_mudancas(alterados, novo_status)
+    return alterados
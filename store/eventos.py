@@ -0,0 +1,169 @@
+"""
+Canal de eventos de mudança de status dos pedidos.
+
+As views publicam um evento sempre que um pedido muda de status e os
+endpoints SSE (Server-Sent Events) repassam esses eventos ao painel da
+cozinha e à página de acompanhamento do cliente. Cada cliente conectado
+fica parado numa fila asyncio até chegar um evento, então clientes ociosos
+não consomem CPU nem consultas ao banco.
+
+O backend é configurável em ``settings.EVENTOS_BACKEND``. O padrão,
+``BrokerLocal``, entrega os eventos apenas aos assinantes do próprio
+processo; para vários workers basta um backend com a mesma interface
+(``publicar`` e ``assinatura``) apoiado num serviço compartilhado.
+"""
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.module_loading import import_string
+
+CANAL_KANBAN = 'kanban'
+
+# Intervalo, em segundos, entre os comentários que mantêm a conexão aberta
+INTERVALO_PING = 15
+
+
+def canal_pedido(pedido_id):
+    return f'pedido:{pedido_id}'
+
+
+class Assinatura:
+    """ Fila de eventos de um cliente conectado, registrada no broker enquanto o contexto estiver aberto. """
+
+    def __init__(self, broker, canais, tamanho_fila=100):
+        self.broker = broker
+        self.canais = tuple(canais)
+        self.fila = asyncio.Queue(maxsize=tamanho_fila)
+        self.loop = None
+
+    async def __aenter__(self):
+        self.loop = asyncio.get_running_loop()
+        self.broker._registrar(self)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.broker._remover(self)
+
+    def _entregar(self, evento):
+        # Executado no loop do assinante; se a fila estiver cheia o cliente está
+        # atrasado e o evento pode ser descartado, pois ele vai recarregar tudo de qualquer forma
+        try:
+            self.fila.put_nowait(evento)
+        except asyncio.QueueFull:
+            pass
+
+    async def receber(self, timeout=None):
+        """ Aguarda o próximo evento; levanta TimeoutError se nada chegar a tempo. """
+        return await asyncio.wait_for(self.fila.get(), timeout)
+
+
+def _entregar_grupo(assinaturas, evento):
+    for assinatura in assinaturas:
+        assinatura._entregar(evento)
+
+
+class BrokerLocal:
+    """ Broker em memória: entrega eventos às assinaturas abertas neste processo. """
+
+    def __init__(self):
+        self._assinaturas = {}
+        self._lock = threading.Lock()
+
+    def _registrar(self, assinatura):
+        with self._lock:
+            for canal in assinatura.canais:
+                self._assinaturas.setdefault(canal, set()).add(assinatura)
+
+    def _remover(self, assinatura):
+        with self._lock:
+            for canal in assinatura.canais:
+                assinaturas = self._assinaturas.get(canal)
+                if assinaturas is not None:
+                    assinaturas.discard(assinatura)
+                    if not assinaturas:
+                        del self._assinaturas[canal]
+
+    def total_assinaturas(self, canal):
+        with self._lock:
+            return len(self._assinaturas.get(canal, ()))
+
+    def assinatura(self, canais):
+        return Assinatura(self, canais)
+
+    def publicar(self, canal, evento):
+        # Pode ser chamado de qualquer thread (views síncronas); a entrega
+        # acontece no event loop de cada assinante, com um único agendamento por loop
+        with self._lock:
+            assinaturas = list(self._assinaturas.get(canal, ()))
+        por_loop = {}
+        for assinatura in assinaturas:
+            por_loop.setdefault(assinatura.loop, []).append(assinatura)
+        for loop, grupo in por_loop.items():
+            loop.call_soon_threadsafe(_entregar_grupo, grupo, evento)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def broker():
+    """ Instância única do backend configurado em EVENTOS_BACKEND. """
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.EVENTOS_BACKEND)()
+    return _broker
+
+
+def publicar_status(pedido):
+    """ Publica a mudança de status do pedido depois que a transação atual for confirmada. """
+    evento = {'tipo': 'status', 'pedido': pedido.id, 'status': pedido.status}
+
+    def enviar():
+        broker().publicar(CANAL_KANBAN, evento)
+        broker().publicar(canal_pedido(pedido.id), evento)
+
+    transaction.on_commit(enviar)
+
+
+def publicar_mudancas(ids, status):
+    """ Publica que vários pedidos passaram ao mesmo status: um evento no canal de cada um e um só no painel. """
+    ids = list(ids)
+
+    def enviar():
+        broker().publicar(CANAL_KANBAN, {'tipo': 'status', 'pedidos': ids, 'status': status})
+        for pedido_id in ids:
+            broker().publicar(canal_pedido(pedido_id), {'tipo': 'status', 'pedido': pedido_id, 'status': status})
+
+    transaction.on_commit(enviar)
+
+
+async def transmitir(canais, intervalo_ping=INTERVALO_PING):
+    """ Gera o fluxo text/event-stream de uma assinatura até o cliente desconectar. """
+    async with broker().assinatura(canais) as assinatura:
+        yield 'retry: 3000\n\n'
+        while True:
+            try:
+                evento = await assinatura.receber(timeout=intervalo_ping)
+            except TimeoutError:
+                yield ': ping\n\n'
+                continue
+            yield f"event: {evento['tipo']}\ndata: {json.dumps(evento)}\n\n"
+
+
+def resposta_sse(request, canais):
+    """ Resposta text/event-stream para os canais informados; exige um servidor ASGI. """
+    if not isinstance(request, ASGIRequest):
+        # Sob WSGI cada conexão prenderia uma thread para sempre; o 204 faz o
+        # navegador desistir de reconectar e a página segue com o polling de segurança
+        return HttpResponse(status=204)
+    response = StreamingHttpResponse(transmitir(canais), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
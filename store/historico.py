@@ -0,0 +1,72 @@
+"""
+Histórico de status dos pedidos (PedidoEvento).
+
+Cada mudança de status, do checkout (``solicitado``) às transições de
+``mudar_status``, acrescenta um evento por pedido na mesma transação da
+mudança. Os eventos nunca são alterados nem apagados, então quem acompanha
+os pedidos (painéis, relatórios, integrações) guarda o id do último evento
+lido e pede só os seguintes (``eventos_desde``) em vez de reler tudo.
+
+Para um cursor nunca pular eventos, os ids precisam ficar visíveis na ordem
+em que foram gerados. No SQLite as escritas já são serializadas (transações
+IMMEDIATE); no PostgreSQL uma trava consultiva, mantida até o commit,
+serializa as transações que gravam eventos.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import connection
+from django.db.models import Avg, DurationField, ExpressionWrapper, F, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from .models import PedidoEvento
+
+# Chave da trava consultiva do PostgreSQL (qualquer inteiro fixo)
+TRAVA_EVENTOS = 7_431_001
+
+# Máximo de eventos devolvidos por chamada de eventos_desde
+LIMITE_EVENTOS = 1000
+
+
+def registrar(status, ids):
+    """ Um evento para cada pedido em ids, que acabou de passar para status. Deve ser chamado dentro de uma transação. """
+    if not ids:
+        return
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [TRAVA_EVENTOS])
+    agora = timezone.now()
+    PedidoEvento.objects.bulk_create(PedidoEvento(pedido_id=pedido_id, status=status, criado_em=agora) for pedido_id in ids)
+
+
+def eventos_desde(cursor, limite=LIMITE_EVENTOS):
+    """ Até limite eventos com id maior que cursor, em ordem, como tuplas (id, pedido_id, status, criado_em). """
+    return list(
+        PedidoEvento.objects.filter(id__gt=cursor).order_by('id')
+        .values_list('id', 'pedido_id', 'status', 'criado_em')[:limite]
+    )
+
+
+def _inicio_do_dia(data):
+    return timezone.make_aware(datetime.combine(data, time.min))
+
+
+def tempos_medios(inicio, fim):
+    """
+    Tempo médio de preparo (do aceite à saída para entrega) e de entrega (da
+    saída à entrega) das etapas terminadas entre as datas inicio e fim,
+    inclusive; None se nenhuma terminou. Cada etapa é medida a partir do
+    evento anterior do mesmo pedido, tudo numa única consulta.
+    """
+    anterior = (
+        PedidoEvento.objects.filter(pedido_id=OuterRef('pedido_id'), id__lt=OuterRef('id'))
+        .order_by('-id').values('criado_em')[:1]
+    )
+    periodo = Q(criado_em__gte=_inicio_do_dia(inicio), criado_em__lt=_inicio_do_dia(fim + timedelta(days=1)))
+    return (
+        PedidoEvento.objects.filter(periodo, status__in=['saiu_para_entrega', 'entregue'])
+        .annotate(duracao=ExpressionWrapper(F('criado_em') - Subquery(anterior), output_field=DurationField()))
+        .aggregate(
+            preparo=Avg('duracao', filter=Q(status='saiu_para_entrega')),
+            entrega=Avg('duracao', filter=Q(status='entregue')),
+        )
+    )
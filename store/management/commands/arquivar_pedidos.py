@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from store import arquivo
+
+
+class Command(BaseCommand):
+    help = (
+        'Move os pedidos encerrados (fora do painel ou recusados) há mais de N dias para as tabelas de arquivo, '
+        'em lotes. Pode ser interrompido e executado de novo: continua de onde parou.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=arquivo.DIAS_PADRAO, help='Dias desde o encerramento do pedido.')
+        parser.add_argument('--lote', type=int, default=arquivo.TAMANHO_LOTE, help='Pedidos por transação.')
+        parser.add_argument('--max-lotes', type=int, help='Para depois deste número de lotes.')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Apenas informa quantos pedidos seriam arquivados.',
+        )
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            total = arquivo.arquivaveis(options['dias']).count()
+            self.stdout.write(f'{total} pedido(s) seriam arquivados.')
+            return
+
+        movidos = 0
+        for movidos in arquivo.arquivar(options['dias'], options['lote'], options['max_lotes']):
+            self.stdout.write(f'{movidos} pedido(s) arquivados...')
+        self.stdout.write(self.style.SUCCESS(f'{movidos} pedido(s) arquivados.'))
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+
+from iffood.cache import FileBasedCache
+
+
+class Command(BaseCommand):
+    help = (
+        'Apaga as entradas expiradas dos caches em arquivos (carrinhos e, se configurado, o padrão) e descarta '
+        'o excesso acima de MAX_ENTRIES. Rode periodicamente, por exemplo a cada hora pelo cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('caches', nargs='*', help='Aliases em CACHES; por padrão, todos os caches em arquivos.')
+
+    def handle(self, *args, **options):
+        aliases = options['caches'] or [alias for alias in settings.CACHES if isinstance(caches[alias], FileBasedCache)]
+        for alias in aliases:
+            cache = caches[alias]
+            if not isinstance(cache, FileBasedCache):
+                raise CommandError(f'O cache {alias} não é um iffood.cache.FileBasedCache.')
+            self.stdout.write(f'{alias}: {cache.podar()} entradas.')
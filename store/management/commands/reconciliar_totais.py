@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Q
+
+from store.models import Pedido, expressoes_totais
+
+
+class Command(BaseCommand):
+    help = 'Recalcula total e quantidade_total dos pedidos cujos valores gravados divergem dos itens.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Apenas lista os pedidos divergentes, sem corrigir.',
+        )
+
+    def handle(self, *args, **options):
+        expressoes = expressoes_totais()
+        divergentes = (
+            Pedido.objects
+            .annotate(total_calculado=expressoes['total'], quantidade_calculada=expressoes['quantidade_total'])
+            .filter(~Q(total=F('total_calculado')) | ~Q(quantidade_total=F('quantidade_calculada')))
+        )
+        ids = list(divergentes.values_list('id', flat=True))
+
+        if not ids:
+            self.stdout.write(self.style.SUCCESS('Nenhuma divergência encontrada.'))
+            return
+
+        self.stdout.write(f'{len(ids)} pedido(s) divergente(s): {", ".join(map(str, ids))}')
+        if options['dry_run']:
+            return
+
+        with transaction.atomic():
+            Pedido.objects.filter(id__in=ids).update(**expressoes_totais())
+        self.stdout.write(self.style.SUCCESS(f'{len(ids)} pedido(s) corrigido(s).'))
@@ -0,0 +1,36 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from store import replicas
+
+
+class Command(BaseCommand):
+    help = (
+        'Copia o banco SQLite principal para os arquivos das réplicas de leitura (DB_REPLICAS), '
+        'para testá-las localmente. No PostgreSQL, use a replicação do próprio banco.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivos', nargs='*', help='Arquivos de destino; por padrão, os das réplicas configuradas.')
+        parser.add_argument('--intervalo', type=float, help='Repete a cópia a cada N segundos, até ser interrompido.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Só o banco SQLite é copiado por este comando.')
+        arquivos = options['arquivos'] or [settings.DATABASES[alias]['NAME'] for alias in settings.REPLICAS]
+        if not arquivos:
+            raise CommandError('Nenhuma réplica configurada (DB_REPLICAS).')
+
+        try:
+            while True:
+                inicio = time.perf_counter()
+                replicas.copiar_sqlite(arquivos)
+                self.stdout.write(f'{len(arquivos)} réplica(s) atualizadas em {time.perf_counter() - inicio:.2f}s.')
+                if not options['intervalo']:
+                    break
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
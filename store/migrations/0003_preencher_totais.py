@@ -0,0 +1,30 @@
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def preencher_totais(apps, schema_editor):
+    Pedido = apps.get_model('store', 'Pedido')
+    ItemPedido = apps.get_model('store', 'ItemPedido')
+    itens = ItemPedido.objects.filter(pedido=OuterRef('pk')).order_by().values('pedido')
+    valor = itens.annotate(
+        soma=Sum(F('quantidade') * F('produto__preco'), output_field=DecimalField(max_digits=10, decimal_places=2))
+    ).values('soma')
+    quantidade = itens.annotate(soma=Sum('quantidade')).values('soma')
+    Pedido.objects.update(
+        total=Coalesce(Subquery(valor), Value(Decimal('0.00'))),
+        quantidade_total=Coalesce(Subquery(quantidade), Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0002_pedido_totais'),
+    ]
+
+    operations = [
+        migrations.RunPython(preencher_totais, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0003_preencher_totais'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='itempedido',
+            name='nome_produto',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='itempedido',
+            name='preco_unitario',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def preencher_precos(apps, schema_editor):
+    ItemPedido = apps.get_model('store', 'ItemPedido')
+    Produto = apps.get_model('restaurant', 'Produto')
+    produto = Produto.objects.filter(pk=OuterRef('produto_id'))
+    ItemPedido.objects.filter(pedido__finalizado=True, produto__isnull=False).update(
+        preco_unitario=Subquery(produto.values('preco')),
+        nome_produto=Subquery(produto.values('nome')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0004_itempedido_preco_nome'),
+    ]
+
+    operations = [
+        migrations.RunPython(preencher_precos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def mesclar_carrinhos(apps, schema_editor):
+    """ Junta os carrinhos abertos repetidos de cada cliente no mais antigo, antes da restrição de unicidade. """
+    Pedido = apps.get_model('store', 'Pedido')
+    ItemPedido = apps.get_model('store', 'ItemPedido')
+    repetidos = (
+        Pedido.objects.filter(finalizado=False).values('cliente_id')
+        .annotate(total=Count('id')).filter(total__gt=1).values_list('cliente_id', flat=True)
+    )
+    for cliente_id in list(repetidos):
+        carrinho, *sobras = Pedido.objects.filter(cliente_id=cliente_id, finalizado=False).order_by('id')
+        itens = {item.produto_id: item for item in ItemPedido.objects.filter(pedido=carrinho)}
+        for item in ItemPedido.objects.filter(pedido__in=sobras).order_by('id'):
+            existente = itens.get(item.produto_id)
+            if existente is not None:
+                existente.quantidade += item.quantidade
+                existente.save(update_fields=['quantidade'])
+                item.delete()
+            else:
+                item.pedido = carrinho
+                item.save(update_fields=['pedido'])
+                itens[item.produto_id] = item
+        Pedido.objects.filter(id__in=[sobra.id for sobra in sobras]).delete()
+
+        # Totais do carrinho mesclado, com os preços atuais (ainda não congelados)
+        carrinho.total = sum(
+            (item.quantidade * item.produto.preco for item in itens.values() if item.produto_id), Decimal('0.00')
+        )
+        carrinho.quantidade_total = sum(item.quantidade for item in itens.values())
+        carrinho.save(update_fields=['total', 'quantidade_total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0005_preencher_precos_itens'),
+    ]
+
+    operations = [
+        migrations.RunPython(mesclar_carrinhos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_mesclar_carrinhos_duplicados'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(condition=models.Q(('finalizado', True)), fields=['cliente', 'data_pedido'], name='pedido_cliente_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(condition=models.Q(('finalizado', True)), fields=['status', 'data_pedido'], name='pedido_kanban_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['data_pedido'], name='pedido_data_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='pedido',
+            constraint=models.UniqueConstraint(condition=models.Q(('finalizado', False)), fields=('cliente',), name='um_carrinho_por_cliente'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_indices_pedido'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pedido',
+            name='status',
+            field=models.CharField(choices=[('pendente', 'Pendente'), ('solicitado', 'Solicitado'), ('em_preparo', 'Em Preparo'), ('saiu_para_entrega', 'Saiu para Entrega'), ('entregue', 'Entregue'), ('cancelado', 'Cancelado'), ('limpo', 'Entregue (fora do painel)')], default='pendente', max_length=20),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0005_indices_produto'),
+        ('store', '0008_status_solicitado_limpo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PedidoArquivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('data_pedido', models.DateTimeField()),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('solicitado', 'Solicitado'), ('em_preparo', 'Em Preparo'), ('saiu_para_entrega', 'Saiu para Entrega'), ('entregue', 'Entregue'), ('cancelado', 'Cancelado'), ('limpo', 'Entregue (fora do painel)')], max_length=20)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('quantidade_total', models.PositiveIntegerField(default=0)),
+                ('arquivado_em', models.DateTimeField(auto_now_add=True)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pedidos_arquivados', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Pedido Arquivado',
+                'verbose_name_plural': 'Pedidos Arquivados',
+                'ordering': ['-data_pedido'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ItemPedidoArquivado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantidade', models.PositiveIntegerField(default=1)),
+                ('preco_unitario', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('nome_produto', models.CharField(blank=True, max_length=100)),
+                ('data_adicionado', models.DateTimeField()),
+                ('produto', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='restaurant.produto')),
+                ('pedido', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='itempedido_set', to='store.pedidoarquivado')),
+            ],
+            options={
+                'verbose_name': 'Item de Pedido Arquivado',
+                'verbose_name_plural': 'Itens de Pedidos Arquivados',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='pedidoarquivado',
+            index=models.Index(fields=['cliente', 'data_pedido'], name='pedido_arquivado_cliente_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedidoarquivado',
+            index=models.Index(fields=['data_pedido'], name='pedido_arquivado_data_idx'),
+        ),
+    ]
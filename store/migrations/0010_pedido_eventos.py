@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:53
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_pedidos_arquivados'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PedidoEvento',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('pedido_id', models.BigIntegerField()),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('solicitado', 'Solicitado'), ('em_preparo', 'Em Preparo'), ('saiu_para_entrega', 'Saiu para Entrega'), ('entregue', 'Entregue'), ('cancelado', 'Cancelado'), ('limpo', 'Entregue (fora do painel)')], max_length=20)),
+                ('criado_em', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Evento de Pedido',
+                'verbose_name_plural': 'Eventos de Pedidos',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['pedido_id', 'id'], name='evento_pedido_idx'), models.Index(fields=['status', 'criado_em'], name='evento_status_idx')],
+            },
+        ),
+    ]
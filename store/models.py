@@ -1,47 +1,107 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.conf import settings
+from django.utils import timezone
 from restaurant.models import Produto 
 
+
+def expressoes_totais():
+    """ Subconsultas que calculam total e quantidade_total de cada pedido a partir dos itens. """
+    itens = ItemPedido.objects.filter(pedido=OuterRef('pk')).order_by().values('pedido')
+    valor = itens.annotate(
+        soma=Sum(
+            F('quantidade') * Coalesce('preco_unitario', 'produto__preco'),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        )
+    ).values('soma')
+    quantidade = itens.annotate(soma=Sum('quantidade')).values('soma')
+    return {
+        'total': Coalesce(Subquery(valor), Value(Decimal('0.00'))),
+        'quantidade_total': Coalesce(Subquery(quantidade), Value(0)),
+    }
+
 class Pedido(models.Model):
+    # Transições permitidas entre eles: store/estados.py
     STATUS_CHOICES = (
         ('pendente', 'Pendente'),
+        ('solicitado', 'Solicitado'),
         ('em_preparo', 'Em Preparo'),
         ('saiu_para_entrega', 'Saiu para Entrega'),
         ('entregue', 'Entregue'),
         ('cancelado', 'Cancelado'),
+        ('limpo', 'Entregue (fora do painel)'),
     )
 
     cliente = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     data_pedido = models.DateTimeField(auto_now_add=True)
     finalizado = models.BooleanField(default=False)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente')
+    # Totais mantidos a cada alteração dos itens (ver atualizar_totais)
+    total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    quantidade_total = models.PositiveIntegerField(default=0)
 
     class Meta:
         verbose_name = "Pedido"
         verbose_name_plural = "Pedidos"
         ordering = ['-data_pedido']
+        indexes = [
+            # Índices parciais: o filtro por finalizado fica na condição do índice, que também fica
+            # menor (no SQLite um filtro booleano não serve de prefixo para um índice composto)
+            # "Meus pedidos": pedidos do cliente, do mais recente para o mais antigo
+            models.Index(
+                fields=['cliente', 'data_pedido'], condition=models.Q(finalizado=True), name='pedido_cliente_idx',
+            ),
+            # Painel da cozinha e limpeza dos entregues
+            models.Index(
+                fields=['status', 'data_pedido'], condition=models.Q(finalizado=True), name='pedido_kanban_idx',
+            ),
+            # Intervalos de datas (reconstrução dos resumos de vendas)
+            models.Index(fields=['data_pedido'], name='pedido_data_idx'),
+        ]
+        constraints = [
+            # Um único carrinho aberto por cliente; o get_or_create das views
+            # passa a ser seguro contra requisições simultâneas
+            models.UniqueConstraint(
+                fields=['cliente'], condition=models.Q(finalizado=False), name='um_carrinho_por_cliente',
+            ),
+        ]
 
     def __str__(self):
         return f"Pedido #{self.id} - {self.cliente.username}"
 
+    def registrar_precos(self):
+        """ Grava nos itens o preço e o nome atuais de cada produto, congelando o histórico do pedido. """
+        produto = Produto.objects.filter(pk=OuterRef('produto_id'))
+        self.itempedido_set.filter(produto__isnull=False).update(
+            preco_unitario=Subquery(produto.values('preco')),
+            nome_produto=Subquery(produto.values('nome')),
+        )
+
+    def atualizar_totais(self):
+        """ Recalcula total e quantidade_total no banco, num único UPDATE, e atualiza a instância. """
+        Pedido.objects.filter(pk=self.pk).update(**expressoes_totais())
+        self.refresh_from_db(fields=['total', 'quantidade_total'])
+
     @property
     def total_pedido(self):
-        """ Calcula o valor total de todos os itens no pedido. """
-        itens = self.itempedido_set.all()
-        total = sum([item.subtotal for item in itens])
-        return total
+        """ Valor total de todos os itens no pedido. """
+        return self.total
     
     @property
     def total_itens(self):
-        """ Calcula a quantidade total de itens no pedido. """
-        itens = self.itempedido_set.all()
-        total = sum([item.quantidade for item in itens])
-        return total
+        """ Quantidade total de itens no pedido. """
+        return self.quantidade_total
 
 class ItemPedido(models.Model):
     produto = models.ForeignKey(Produto, on_delete=models.SET_NULL, null=True)
     pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE)
     quantidade = models.PositiveIntegerField(default=1)
+    # Preço e nome do produto no momento em que o pedido foi finalizado
+    preco_unitario = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    nome_produto = models.CharField(max_length=100, blank=True)
     data_adicionado = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -59,8 +119,93 @@ class ItemPedido(models.Model):
     def subtotal(self):
         """ 
         Calcula o subtotal para este item (preço * quantidade).
+        Usa o preço registrado na finalização; antes disso, o preço atual do produto.
         CORREÇÃO AQUI: Retorna 0 se o produto foi removido.
         """
+        if self.preco_unitario is not None:
+            return self.preco_unitario * self.quantidade
         if self.produto and self.produto.preco is not None:
             return self.produto.preco * self.quantidade
-        return 0
\ No newline at end of file
+        return 0
+
+class PedidoArquivado(models.Model):
+    """
+    Pedido encerrado há mais de alguns dias, movido para fora da tabela de
+    pedidos pelo comando arquivar_pedidos. Mantém o id original, para os
+    links de acompanhamento continuarem valendo, e a mesma interface de
+    leitura de Pedido (itens em itempedido_set, total_pedido, total_itens).
+    """
+    id = models.BigIntegerField(primary_key=True)
+    cliente = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='pedidos_arquivados')
+    data_pedido = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=Pedido.STATUS_CHOICES)
+    total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    quantidade_total = models.PositiveIntegerField(default=0)
+    arquivado_em = models.DateTimeField(auto_now_add=True)
+
+    finalizado = True
+
+    class Meta:
+        verbose_name = "Pedido Arquivado"
+        verbose_name_plural = "Pedidos Arquivados"
+        ordering = ['-data_pedido']
+        indexes = [
+            models.Index(fields=['cliente', 'data_pedido'], name='pedido_arquivado_cliente_idx'),
+            models.Index(fields=['data_pedido'], name='pedido_arquivado_data_idx'),
+        ]
+
+    def __str__(self):
+        return f"Pedido #{self.id} (arquivado) - {self.cliente.username}"
+
+    @property
+    def total_pedido(self):
+        return self.total
+
+    @property
+    def total_itens(self):
+        return self.quantidade_total
+
+
+class ItemPedidoArquivado(models.Model):
+    pedido = models.ForeignKey(PedidoArquivado, on_delete=models.CASCADE, related_name='itempedido_set')
+    produto = models.ForeignKey(Produto, on_delete=models.SET_NULL, null=True, related_name='+')
+    quantidade = models.PositiveIntegerField(default=1)
+    preco_unitario = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    nome_produto = models.CharField(max_length=100, blank=True)
+    data_adicionado = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Item de Pedido Arquivado"
+        verbose_name_plural = "Itens de Pedidos Arquivados"
+
+    @property
+    def subtotal(self):
+        return (self.preco_unitario or 0) * self.quantidade
+
+
+class PedidoEvento(models.Model):
+    """
+    Uma mudança de status de um pedido, gravada na mesma transação da
+    mudança (ver store/historico.py). Os eventos só são acrescentados: o id
+    crescente serve de cursor para quem sincroniza. Guarda só o id do pedido,
+    sem chave estrangeira, para o histórico continuar valendo depois que o
+    pedido vai para o arquivo.
+    """
+    id = models.BigAutoField(primary_key=True)
+    pedido_id = models.BigIntegerField()
+    status = models.CharField(max_length=20, choices=Pedido.STATUS_CHOICES)
+    criado_em = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Evento de Pedido"
+        verbose_name_plural = "Eventos de Pedidos"
+        ordering = ['id']
+        indexes = [
+            # Linha do tempo de um pedido (e o evento anterior, nos tempos de preparo e entrega)
+            models.Index(fields=['pedido_id', 'id'], name='evento_pedido_idx'),
+            # Tempos de preparo e entrega num intervalo de datas
+            models.Index(fields=['status', 'criado_em'], name='evento_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Pedido #{self.pedido_id}: {self.status}"
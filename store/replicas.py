@@ -0,0 +1,165 @@
+"""
+Réplicas de leitura para as telas de consulta.
+
+As views marcadas com ``ler_da_replica`` (catálogo, painel da cozinha,
+dashboard e "meus pedidos") leem os modelos da loja e do restaurante de uma
+das réplicas em ``settings.REPLICAS``, sorteada por requisição. O resto
+(escritas, as demais views, sessões e usuários) fica no banco principal;
+sessões e usuários nunca vêm da réplica, então um login vale na hora.
+
+A réplica pode estar atrasada, por isso a view volta a ler do principal:
+
+- por ``REPLICA_FIXAR`` segundos depois de um POST do próprio navegador
+  (marcado com um cookie pelo ``ReplicaMiddleware``), para quem acabou de
+  fazer um pedido ou mudar um status ver a própria mudança;
+- por ``REPLICA_FIXAR`` segundos depois de avançar algum dos carimbos de
+  versão que a view usa como ETag (store/versoes.py). O ETag já anuncia a
+  versão nova, e uma resposta montada com os dados antigos da réplica
+  ficaria guardada no navegador como se fosse dela;
+- no resto da requisição, depois de uma escrita.
+"""
+import random
+import sqlite3
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .versoes import aultima_alteracao, ultima_alteracao
+
+# Apps cujos modelos podem ser lidos de uma réplica
+APPS_REPLICADOS = {'store', 'restaurant'}
+COOKIE = 'iffood_primario'
+METODOS_SEGUROS = {'GET', 'HEAD', 'OPTIONS', 'TRACE'}
+
+
+class Leitura:
+    __slots__ = ('alias',)
+
+    def __init__(self, alias):
+        self.alias = alias
+
+
+_leitura = ContextVar('replicas_leitura', default=None)
+
+
+def _recente(instante):
+    return instante is not None and time.time() - instante < settings.REPLICA_FIXAR
+
+
+def _sortear():
+    return random.choice(settings.REPLICAS)
+
+
+def _pode_usar_replica(request):
+    return bool(settings.REPLICAS) and COOKIE not in request.COOKIES
+
+
+def escolher(request, versoes):
+    """ Alias da réplica para esta requisição, ou None para ficar no principal. """
+    if not _pode_usar_replica(request) or (versoes and _recente(ultima_alteracao(*versoes))):
+        return None
+    return _sortear()
+
+
+async def aescolher(request, versoes):
+    if not _pode_usar_replica(request) or (versoes and _recente(await aultima_alteracao(*versoes))):
+        return None
+    return _sortear()
+
+
+def ler_da_replica(*versoes):
+    """
+    Lê os dados da view de uma réplica. versoes são os carimbos que a view
+    usa como ETag: logo depois de eles mudarem, a leitura fica no principal.
+    """
+    def decorador(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def _view(request, *args, **kwargs):
+                token = _leitura.set(Leitura(await aescolher(request, versoes)))
+                try:
+                    return await view(request, *args, **kwargs)
+                finally:
+                    _leitura.reset(token)
+        else:
+            @wraps(view)
+            def _view(request, *args, **kwargs):
+                token = _leitura.set(Leitura(escolher(request, versoes)))
+                try:
+                    return view(request, *args, **kwargs)
+                finally:
+                    _leitura.reset(token)
+        return _view
+    return decorador
+
+
+class RoteadorReplicas:
+    def db_for_read(self, model, **hints):
+        leitura = _leitura.get()
+        if leitura is None or leitura.alias is None:
+            return None
+        if model._meta.app_label in APPS_REPLICADOS:
+            return leitura.alias
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        leitura = _leitura.get()
+        if leitura is not None:
+            leitura.alias = None
+        # Também para objetos lidos de uma réplica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        bancos = {DEFAULT_DB_ALIAS, *settings.REPLICAS}
+        if obj1._state.db in bancos and obj2._state.db in bancos:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # As réplicas recebem o esquema junto com os dados
+        return False if db in settings.REPLICAS else None
+
+
+def copiar_sqlite(arquivos):
+    """
+    Copia o banco SQLite principal para cada arquivo pela API de backup do
+    SQLite: uma cópia consistente, feita sem parar as escritas nem os leitores
+    da réplica. Serve para testar as réplicas localmente.
+    """
+    principal = connections[DEFAULT_DB_ALIAS]
+    principal.ensure_connection()
+    for arquivo in arquivos:
+        destino = sqlite3.connect(arquivo)
+        try:
+            principal.connection.backup(destino)
+        finally:
+            destino.close()
+
+
+class ReplicaMiddleware:
+    """ Marca com um cookie o navegador que acabou de escrever: as leituras dele ficam no principal. """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self._marcar(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self._marcar(request, await self.get_response(request))
+
+    @staticmethod
+    def _marcar(request, response):
+        if settings.REPLICAS and request.method not in METODOS_SEGUROS:
+            response.set_cookie(COOKIE, '1', max_age=settings.REPLICA_FIXAR, httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,25 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .carrinho import CarrinhoOcupado, mesclar_visitante
+from .models import Pedido
+from .versoes import incrementar
+
+
+@receiver(post_save, sender=Pedido)
+@receiver(post_delete, sender=Pedido)
+def pedido_alterado(sender, instance, **kwargs):
+    # Carrinhos abertos não aparecem em nenhuma tela com polling
+    if instance.finalizado:
+        incrementar('pedidos', f'pedido:{instance.pk}', mudancas={'pedidos': [instance.pk]})
+
+
+@receiver(user_logged_in)
+def carrinho_do_visitante(sender, request, user, **kwargs):
+    if request is not None and hasattr(request, 'session'):
+        try:
+            mesclar_visitante(request, user)
+        except CarrinhoOcupado:
+            # O login não depende do carrinho: a mescla fica para a próxima alteração
+            pass
@@ -1,3 +1,938 @@
-from django.test import TestCase
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import IntegrityError, connection, router, transaction
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from iffood.cache import FileBasedCache
+from iffood.orcamento import OrcamentoConsultasMixin, nomes_de_urls
+from restaurant.kanban import pedidos_do_kanban
+from restaurant.models import Produto, VendaDiaria
+from restaurant.paginacao import Pagina
+from . import historico
+from .estados import TRANSICOES, TransicaoInvalida, mudar_status, pode_mudar
+from .eventos import BrokerLocal, CANAL_KANBAN, canal_pedido
+from .models import ItemPedido, ItemPedidoArquivado, Pedido, PedidoArquivado, PedidoEvento
+from .replicas import COOKIE, RoteadorReplicas, ler_da_replica
+from .versoes import incrementar
+
+
+class CarrinhoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user('cliente', password='senha')
+        cls.pizza = Produto.objects.create(nome='Pizza', descricao='Calabresa', preco=Decimal('30.00'))
+        cls.refri = Produto.objects.create(nome='Refri', descricao='Lata', preco=Decimal('5.50'))
+
+    def setUp(self):
+        caches['carrinhos'].clear()
+        self.client.force_login(self.cliente)
+
+    def adicionar(self, produto):
+        return self.client.post(reverse('store:adicionar_ao_carrinho', args=[produto.id]))
+
+    def test_alterar_o_carrinho_nao_escreve_no_banco(self):
+        with CaptureQueriesContext(connection) as consultas:
+            self.adicionar(self.pizza)
+            self.adicionar(self.pizza)
+            self.adicionar(self.refri)
+            self.client.post(reverse('store:atualizar_carrinho', args=[self.pizza.id]), {'action': 'dec'})
+            self.client.get(reverse('store:hx_contagem_carrinho'))
+        self.assertEqual([c['sql'] for c in consultas if not c['sql'].startswith('SELECT')], [])
+        self.assertFalse(Pedido.objects.exists())
+
+        with self.assertNumQueries(3):
+            # sessão, usuário e preços atuais
+            response = self.client.get(reverse('store:visualizar_carrinho'))
+        self.assertContains(response, 'R$ 35.50')
+        self.assertEqual(response.context['carrinho'].total_itens, 2)
+
+        response = self.client.post(reverse('store:remover_do_carrinho', args=[self.pizza.id]))
+        self.assertEqual(response.context['carrinho'].total, Decimal('5.50'))
+
+    def test_finalizar_grava_o_pedido_e_esvazia_o_carrinho(self):
+        self.adicionar(self.pizza)
+        self.adicionar(self.pizza)
+        self.adicionar(self.refri)
+        self.client.post(reverse('store:finalizar_pedido'))
+
+        pedido = Pedido.objects.get(cliente=self.cliente)
+        self.assertTrue(pedido.finalizado)
+        self.assertEqual(pedido.total, Decimal('65.50'))
+        self.assertEqual(pedido.quantidade_total, 3)
+        self.assertEqual(self.client.get(reverse('store:visualizar_carrinho')).context['carrinho'].total_itens, 0)
+
+    def test_testes_nao_usam_a_pasta_dos_carrinhos_reais(self):
+        pasta = caches['carrinhos']._dir
+        self.assertTrue(pasta.startswith(tempfile.gettempdir()))
+        self.assertNotEqual(pasta, str(settings.BASE_DIR / 'var' / 'carrinhos'))
+
+    def test_carrinho_mostra_e_cobra_os_precos_atuais(self):
+        self.adicionar(self.pizza)
+        self.adicionar(self.refri)
+        Produto.objects.filter(id=self.pizza.id).update(preco=Decimal('32.00'), nome='Pizza grande')
+        Produto.objects.filter(id=self.refri.id).update(ativo=False)
+
+        response = self.client.get(reverse('store:visualizar_carrinho'))
+        self.assertEqual([(item.nome, item.preco) for item in response.context['carrinho']], [('Pizza grande', Decimal('32.00'))])
+        self.assertEqual(response.context['carrinho'].total, Decimal('32.00'))
+
+        self.client.post(reverse('store:finalizar_pedido'))
+        pedido = Pedido.objects.get(cliente=self.cliente)
+        self.assertEqual(pedido.total, Decimal('32.00'))
+        self.assertEqual(list(pedido.itempedido_set.values_list('produto_id', flat=True)), [self.pizza.id])
+
+    def test_carrinho_do_visitante_e_mesclado_no_login(self):
+        self.adicionar(self.pizza)
+        self.client.logout()
+        self.adicionar(self.pizza)
+        self.adicionar(self.refri)
+        self.assertEqual(self.client.get(reverse('store:visualizar_carrinho')).context['carrinho'].total_itens, 2)
+
+        self.client.post(reverse('store:login'), {'username': 'cliente', 'password': 'senha'})
+        carrinho = self.client.get(reverse('store:visualizar_carrinho')).context['carrinho']
+        self.assertEqual({item.nome: item.quantidade for item in carrinho}, {'Pizza': 2, 'Refri': 1})
+
+    def test_carrinho_ocupado_responde_503_sem_alterar(self):
+        self.adicionar(self.pizza)
+        trava = f'carrinho:usuario:{self.cliente.pk}:trava'
+        caches['carrinhos'].add(trava, 1, 60)
+        with mock.patch('store.carrinho.ESPERA_TRAVA', 0.5), \
+                mock.patch.object(caches['carrinhos'], 'add', wraps=caches['carrinhos'].add) as add:
+            response = self.adicionar(self.pizza)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        # Espera crescente entre as tentativas, não uma a cada 10 ms
+        self.assertLess(add.call_count, 10)
+        with mock.patch('store.carrinho.ESPERA_TRAVA', 0):
+            response = self.client.post(reverse('store:finalizar_pedido'))
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(Pedido.objects.filter(finalizado=True).exists())
+
+        caches['carrinhos'].delete(trava)
+        self.assertEqual(self.client.get(reverse('store:visualizar_carrinho')).context['carrinho'].total_itens, 1)
+
+    def test_login_com_carrinho_ocupado_mescla_depois(self):
+        self.client.logout()
+        self.adicionar(self.refri)
+        trava = f'carrinho:usuario:{self.cliente.pk}:trava'
+        caches['carrinhos'].add(trava, 1, 60)
+        with mock.patch('store.carrinho.ESPERA_TRAVA', 0):
+            response = self.client.post(reverse('store:login'), {'username': 'cliente', 'password': 'senha'})
+        self.assertEqual(response.status_code, 302)
+
+        caches['carrinhos'].delete(trava)
+        self.adicionar(self.pizza)
+        carrinho = self.client.get(reverse('store:visualizar_carrinho')).context['carrinho']
+        self.assertEqual({item.nome: item.quantidade for item in carrinho}, {'Pizza': 1, 'Refri': 1})
+
+    def test_carrinho_aberto_no_banco_e_aproveitado(self):
+        pedido = Pedido.objects.create(cliente=self.cliente)
+        ItemPedido.objects.create(pedido=pedido, produto=self.refri, quantidade=2)
+        self.adicionar(self.pizza)
+        self.client.post(reverse('store:finalizar_pedido'))
+        pedido.refresh_from_db()
+        self.assertTrue(pedido.finalizado)
+        self.assertEqual(pedido.total, Decimal('41.00'))
+
+
+class ConcorrenciaCarrinhoTests(TransactionTestCase):
+    """ Requisições simultâneas de verdade, cada uma na sua thread e na sua conexão. """
+
+    def setUp(self):
+        caches['carrinhos'].clear()
+        self.cliente = User.objects.create_user('cliente', password='senha')
+        self.pizza = Produto.objects.create(nome='Pizza', descricao='Calabresa', preco=Decimal('30.00'))
+        self.client.force_login(self.cliente)
+
+    def em_paralelo(self, total, url):
+        sessao = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+
+        def requisicao(_):
+            cliente = Client()
+            cliente.cookies[settings.SESSION_COOKIE_NAME] = sessao
+            try:
+                return cliente.post(url).status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            return list(pool.map(requisicao, range(total)))
+
+    def test_200_adicoes_simultaneas_nao_perdem_incrementos(self):
+        status = self.em_paralelo(200, reverse('store:adicionar_ao_carrinho', args=[self.pizza.id]))
+        self.assertEqual(set(status), {200})
+        self.assertEqual(self.client.get(reverse('store:visualizar_carrinho')).context['carrinho'].total_itens, 200)
+
+        self.client.post(reverse('store:finalizar_pedido'))
+        self.assertEqual(ItemPedido.objects.get(pedido__cliente=self.cliente).quantidade, 200)
+
+    def test_finalizar_em_paralelo_gera_um_unico_pedido(self):
+        for _ in range(3):
+            self.client.post(reverse('store:adicionar_ao_carrinho', args=[self.pizza.id]))
+        status = self.em_paralelo(10, reverse('store:finalizar_pedido'))
+        self.assertEqual(set(status), {302})
+        pedido = Pedido.objects.get(cliente=self.cliente)
+        self.assertEqual((pedido.finalizado, pedido.quantidade_total), (True, 3))
+        self.assertEqual(VendaDiaria.objects.get().pedidos, 1)
+
+
+class CacheEmArquivosTests(SimpleTestCase):
+    def test_add_e_atomico_e_respeita_a_expiracao(self):
+        with tempfile.TemporaryDirectory() as pasta:
+            arquivos = FileBasedCache(pasta, {})
+            self.assertTrue(arquivos.add('trava', 1, 10))
+            self.assertFalse(arquivos.add('trava', 2, 10))
+            self.assertEqual(arquivos.get('trava'), 1)
+
+            arquivos.set('velha', 1, -1)
+            self.assertTrue(arquivos.add('velha', 2, 10))
+            self.assertEqual(arquivos.get('velha'), 2)
+
+    def test_gravar_nao_varre_a_pasta_e_podar_limpa(self):
+        with tempfile.TemporaryDirectory() as pasta:
+            arquivos = FileBasedCache(pasta, {'OPTIONS': {'MAX_ENTRIES': 10}})
+            with mock.patch.object(arquivos, '_list_cache_files', wraps=arquivos._list_cache_files) as listar:
+                for n in range(20):
+                    arquivos.set(f'expirada{n}', n, -1 if n < 5 else 60)
+                    arquivos.add(f'trava{n}', 1, 60)
+            listar.assert_not_called()
+            self.assertEqual(len(os.listdir(pasta)), 40)
+
+            # 35 válidas depois das expiradas; passando de 10, um terço é descartado
+            self.assertEqual(arquivos.podar(), 35 - 35 // 3)
+            self.assertFalse(arquivos.has_key('expirada0'))
+
+    def test_comando_poda_os_caches_em_arquivos(self):
+        caches['carrinhos'].set('velho', 1, -1)
+        saida = StringIO()
+        call_command('podar_cache', stdout=saida)
+        self.assertIn('carrinhos: ', saida.getvalue())
+        self.assertNotIn('default', saida.getvalue())
+        self.assertFalse(os.path.exists(caches['carrinhos']._key_to_file('velho')))
+
+
+class TotaisPedidoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user('cliente', password='senha')
+        cls.pizza = Produto.objects.create(nome='Pizza', descricao='Calabresa', preco=Decimal('30.00'))
+        cls.pedido = Pedido.objects.create(cliente=cls.cliente, finalizado=True, status='solicitado')
+        ItemPedido.objects.create(pedido=cls.pedido, produto=cls.pizza, quantidade=2)
+        cls.pedido.atualizar_totais()
+
+    def test_ler_totais_nao_consulta_o_banco(self):
+        pedido = Pedido.objects.get(id=self.pedido.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(pedido.total_pedido, Decimal('60.00'))
+            self.assertEqual(pedido.total_itens, 2)
+
+    def test_reconciliar_totais_corrige_divergencias(self):
+        Pedido.objects.filter(id=self.pedido.id).update(total=Decimal('10.00'))
+
+        saida = StringIO()
+        call_command('reconciliar_totais', '--dry-run', stdout=saida)
+        self.assertIn(f'{self.pedido.id}', saida.getvalue())
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.total, Decimal('10.00'))
+
+        call_command('reconciliar_totais', stdout=StringIO())
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.total, Decimal('60.00'))
+
+
+class HistoricoPedidoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user('cliente', password='senha')
+        cls.pizza = Produto.objects.create(nome='Pizza', descricao='Calabresa', preco=Decimal('30.00'))
+        cls.refri = Produto.objects.create(nome='Refri', descricao='Lata', preco=Decimal('5.50'))
+
+    def setUp(self):
+        caches['carrinhos'].clear()
+        self.client.force_login(self.cliente)
+        for produto in (self.pizza, self.pizza, self.refri):
+            self.client.post(reverse('store:adicionar_ao_carrinho', args=[produto.id]))
+        self.client.post(reverse('store:finalizar_pedido'))
+        self.pedido = Pedido.objects.get(cliente=self.cliente, finalizado=True)
+
+    def test_finalizar_registra_preco_e_nome(self):
+        item = ItemPedido.objects.get(pedido=self.pedido, produto=self.pizza)
+        self.assertEqual(item.preco_unitario, Decimal('30.00'))
+        self.assertEqual(item.nome_produto, 'Pizza')
+
+    def test_historico_nao_muda_com_o_preco_do_produto(self):
+        Produto.objects.filter(id=self.pizza.id).update(preco=Decimal('99.00'), nome='Pizza Nova')
+        response = self.client.get(reverse('store:meus_pedidos'))
+        self.assertContains(response, '2x Pizza')
+        self.assertContains(response, 'R$ 65.50')
+        self.assertNotContains(response, 'Pizza Nova')
+
+    def test_historico_nao_consulta_produtos(self):
+        url = reverse('store:acompanhar_pedido', args=[self.pedido.id])
+        with self.assertNumQueries(4):
+            # sessão, usuário, pedido e itens
+            response = self.client.get(url)
+        self.assertContains(response, 'R$ 65.50')
+
+
+class EventosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user('cliente', password='senha')
+        cls.pizza = Produto.objects.create(nome='Pizza', descricao='Calabresa', preco=Decimal('30.00'))
+
+    def test_broker_entrega_apenas_aos_assinantes_do_canal(self):
+        broker = BrokerLocal()
+
+        async def cenario():
+            async with broker.assinatura([CANAL_KANBAN]) as kanban, broker.assinatura(['outro']) as outro:
+                self.assertEqual(broker.total_assinaturas(CANAL_KANBAN), 1)
+                broker.publicar(CANAL_KANBAN, {'tipo': 'status', 'pedido': 1})
+                self.assertEqual(await kanban.receber(timeout=1), {'tipo': 'status', 'pedido': 1})
+                with self.assertRaises(TimeoutError):
+                    await outro.receber(timeout=0.01)
+            self.assertEqual(broker.total_assinaturas(CANAL_KANBAN), 0)
+
+        asyncio.run(cenario())
+
+    def test_finalizar_pedido_publica_depois_do_commit(self):
+        caches['carrinhos'].clear()
+        self.client.force_login(self.cliente)
+        self.client.post(reverse('store:adicionar_ao_carrinho', args=[self.pizza.id]))
+        with mock.patch('store.eventos.broker') as broker:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('store:finalizar_pedido'))
+        pedido = Pedido.objects.get(cliente=self.cliente, finalizado=True)
+        evento = {'tipo': 'status', 'pedido': pedido.id, 'status': 'solicitado'}
+        broker.return_value.publicar.assert_any_call(CANAL_KANBAN, evento)
+        broker.return_value.publicar.assert_any_call(canal_pedido(pedido.id), evento)
+
+    def test_canal_do_pedido_exige_o_dono(self):
+        pedido = Pedido.objects.create(cliente=self.cliente, finalizado=True, status='solicitado')
+        outro = User.objects.create_user('outro', password='senha')
+        self.client.force_login(outro)
+        response = self.client.get(reverse('store:eventos_pedido', args=[pedido.id]))
+        self.assertEqual(response.status_code, 404)
+
+        # Sob WSGI o canal responde 204 para o navegador não ficar reconectando
+        self.client.force_login(self.cliente)
+        response = self.client.get(reverse('store:eventos_pedido', args=[pedido.id]))
+        self.assertEqual(response.status_code, 204)
+
+
+class EstadosPedidoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('cozinha', password='senha', is_staff=True)
+        cls.cliente = User.objects.create_user('cliente', password='senha')
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def criar(self, status, quantidade=1):
+        return [Pedido.objects.create(cliente=self.cliente, finalizado=True, status=status) for _ in range(quantidade)]
+
+    def test_transicoes_validas_e_invalidas(self):
+        self.assertTrue(pode_mudar('solicitado', 'em_preparo'))
+        self.assertFalse(pode_mudar('solicitado', 'entregue'))
+        self.assertFalse(pode_mudar('cancelado', 'em_preparo'))
+        with self.assertRaises(TransicaoInvalida):
+            mudar_status('pendente')
+
+    def test_clique_duplo_nao_avanca_duas_vezes(self):
+        pedido, = self.criar('solicitado')
+        url = reverse('restaurant:aceitar_pedido', args=[pedido.id])
+        self.assertEqual(self.client.post(url).status_code, 200)
+        self.assertEqual(self.client.post(url).status_code, 409)
+        pedido.refresh_from_db()
+        self.assertEqual(pedido.status, 'em_preparo')
+
+        # Pular etapas também é recusado
+        solicitado, = self.criar('solicitado')
+        response = self.client.post(reverse('restaurant:marcar_como_finalizado', args=[solicitado.id]))
+        self.assertEqual(response.status_code, 409)
+
+    def test_lote_muda_so_os_pedidos_elegiveis_num_unico_update(self):
+        solicitados = self.criar('solicitado', 3)
+        em_preparo, = self.criar('em_preparo')
+        ids = [pedido.id for pedido in solicitados] + [em_preparo.id]
+        with self.captureOnCommitCallbacks() as callbacks, CaptureQueriesContext(connection) as consultas:
+            response = self.client.post(
+                reverse('restaurant:mudar_status_em_lote'), {'pedidos': ids, 'status': 'em_preparo'},
+            )
+        self.assertEqual(response.status_code, 200)
+        updates = [c['sql'] for c in consultas if c['sql'].startswith('UPDATE "store_pedido"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(Pedido.objects.filter(status='em_preparo').count(), 4)
+        # Carimbos de versão e evento do painel ficam para depois do commit
+        self.assertEqual(len(callbacks), 2)
+
+        response = self.client.post(reverse('restaurant:mudar_status_em_lote'), {'pedidos': ids, 'status': 'xyz'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_status_exige_staff(self):
+        pedido, = self.criar('em_preparo')
+        self.client.force_login(self.cliente)
+        self.client.post(reverse('restaurant:marcar_como_em_entrega', args=[pedido.id]))
+        pedido.refresh_from_db()
+        self.assertEqual(pedido.status, 'em_preparo')
+
+    def test_todos_os_status_usados_estao_nas_choices(self):
+        choices = dict(Pedido.STATUS_CHOICES)
+        for destino, origens in TRANSICOES.items():
+            self.assertIn(destino, choices)
+            for origem in origens:
+                self.assertIn(origem, choices)
+
+
+class PedidoEventoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user('cliente', password='senha')
+        cls.staff = User.objects.create_user('cozinha', password='senha', is_staff=True)
+        cls.pizza = Produto.objects.create(nome='Pizza', descricao='Calabresa', preco=Decimal('30.00'))
+
+    def setUp(self):
+        caches['carrinhos'].clear()
+
+    def finalizar(self):
+        self.client.force_login(self.cliente)
+        self.client.post(reverse('store:adicionar_ao_carrinho', args=[self.pizza.id]))
+        self.client.post(reverse('store:finalizar_pedido'))
+        return Pedido.objects.get(cliente=self.cliente, finalizado=True)
+
+    def test_checkout_e_transicoes_gravam_eventos(self):
+        pedido = self.finalizar()
+        mudar_status('em_preparo', [pedido.id])
+        # Transição que não acontece não gera evento
+        mudar_status('cancelado', [pedido.id])
+        self.assertEqual(
+            list(PedidoEvento.objects.values_list('pedido_id', 'status')),
+            [(pedido.id, 'solicitado'), (pedido.id, 'em_preparo')],
+        )
+
+    def test_eventos_depois_do_cursor(self):
+        pedido = self.finalizar()
+        cursor = PedidoEvento.objects.get().id
+        mudar_status('em_preparo', [pedido.id])
+        mudar_status('saiu_para_entrega', [pedido.id])
+
+        self.assertEqual([status for _, _, status, _ in historico.eventos_desde(cursor)], ['em_preparo', 'saiu_para_entrega'])
+        self.assertEqual(len(historico.eventos_desde(cursor, limite=1)), 1)
+
+        self.client.force_login(self.cliente)
+        url = reverse('restaurant:historico_pedidos')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(self.staff)
+        resposta = self.client.get(url, {'cursor': cursor, 'limite': 1})
+        self.assertNotIn(b' ', resposta.content)
+        dados = resposta.json()
+        self.assertEqual(dados['campos'], ['id', 'pedido', 'status', 'em'])
+        self.assertEqual([evento[1:3] for evento in dados['eventos']], [[pedido.id, 'em_preparo']])
+        self.assertTrue(dados['mais'])
+        # Continua de onde parou
+        dados = self.client.get(url, {'cursor': dados['cursor']}).json()
+        self.assertEqual([evento[2] for evento in dados['eventos']], ['saiu_para_entrega'])
+        self.assertFalse(dados['mais'])
+        self.assertEqual(self.client.get(url, {'cursor': 'x'}).status_code, 400)
+
+    def test_tempos_medios_de_preparo_e_entrega(self):
+        hoje = timezone.localdate()
+        meio_dia = timezone.make_aware(timezone.datetime(hoje.year, hoje.month, hoje.day, 12))
+        # (pedido, status, minutos depois do meio-dia): preparo de 20 e 40 minutos, entrega de 30
+        for pedido_id, status, minutos in [
+            (1, 'em_preparo', 0), (1, 'saiu_para_entrega', 20), (1, 'entregue', 50),
+            (2, 'em_preparo', 0), (2, 'saiu_para_entrega', 40),
+        ]:
+            PedidoEvento.objects.create(pedido_id=pedido_id, status=status, criado_em=meio_dia + timezone.timedelta(minutes=minutos))
+
+        tempos = historico.tempos_medios(hoje, hoje)
+        self.assertEqual(tempos, {'preparo': timezone.timedelta(minutes=30), 'entrega': timezone.timedelta(minutes=30)})
+        ontem = hoje - timezone.timedelta(days=1)
+        self.assertEqual(historico.tempos_medios(ontem, ontem), {'preparo': None, 'entrega': None})
+
+
+class ArquivoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user('cliente', password='senha')
+        cls.pizza = Produto.objects.create(nome='Pizza', descricao='Calabresa', preco=Decimal('30.00'))
+
+    def setUp(self):
+        self.client.force_login(self.cliente)
+
+    def criar(self, status, dias_atras):
+        pedido = Pedido.objects.create(cliente=self.cliente, finalizado=True, status=status)
+        ItemPedido.objects.create(pedido=pedido, produto=self.pizza, quantidade=2)
+        pedido.registrar_precos()
+        pedido.atualizar_totais()
+        Pedido.objects.filter(id=pedido.id).update(data_pedido=timezone.now() - timezone.timedelta(days=dias_atras))
+        return pedido
+
+    def test_move_apenas_pedidos_encerrados_e_antigos(self):
+        antigos = [self.criar('limpo', 60), self.criar('cancelado', 45)]
+        recente = self.criar('limpo', 2)
+        no_painel = self.criar('entregue', 60)
+
+        call_command('arquivar_pedidos', '--dias=30', stdout=StringIO())
+
+        self.assertEqual(set(Pedido.objects.values_list('id', flat=True)), {recente.id, no_painel.id})
+        self.assertEqual(set(PedidoArquivado.objects.values_list('id', flat=True)), {p.id for p in antigos})
+        arquivado = PedidoArquivado.objects.get(id=antigos[0].id)
+        self.assertEqual((arquivado.total, arquivado.status), (Decimal('60.00'), 'limpo'))
+        item = arquivado.itempedido_set.get()
+        self.assertEqual((item.quantidade, item.nome_produto, item.subtotal), (2, 'Pizza', Decimal('60.00')))
+        self.assertFalse(ItemPedido.objects.filter(pedido_id__in=[p.id for p in antigos]).exists())
+
+    def test_idade_conta_do_encerramento(self):
+        encerrado_agora = self.criar('limpo', 60)
+        encerrado_antes = self.criar('cancelado', 60)
+        PedidoEvento.objects.bulk_create([
+            PedidoEvento(pedido_id=encerrado_agora.id, status='entregue', criado_em=timezone.now() - timezone.timedelta(days=3)),
+            PedidoEvento(pedido_id=encerrado_agora.id, status='limpo', criado_em=timezone.now() - timezone.timedelta(days=2)),
+            PedidoEvento(pedido_id=encerrado_antes.id, status='cancelado', criado_em=timezone.now() - timezone.timedelta(days=40)),
+        ])
+        call_command('arquivar_pedidos', '--dias=30', stdout=StringIO())
+        self.assertEqual(list(Pedido.objects.values_list('id', flat=True)), [encerrado_agora.id])
+        self.assertEqual(list(PedidoArquivado.objects.values_list('id', flat=True)), [encerrado_antes.id])
+
+    def test_interrompido_continua_de_onde_parou(self):
+        for _ in range(5):
+            self.criar('limpo', 60)
+        call_command('arquivar_pedidos', '--lote=2', '--max-lotes=1', stdout=StringIO())
+        self.assertEqual((Pedido.objects.count(), PedidoArquivado.objects.count()), (3, 2))
+        call_command('arquivar_pedidos', '--lote=2', stdout=StringIO())
+        self.assertEqual((Pedido.objects.count(), PedidoArquivado.objects.count()), (0, 5))
+        self.assertEqual(ItemPedidoArquivado.objects.count(), 5)
+
+    def test_cliente_continua_vendo_os_pedidos_arquivados(self):
+        antigo = self.criar('limpo', 60)
+        recente = self.criar('em_preparo', 0)
+        call_command('arquivar_pedidos', stdout=StringIO())
+
+        response = self.client.get(reverse('store:meus_pedidos'))
+        self.assertEqual([pedido.id for pedido in response.context['pedidos']], [recente.id, antigo.id])
+        self.assertContains(response, 'R$ 60.00', count=2)
+
+        response = self.client.get(reverse('store:acompanhar_pedido', args=[antigo.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['arquivado'])
+        self.assertNotContains(response, 'sse-connect')
+
+        outro = User.objects.create_user('outro', password='senha')
+        self.client.force_login(outro)
+        self.assertEqual(self.client.get(reverse('store:acompanhar_pedido', args=[antigo.id])).status_code, 404)
+
+    def test_reconstruir_vendas_inclui_os_arquivados(self):
+        self.criar('limpo', 60)
+        self.criar('limpo', 0)
+        call_command('arquivar_pedidos', stdout=StringIO())
+        call_command('reconstruir_vendas', stdout=StringIO())
+        self.assertEqual(sum(VendaDiaria.objects.values_list('pedidos', flat=True)), 2)
+
+
+class OrcamentoConsultasTests(OrcamentoConsultasMixin, TestCase):
+    """ Máximo de consultas de cada URL da loja, que não pode crescer com os dados. """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user('cliente', password='senha')
+
+    def povoar(self, quantidade):
+        novos = Produto.objects.bulk_create(
+            Produto(nome=f'Produto {n}', descricao='Teste', preco=Decimal('10.00')) for n in range(quantidade)
+        )
+        pedidos = Pedido.objects.bulk_create(
+            Pedido(cliente=self.cliente, finalizado=True, status='em_preparo', total=Decimal('20.00'), quantidade_total=2)
+            for _ in range(quantidade)
+        )
+        arquivados = PedidoArquivado.objects.bulk_create(
+            PedidoArquivado(id=pedido.id + 1_000_000, cliente=self.cliente, data_pedido=timezone.now(),
+                            status='limpo', total=Decimal('20.00'), quantidade_total=2)
+            for pedido in pedidos
+        )
+        ItemPedido.objects.bulk_create(
+            ItemPedido(pedido=pedido, produto=produto, quantidade=2, preco_unitario=produto.preco, nome_produto=produto.nome)
+            for pedido, produto in zip(pedidos, novos)
+        )
+        ItemPedidoArquivado.objects.bulk_create(
+            ItemPedidoArquivado(pedido=pedido, produto=produto, quantidade=2, preco_unitario=produto.preco,
+                                nome_produto=produto.nome, data_adicionado=timezone.now())
+            for pedido, produto in zip(arquivados, novos)
+        )
+
+    def encher_carrinho(self, itens):
+        caches['carrinhos'].clear()
+        for produto in Produto.objects.order_by('id')[:itens]:
+            self.client.post(reverse('store:adicionar_ao_carrinho', args=[produto.id]))
+
+    def orcamentos(self):
+        cliente = self.cliente
+        pedido = lambda: Pedido.objects.filter(cliente=cliente, finalizado=True).first().id
+        arquivado = lambda: PedidoArquivado.objects.first().id
+        produto = lambda: Produto.objects.order_by('id').first().id
+        return [
+            ('store:cadastro', 0, self.requisicao(None, 'get', 'store:cadastro')),
+            ('store:login', 0, self.requisicao(None, 'get', 'store:login')),
+            ('store:logout', 4, self.requisicao(cliente, 'post', 'store:logout')),
+            ('store:lista_produtos', 3, self.requisicao(cliente, 'get', 'store:lista_produtos')),
+            ('store:lista_produtos', 3, self.requisicao(cliente, 'get', 'store:lista_produtos', data={'q': 'produto'})),
+            ('store:lista_produtos', 1, self.requisicao(None, 'get', 'store:lista_produtos', HTTP_HX_REQUEST='true')),
+            ('store:visualizar_carrinho', 3, self.requisicao(cliente, 'get', 'store:visualizar_carrinho', preparar=self.encher_carrinho)),
+            ('store:adicionar_ao_carrinho', 3, self.requisicao(
+                cliente, 'post', 'store:adicionar_ao_carrinho', produto, preparar=self.encher_carrinho)),
+            ('store:atualizar_carrinho', 3, self.requisicao(
+                cliente, 'post', 'store:atualizar_carrinho', produto, data={'action': 'inc'}, preparar=self.encher_carrinho)),
+            ('store:remover_do_carrinho', 3, self.requisicao(
+                cliente, 'post', 'store:remover_do_carrinho', produto, preparar=self.encher_carrinho)),
+            ('store:hx_contagem_carrinho', 2, self.requisicao(cliente, 'get', 'store:hx_contagem_carrinho', preparar=self.encher_carrinho)),
+            ('store:finalizar_pedido', 25, self.requisicao(cliente, 'post', 'store:finalizar_pedido', preparar=self.encher_carrinho)),
+            ('store:meus_pedidos', 6, self.requisicao(cliente, 'get', 'store:meus_pedidos')),
+            ('store:acompanhar_pedido', 4, self.requisicao(cliente, 'get', 'store:acompanhar_pedido', pedido)),
+            ('store:acompanhar_pedido', 5, self.requisicao(cliente, 'get', 'store:acompanhar_pedido', arquivado)),
+            ('store:hx_acompanhar_pedido_status', 3, self.requisicao(
+                cliente, 'get', 'store:hx_acompanhar_pedido_status', pedido, HTTP_HX_REQUEST='true')),
+            ('store:eventos_pedido', 3, self.requisicao(cliente, 'get', 'store:eventos_pedido', pedido)),
+        ]
+
+    def test_todas_as_urls_tem_orcamento(self):
+        self.assertEqual(set(nomes_de_urls('store.urls')), {nome for nome, _, _ in self.orcamentos()})
+
+    def test_orcamentos(self):
+        self.assertOrcamentos(self.orcamentos())
+
+
+class PollingCondicionalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user('cliente', password='senha')
+        cls.pizza = Produto.objects.create(nome='Pizza', descricao='Calabresa', preco=Decimal('30.00'))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_catalogo_responde_304_sem_consultas(self):
+        url = reverse('store:lista_produtos')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Produto.objects.create(nome='Refri', descricao='Lata', preco=Decimal('5.50'))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Refri')
+
+    def test_status_do_pedido_muda_o_etag(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            pedido = Pedido.objects.create(cliente=self.cliente, finalizado=True, status='solicitado')
+        self.client.force_login(self.cliente)
+        url = reverse('store:hx_acompanhar_pedido_status', args=[pedido.id])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        pedido.status = 'em_preparo'
+        with self.captureOnCommitCallbacks(execute=True):
+            pedido.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ViewsAssincronasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user('cliente', password='senha')
+        cls.outro = User.objects.create_user('outro', password='senha')
+        cls.pizza = Produto.objects.create(nome='Pizza', descricao='Calabresa', preco=Decimal('30.00'))
+        cls.pedido = Pedido.objects.create(cliente=cls.cliente, finalizado=True, status='solicitado')
+
+    def setUp(self):
+        cache.clear()
+        caches['carrinhos'].clear()
+
+    async def test_status_do_pedido_exige_login_e_o_dono(self):
+        url = reverse('store:hx_acompanhar_pedido_status', args=[self.pedido.id])
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(f'?next={url}', response['Location'])
+
+        await self.async_client.aforce_login(self.outro)
+        self.assertEqual((await self.async_client.get(url)).status_code, 404)
+
+    async def test_status_do_pedido_responde_304_no_event_loop(self):
+        await self.async_client.aforce_login(self.cliente)
+        url = reverse('store:hx_acompanhar_pedido_status', args=[self.pedido.id])
+        response = await self.async_client.get(url)
+        self.assertContains(response, 'Solicitado')
+        response = await self.async_client.get(url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_contagem_do_carrinho(self):
+        await self.async_client.aforce_login(self.cliente)
+        await self.async_client.post(reverse('store:adicionar_ao_carrinho', args=[self.pizza.id]))
+        await self.async_client.post(reverse('store:adicionar_ao_carrinho', args=[self.pizza.id]))
+        response = await self.async_client.get(reverse('store:hx_contagem_carrinho'))
+        self.assertEqual(response.context['carrinho'].total_itens, 2)
+
+
+class CatalogoEmCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = User.objects.create_user('cliente', password='senha')
+        cls.pizza = Produto.objects.create(nome='Pizza', descricao='Calabresa', preco=Decimal('30.00'))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_grade_em_cache_nao_consulta_produtos(self):
+        url = reverse('store:lista_produtos')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, 'Pizza')
+
+        # O mesmo fragmento atende usuários logados; só o body muda
+        self.client.force_login(self.cliente)
+        with self.assertNumQueries(2):
+            # sessão e usuário
+            response = self.client.get(url)
+        self.assertContains(response, 'class="bg-light autenticado"')
+
+    def test_carregar_mais_mantem_a_busca(self):
+        for n in range(29):
+            Produto.objects.create(nome=f'Pizza {n:02}', descricao='Sabor', preco=Decimal('30.00'))
+        url = reverse('store:lista_produtos')
+        response = self.client.get(url, {'q': 'pizza'})
+        self.assertEqual(response.content.decode().count('card-title'), 24)
+        self.assertContains(response, '&q=pizza')
+
+        cursor = response.context['pagina'].proximo_cursor
+        response = self.client.get(url, {'q': 'pizza', 'cursor': cursor}, HTTP_HX_REQUEST='true')
+        self.assertEqual(response.content.decode().count('card-title'), 6)
+        self.assertNotContains(response, 'Nossos Produtos')
+
+    def test_polling_troca_so_a_primeira_pagina(self):
+        for n in range(29):
+            Produto.objects.create(nome=f'Pizza {n:02}', descricao='Sabor', preco=Decimal('30.00'))
+        url = reverse('store:lista_produtos')
+        response = self.client.get(url)
+        self.assertContains(response, 'id="grade-produtos"')
+        self.assertContains(response, 'hx-select="#grade-produtos"')
+        # O polling para quando a grade tem cards de uma página carregada depois
+        self.assertContains(response, "hx-trigger=\"every 10s [!this.querySelector('[data-pagina-seguinte]')]\"")
+        self.assertNotContains(response, 'data-pagina-seguinte>')
+
+        cursor = response.context['pagina'].proximo_cursor
+        response = self.client.get(url, {'cursor': cursor}, HTTP_HX_REQUEST='true')
+        self.assertEqual(response.content.decode().count('<div class="col" data-pagina-seguinte>'), 6)
+
+    def test_salvar_produto_invalida_a_grade(self):
+        url = reverse('store:lista_produtos')
+        self.client.get(url)
+        self.pizza.preco = Decimal('35.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pizza.save()
+        self.assertContains(self.client.get(url), 'R$ 35.00')
+
+
+@override_settings(REPLICAS=['replica1', 'replica2'], REPLICA_FIXAR=5)
+class ReplicasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('cozinha', password='senha', is_staff=True)
+        cls.cliente = User.objects.create_user('cliente', password='senha')
+        cls.pizza = Produto.objects.create(nome='Pizza', descricao='Calabresa', preco=Decimal('30.00'))
+
+    def setUp(self):
+        cache.clear()
+
+    def ler(self, *versoes, cookies=None, escrever=False):
+        """ Bancos para onde o roteador manda ler um Pedido e um User dentro de uma view de consulta. """
+        @ler_da_replica(*versoes)
+        def view(request):
+            if escrever:
+                router.db_for_write(Pedido)
+            return router.db_for_read(Pedido), router.db_for_read(User)
+
+        request = RequestFactory().get('/')
+        request.COOKIES.update(cookies or {})
+        return view(request)
+
+    def test_consulta_le_os_pedidos_da_replica_e_os_usuarios_do_principal(self):
+        pedidos, usuarios = self.ler()
+        self.assertIn(pedidos, settings.REPLICAS)
+        self.assertEqual(usuarios, 'default')
+        # Fora das views de consulta, tudo no principal
+        self.assertEqual(router.db_for_read(Pedido), 'default')
+        self.assertEqual(router.db_for_write(Pedido), 'default')
+
+    def test_quem_acabou_de_escrever_le_do_principal(self):
+        self.assertEqual(self.ler(cookies={COOKIE: '1'}), ('default', 'default'))
+        self.assertEqual(self.ler(escrever=True)[0], 'default')
+
+    def test_dados_recem_alterados_sao_lidos_do_principal(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            incrementar('pedidos')
+        self.assertEqual(self.ler('pedidos')[0], 'default')
+        self.assertIn(self.ler('produtos')[0], settings.REPLICAS)
+        with mock.patch('store.replicas.time.time', return_value=time.time() + 5):
+            self.assertIn(self.ler('pedidos')[0], settings.REPLICAS)
+
+    async def test_view_assincrona(self):
+        @ler_da_replica('pedidos')
+        async def view(request):
+            return await sync_to_async(router.db_for_read)(Pedido)
+
+        self.assertIn(await view(RequestFactory().get('/')), settings.REPLICAS)
+
+    def test_post_marca_o_navegador_por_alguns_segundos(self):
+        self.client.force_login(self.cliente)
+        response = self.client.post(reverse('store:adicionar_ao_carrinho', args=[self.pizza.id]))
+        self.assertEqual(response.cookies[COOKIE]['max-age'], 5)
+        self.assertNotIn(COOKIE, self.client.get(reverse('store:visualizar_carrinho')).cookies)
+
+    def test_replicas_nao_recebem_migracoes(self):
+        self.assertIs(router.allow_migrate('replica1', 'store'), False)
+        self.assertIs(router.allow_migrate('default', 'store'), True)
+
+    @override_settings(REPLICAS=['default'])
+    def test_telas_de_consulta_usam_a_replica(self):
+        # A "réplica" é o próprio banco de testes: o que conta é o roteador escolhê-la
+        destinos = []
+        original = RoteadorReplicas.db_for_read
+
+        def espiar(roteador, model, **hints):
+            destino = original(roteador, model, **hints)
+            destinos.append((model._meta.label, destino))
+            return destino
+
+        pedido = Pedido.objects.create(cliente=self.cliente, finalizado=True, status='solicitado')
+        telas = [
+            (self.cliente, reverse('store:lista_produtos'), 'restaurant.Produto'),
+            (self.cliente, reverse('store:meus_pedidos'), 'store.Pedido'),
+            (self.staff, reverse('restaurant:gestao_pedidos'), 'store.Pedido'),
+            (self.staff, reverse('restaurant:dashboard'), 'restaurant.VendaDiaria'),
+        ]
+        with mock.patch.object(RoteadorReplicas, 'db_for_read', espiar):
+            for usuario, url, modelo in telas:
+                with self.subTest(url):
+                    self.client.force_login(usuario)
+                    destinos.clear()
+                    self.assertEqual(self.client.get(url).status_code, 200)
+                    self.assertIn((modelo, 'default'), destinos)
+
+            destinos.clear()
+            self.client.force_login(self.cliente)
+            self.client.get(reverse('store:acompanhar_pedido', args=[pedido.id]))
+            self.assertIn(('store.Pedido', None), destinos)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'cópia de bancos SQLite')
+class SincronizarReplicasTests(TransactionTestCase):
+    # Fora de uma transação: o SQLite não copia um banco com escritas pendentes
+    def test_copia_o_banco_principal(self):
+        Produto.objects.create(nome='Pizza', descricao='Calabresa', preco=Decimal('30.00'))
+        with tempfile.TemporaryDirectory() as pasta:
+            arquivo = os.path.join(pasta, 'replica.sqlite3')
+            call_command('sincronizar_replicas', arquivo, stdout=StringIO())
+            with closing(sqlite3.connect(arquivo)) as replica:
+                self.assertEqual(replica.execute('SELECT nome FROM restaurant_produto').fetchall(), [('Pizza',)])
+
+
+class IndicesTests(TestCase):
+    """ Confere com EXPLAIN que as consultas principais das views usam índices, numa base com 100 mil pedidos. """
+
+    TOTAL_PEDIDOS = 100_000
+    TOTAL_CLIENTES = 1_000
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.bulk_create(User(username=f'cliente{n}') for n in range(cls.TOTAL_CLIENTES))
+        clientes = list(User.objects.values_list('id', flat=True))
+        cls.cliente_id = clientes[0]
+        Produto.objects.bulk_create(
+            Produto(nome=f'Produto {n}', descricao='Teste', preco=Decimal('10.00'), ativo=n % 10 != 0)
+            for n in range(500)
+        )
+
+        # Um carrinho aberto por cliente; dos finalizados, a maioria já saiu do painel
+        ativos = ['solicitado', 'em_preparo', 'saiu_para_entrega', 'entregue', 'cancelado']
+        pedidos = [Pedido(cliente_id=cliente_id) for cliente_id in clientes]
+        for n in range(cls.TOTAL_PEDIDOS - len(clientes)):
+            status = ativos[n % len(ativos)] if n % 100 == 0 else 'limpo'
+            pedidos.append(Pedido(cliente_id=clientes[n % len(clientes)], finalizado=True, status=status))
+        Pedido.objects.bulk_create(pedidos, batch_size=5_000)
+
+        # Espalha os pedidos por 100 dias (o bulk_create grava a mesma data em todos)
+        agora = timezone.now()
+        ids = list(Pedido.objects.order_by('id').values_list('id', flat=True)[::1_000]) + [None]
+        for dias, (primeiro, proximo) in enumerate(zip(ids, ids[1:])):
+            faixa = Pedido.objects.filter(id__gte=primeiro)
+            if proximo is not None:
+                faixa = faixa.filter(id__lt=proximo)
+            faixa.update(data_pedido=agora - timezone.timedelta(days=dias))
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def plano(self, queryset):
+        return queryset.explain()
+
+    def assertUsaIndice(self, queryset, indice):
+        plano = self.plano(queryset)
+        self.assertIn(indice, plano, plano)
+        if connection.vendor == 'sqlite':
+            self.assertNotRegex(plano, r'SCAN (store_pedido|restaurant_produto)\b(?! USING)', plano)
+        elif connection.vendor == 'postgresql':
+            self.assertNotIn('Seq Scan', plano, plano)
+
+    def test_carrinho_aberto(self):
+        self.assertUsaIndice(
+            Pedido.objects.filter(cliente_id=self.cliente_id, finalizado=False), 'um_carrinho_por_cliente',
+        )
+
+    def test_meus_pedidos(self):
+        consulta = Pedido.objects.filter(cliente_id=self.cliente_id, finalizado=True).order_by('-data_pedido')
+        self.assertUsaIndice(consulta, 'pedido_cliente_idx')
+        # A ordenação sai do próprio índice
+        self.assertNotIn('TEMP B-TREE', self.plano(consulta))
+
+    def test_painel_da_cozinha(self):
+        self.assertUsaIndice(pedidos_do_kanban(), 'pedido_kanban_idx')
+        self.assertNotIn('TEMP B-TREE', self.plano(pedidos_do_kanban()))
+        self.assertUsaIndice(Pedido.objects.filter(finalizado=True, status='entregue'), 'pedido_kanban_idx')
+
+    def test_intervalo_de_datas(self):
+        inicio = timezone.now() - timezone.timedelta(days=2)
+        self.assertUsaIndice(Pedido.objects.filter(data_pedido__gte=inicio), 'pedido_data_idx')
+
+    def test_paginas_do_catalogo(self):
+        catalogo = Pagina(Produto.objects.filter(ativo=True), tamanho=24)
+        self.assertUsaIndice(catalogo.queryset.order_by('nome', 'id')[:25], 'produto_ativo_nome_idx')
+        painel = Pagina(Produto.objects.all(), tamanho=24)
+        self.assertUsaIndice(painel.queryset.order_by('nome', 'id')[:25], 'produto_nome_idx')
+
+    def test_um_unico_carrinho_aberto_por_cliente(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Pedido.objects.create(cliente_id=self.cliente_id)
+        # Pedidos finalizados não entram na restrição
+        Pedido.objects.create(cliente_id=self.cliente_id, finalizado=True)
 
-# Create your tests here.
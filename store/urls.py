@@ -15,8 +15,8 @@ urlpatterns = [
     
     # Ações do Carrinho (HTMX)
     path('adicionar-ao-carrinho/<int:produto_id>/', views.adicionar_ao_carrinho, name='adicionar_ao_carrinho'),
-    path('atualizar-carrinho/<int:item_id>/', views.atualizar_carrinho, name='atualizar_carrinho'),
-    path('remover-do-carrinho/<int:item_id>/', views.remover_do_carrinho, name='remover_do_carrinho'),
+    path('atualizar-carrinho/<int:produto_id>/', views.atualizar_carrinho, name='atualizar_carrinho'),
+    path('remover-do-carrinho/<int:produto_id>/', views.remover_do_carrinho, name='remover_do_carrinho'),
     path('hx-contagem-carrinho/', views.hx_contagem_carrinho, name='hx_contagem_carrinho'),
 
     # Pedidos
@@ -26,4 +26,5 @@ urlpatterns = [
     path('pedido/<int:pedido_id>/acompanhar/', views.acompanhar_pedido, name='acompanhar_pedido'),
 
     path('pedido/<int:pedido_id>/hx-status/', views.hx_acompanhar_pedido_status, name='hx_acompanhar_pedido_status'),
+    path('pedido/<int:pedido_id>/eventos/', views.eventos_pedido, name='eventos_pedido'),
 ]
\ No newline at end of file
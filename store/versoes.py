@@ -0,0 +1,125 @@
+"""
+Carimbos de versão dos dados exibidos nas telas com polling.
+
+Cada nome (``produtos``, ``pedidos``, ``pedido:<id>``) tem um contador no
+cache que só cresce e é incrementado, após o commit, sempre que as linhas
+correspondentes mudam. As views usam o carimbo como ETag e respondem 304
+sem consultar os dados nem renderizar o template.
+
+O contador começa do relógio (em nanossegundos) quando ainda não existe no
+cache, então um cache reiniciado ou esvaziado nunca repete um valor já
+entregue como ETag. Com vários processos, o cache precisa ser compartilhado
+entre eles.
+
+Quem incrementa pode registrar também quais linhas mudaram (``mudancas``);
+com isso ``mudancas_desde`` diz a um cliente que está na versão N o que
+mudou até a atual, e ele atualiza só essas linhas em vez da tela inteira.
+
+``ultima_alteracao`` diz quando um carimbo avançou pela última vez; as
+réplicas de leitura (store/replicas.py) a usam para não montar uma versão
+nova com dados que a réplica ainda não recebeu.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _chave(nome):
+    return f'versao:{nome}'
+
+
+def versao(nome):
+    """ Valor atual do carimbo; cria o contador se ainda não existir. """
+    chave = _chave(nome)
+    valor = cache.get(chave)
+    if valor is None:
+        cache.add(chave, time.time_ns(), timeout=None)
+        valor = cache.get(chave)
+    return valor
+
+
+async def aversao(nome):
+    """ versao() pela API assíncrona do cache, para as views assíncronas. """
+    chave = _chave(nome)
+    valor = await cache.aget(chave)
+    if valor is None:
+        await cache.aadd(chave, time.time_ns(), timeout=None)
+        valor = await cache.aget(chave)
+    return valor
+
+
+# Por quanto tempo (segundos) as mudanças de cada versão ficam registradas
+TEMPO_MUDANCAS = 60 * 60
+
+
+def _chave_mudancas(nome, valor):
+    return f'mudancas:{nome}:{valor}'
+
+
+def _chave_alteracao(nome):
+    return f'alterado:{nome}'
+
+
+def _incrementar(nomes, mudancas):
+    cache.set_many({_chave_alteracao(nome): time.time() for nome in nomes}, timeout=TEMPO_MUDANCAS)
+    for nome in nomes:
+        chave = _chave(nome)
+        try:
+            valor = cache.incr(chave)
+        except ValueError:
+            # O contador sumiu do cache: recomeça de um valor maior que qualquer anterior
+            cache.add(chave, time.time_ns(), timeout=None)
+            continue
+        if nome in mudancas:
+            cache.set(_chave_mudancas(nome, valor), list(mudancas[nome]), timeout=TEMPO_MUDANCAS)
+
+
+def incrementar(*nomes, mudancas=None):
+    """
+    Avança os carimbos quando a transação atual for confirmada. mudancas
+    ({nome: ids}) registra os ids alterados junto da nova versão do carimbo.
+    """
+    mudancas = mudancas or {}
+    transaction.on_commit(lambda: _incrementar(nomes, mudancas))
+
+
+def ultima_alteracao(*nomes):
+    """ Instante (time.time()) em que algum dos carimbos avançou pela última vez na última hora, ou None. """
+    return max(cache.get_many([_chave_alteracao(nome) for nome in nomes]).values(), default=None)
+
+
+async def aultima_alteracao(*nomes):
+    return max((await cache.aget_many([_chave_alteracao(nome) for nome in nomes])).values(), default=None)
+
+
+def _chaves_mudancas(nome, desde, atual, limite):
+    if desde > atual or atual - desde > limite:
+        return None
+    return [_chave_mudancas(nome, valor) for valor in range(desde + 1, atual + 1)]
+
+
+def _juntar(chaves, registradas):
+    if len(registradas) < len(chaves):
+        return None
+    return {item for ids in registradas.values() for item in ids}
+
+
+def mudancas_desde(nome, desde, limite):
+    """
+    (versão atual, ids alterados depois de desde) ou None se não for possível
+    saber: cliente mais de limite versões atrás, versão desconhecida ou alguma
+    versão no meio sem mudanças registradas (expiradas ou não informadas).
+    """
+    atual = versao(nome)
+    chaves = _chaves_mudancas(nome, desde, atual, limite)
+    ids = None if chaves is None else _juntar(chaves, cache.get_many(chaves))
+    return None if ids is None else (atual, ids)
+
+
+async def amudancas_desde(nome, desde, limite):
+    """ mudancas_desde() pela API assíncrona do cache. """
+    atual = await aversao(nome)
+    chaves = _chaves_mudancas(nome, desde, atual, limite)
+    ids = None if chaves is None else _juntar(chaves, await cache.aget_many(chaves))
+    return None if ids is None else (atual, ids)
@@ -1,13 +1,26 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from functools import wraps
+
+from django.shortcuts import aget_object_or_404, render, redirect, get_object_or_404
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse
-from django.views.decorators.http import require_POST
+from django.http import Http404, HttpResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import etag, require_POST
+from . import historico
+from .carrinho import Carrinho, CarrinhoOcupado, alterar as alterar_carrinho, gravar_pedido, repetir_em_conflito
 from .forms import ClienteCreationForm
-from .models import Pedido, ItemPedido
+from .eventos import canal_pedido, publicar_status, resposta_sse
+from .arquivo import pedidos_do_cliente
+from .models import Pedido, PedidoArquivado
+from .replicas import ler_da_replica
+from .versoes import aversao, versao
+from restaurant import busca
 from restaurant.models import Produto
-from django.db.models import Q
+from restaurant.paginacao import Pagina
+from restaurant.vendas import registrar_venda
+from django.utils import timezone
+from iffood.assincrono import etag_assincrono, login_requerido
 
 # --- VIEWS DE AUTENTICAÇÃO ---
 def cadastro_cliente(request):
@@ -40,7 +53,19 @@ def logout_cliente(request):
     logout(request)
     return redirect('store:lista_produtos')
 
+# --- ETAGS DAS TELAS COM POLLING ---
+# Dependem apenas dos carimbos de versão (sem consultas aos dados), de quem
+# está logado e de a requisição ser do HTMX, que recebe um conteúdo diferente.
+def _etag_catalogo(request):
+    return f"produtos-{versao('produtos')}-{request.user.pk or 0}-{int(bool(request.htmx))}"
+
+async def _etag_status_pedido(request, pedido_id):
+    return f"pedido-{pedido_id}-{await aversao(f'pedido:{pedido_id}')}"
+
 # --- VIEWS DA LOJA ---
+@cache_control(private=True, no_cache=True)
+@etag(_etag_catalogo)
+@ler_da_replica('produtos')
 def lista_produtos(request):
     # Pega o termo de busca da URL (ex: ?q=pizza)
     query = request.GET.get('q')
@@ -48,76 +73,84 @@ def lista_produtos(request):
     # Começa com todos os produtos ativos
     produtos = Produto.objects.filter(ativo=True)
     
-    # Se um termo de busca foi enviado, filtra a lista de produtos
+    # Se um termo de busca foi enviado, filtra pelo índice de texto completo (ordenado por relevância)
     if query:
-        # Filtra por nome OU descrição que contenha o termo da busca (case-insensitive)
-        produtos = produtos.filter(
-            Q(nome__icontains=query) |
-            Q(descricao__icontains=query)
-        )
+        produtos = busca.buscar(produtos, query)
         
+    # Página por cursor: cada requisição lê no máximo uma página de produtos
+    cursor = request.GET.get('cursor', '')
     context = {
-        'produtos': produtos,
+        'pagina': Pagina(produtos, cursor, ranqueada=bool(query)),
+        'cursor': cursor,
         'search_term': query, # Envia o termo de volta para o template
+        # Chave do cache da grade: muda sempre que um produto é salvo ou excluído
+        'versao_catalogo': versao('produtos'),
     }
+    # Pedido de "carregar mais": devolve só os cards da próxima página
+    if cursor:
+        return render(request, 'store/partials/_pagina_produtos.html', context)
     return render(request, 'store/lista_produtos.html', context)
 
-@login_required
 def visualizar_carrinho(request):
-    pedido, criado = Pedido.objects.get_or_create(cliente=request.user, finalizado=False)
-    return render(request, 'store/carrinho.html', {'pedido': pedido})
+    carrinho = Carrinho.do_request(request)
+    # Preços e nomes atuais: o total exibido é o que o checkout vai cobrar
+    carrinho.atualizar_precos()
+    return render(request, 'store/carrinho.html', {'carrinho': carrinho})
 
 # --- VIEWS DE AÇÕES (HTMX) ---
+# O carrinho em aberto vive no cache (store/carrinho.py): nenhuma destas views escreve no banco,
+# e cada alteração acontece com o carrinho travado, então cliques simultâneos não se perdem
+def _responder_carrinho_ocupado(view):
+    """ Carrinho travado por outra requisição além da espera: 503 com Retry-After (o HTMX não troca o conteúdo). """
+    @wraps(view)
+    def _view(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except CarrinhoOcupado:
+            return HttpResponse(
+                'Carrinho ocupado, tente de novo.', status=503, headers={'Retry-After': '1'},
+                content_type='text/plain; charset=utf-8',
+            )
+    return _view
+
 @require_POST
-@login_required
+@_responder_carrinho_ocupado
 def adicionar_ao_carrinho(request, produto_id):
-    produto = get_object_or_404(Produto, id=produto_id)
-    pedido, criado = Pedido.objects.get_or_create(cliente=request.user, finalizado=False)
-    item, item_criado = ItemPedido.objects.get_or_create(pedido=pedido, produto=produto)
-    if not item_criado:
-        item.quantidade += 1
-    item.save()
+    produto = get_object_or_404(Produto, id=produto_id, ativo=True)
+    with alterar_carrinho(request) as carrinho:
+        carrinho.adicionar(produto)
     
     # CORREÇÃO: Renderiza o novo template parcial completo
-    return render(request, 'store/partials/_carrinho_icone.html', {'pedido': pedido})
+    return render(request, 'store/partials/_carrinho_icone.html', {'carrinho': carrinho})
 
 
-@require_POST
-@login_required
-def atualizar_carrinho(request, item_id):
-    item = get_object_or_404(ItemPedido, id=item_id, pedido__cliente=request.user)
-    action = request.POST.get('action')
-    if action == 'inc':
-        item.quantidade += 1
-        item.save()
-    elif action == 'dec':
-        item.quantidade -= 1
-        if item.quantidade > 0:
-            item.save()
-        else:
-            item.delete()
-    response = render(request, 'store/partials/corpo_carrinho.html', {'pedido': item.pedido})
+def _recarregar_carrinho(request, carrinho):
+    carrinho.atualizar_precos()
+    response = render(request, 'store/partials/corpo_carrinho.html', {'carrinho': carrinho})
     response['HX-Trigger'] = 'itemAdicionado'
     return response
 
 @require_POST
-@login_required
-def remover_do_carrinho(request, item_id):
-    item = get_object_or_404(ItemPedido, id=item_id, pedido__cliente=request.user)
-    pedido = item.pedido
-    item.delete()
-    response = render(request, 'store/partials/corpo_carrinho.html', {'pedido': pedido})
-    response['HX-Trigger'] = 'itemAdicionado'
-    return response
+@_responder_carrinho_ocupado
+def atualizar_carrinho(request, produto_id):
+    action = request.POST.get('action')
+    with alterar_carrinho(request) as carrinho:
+        if action == 'inc':
+            carrinho.alterar(produto_id, 1)
+        elif action == 'dec':
+            carrinho.alterar(produto_id, -1)
+    return _recarregar_carrinho(request, carrinho)
 
-def hx_contagem_carrinho(request):
-    if request.user.is_authenticated:
-        pedido, criado = Pedido.objects.get_or_create(cliente=request.user, finalizado=False)
-        # CORREÇÃO: Renderiza o novo template parcial completo
-        return render(request, 'store/partials/_carrinho_icone.html', {'pedido': pedido})
-    
-    # Renderiza o estado vazio para usuários não logados
-    return render(request, 'store/partials/_carrinho_icone.html', {'pedido': None})
+@require_POST
+@_responder_carrinho_ocupado
+def remover_do_carrinho(request, produto_id):
+    with alterar_carrinho(request) as carrinho:
+        carrinho.remover(produto_id)
+    return _recarregar_carrinho(request, carrinho)
+
+async def hx_contagem_carrinho(request):
+    # CORREÇÃO: Renderiza o novo template parcial completo
+    return render(request, 'store/partials/_carrinho_icone.html', {'carrinho': await Carrinho.ado_request(request)})
 
 
 
@@ -125,32 +158,69 @@ def hx_contagem_carrinho(request):
 # --- VIEWS DE PEDIDOS ---
 @require_POST
 @login_required
+@_responder_carrinho_ocupado
 def finalizar_pedido(request):
-    pedido = get_object_or_404(Pedido, cliente=request.user, finalizado=False)
-    if pedido.total_itens > 0:
-        pedido.finalizado = True
-        pedido.status = 'solicitado' # Status inicial do pedido
-        pedido.save()
+    # Com o carrinho travado, um segundo clique em "Finalizar" espera este e encontra o carrinho vazio
+    with alterar_carrinho(request) as carrinho:
+        if not carrinho:
+            # Se o carrinho estiver vazio, volta para a lista de produtos
+            return redirect('store:lista_produtos')
+        pedido = repetir_em_conflito(lambda: _fechar_pedido(carrinho, request.user))
+        if pedido.finalizado:
+            carrinho.esvaziar()
+    if pedido.finalizado:
         # Redireciona para a nova página de acompanhamento
         return redirect('store:acompanhar_pedido', pedido_id=pedido.id)
-    # Se o carrinho estiver vazio, volta para a lista de produtos
+    # Se nenhum produto do carrinho existe mais, volta para a lista de produtos
     return redirect('store:lista_produtos')
 
+def _fechar_pedido(carrinho, usuario):
+    # Só aqui o carrinho vai para o banco
+    pedido = gravar_pedido(carrinho, usuario)
+    # Congela preços e nomes e recalcula os totais com eles antes de fechar o pedido
+    pedido.registrar_precos()
+    pedido.atualizar_totais()
+    if pedido.total_itens > 0:
+        pedido.finalizado = True
+        pedido.status = 'solicitado' # Status inicial do pedido
+        # A data do pedido passa a ser a da compra, não a de quando o carrinho foi aberto
+        pedido.data_pedido = timezone.now()
+        pedido.save(update_fields=['finalizado', 'status', 'data_pedido'])
+        historico.registrar('solicitado', [pedido.id])
+        registrar_venda(pedido)
+        publicar_status(pedido)
+    return pedido
+
 @login_required
+@ler_da_replica()
 def meus_pedidos(request):
-    pedidos = Pedido.objects.filter(cliente=request.user, finalizado=True).order_by('-data_pedido')
-    return render(request, 'store/meus_pedidos.html', {'pedidos': pedidos})
+    # Inclui os pedidos antigos que já foram para o arquivo
+    return render(request, 'store/meus_pedidos.html', {'pedidos': pedidos_do_cliente(request.user)})
 
 # NOVA VIEW PARA ACOMPANHAR O PEDIDO
 @login_required
 def acompanhar_pedido(request, pedido_id):
     # Garante que o usuário só pode ver seus próprios pedidos
-    pedido = get_object_or_404(Pedido, id=pedido_id, cliente=request.user)
-    return render(request, 'store/acompanhar_pedido.html', {'pedido': pedido})
-
-# VIEW PARA renderizar o "mini-template" que atualiza a cada 5s o status do pedido
-@login_required
-def hx_acompanhar_pedido_status(request, pedido_id):
+    pedido = Pedido.objects.prefetch_related('itempedido_set').filter(id=pedido_id, cliente=request.user).first()
+    arquivado = pedido is None
+    if arquivado:
+        # Pedido antigo, já encerrado: não há mais status para acompanhar ao vivo
+        pedido = get_object_or_404(PedidoArquivado.objects.prefetch_related('itempedido_set'), id=pedido_id, cliente=request.user)
+    return render(request, 'store/acompanhar_pedido.html', {'pedido': pedido, 'arquivado': arquivado})
+
+# VIEW PARA renderizar o "mini-template" que atualiza o status do pedido
+# Assíncrona, como o contador do carrinho: sob ASGI, quem acompanha um pedido não ocupa uma thread
+@login_requerido
+@cache_control(private=True, no_cache=True)
+@etag_assincrono(_etag_status_pedido)
+async def hx_acompanhar_pedido_status(request, pedido_id):
     # Esta view serve apenas o pedaço do template com a timeline
-    pedido = get_object_or_404(Pedido, id=pedido_id, cliente=request.user)
-    return render(request, 'store/partials/_timeline_status.html', {'pedido': pedido})
\ No newline at end of file
+    pedido = await aget_object_or_404(Pedido, id=pedido_id, cliente=request.user)
+    return render(request, 'store/partials/_timeline_status.html', {'pedido': pedido})
+
+# Canal SSE que avisa a página de acompanhamento quando o status do pedido muda
+@login_requerido
+async def eventos_pedido(request, pedido_id):
+    if not await Pedido.objects.filter(id=pedido_id, cliente=request.user).aexists():
+        raise Http404
+    return resposta_sse(request, [canal_pedido(pedido_id)])
@@ -0,0 +1,178 @@
+"""
+Fila de tarefas em segundo plano, guardada no próprio banco.
+
+Uma função marcada com ``@tarefa`` ganha o método ``enfileirar``, que grava
+uma linha em ``Tarefa`` (na transação de quem chamou: se ela for desfeita,
+a tarefa também é) e volta na hora. O comando ``processar_tarefas`` reserva
+as pendentes e as executa num pool de processos; uma tarefa que lança uma
+exceção volta para a fila, com espera crescente, até esgotar as tentativas.
+Cada execução registra a própria duração, agregada por ``metricas``.
+
+Uma tarefa que passa de ``TAREFAS_TEMPO_LIMITE`` segundos é interrompida
+(``TempoEsgotado``, tratada como qualquer falha). Uma que fica em execução
+além disso é de um worker que morreu: volta para a fila, ou falha de vez
+se já esgotou as tentativas (uma tarefa que derruba o worker não se repete
+para sempre).
+
+Com ``TAREFAS_IMEDIATAS=True`` as tarefas são executadas no próprio
+processo, logo após o commit, sem worker (útil em testes e no
+desenvolvimento).
+"""
+import logging
+import signal
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, F, Max, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Tarefa
+
+logger = logging.getLogger(__name__)
+
+# Espera antes da segunda tentativa, em segundos; dobra a cada nova falha
+ESPERA_INICIAL = 10
+# Além do tempo limite, para o worker registrar o resultado antes de a tarefa ser dada como abandonada
+FOLGA_TEMPO_LIMITE = 60
+
+
+class TempoEsgotado(Exception):
+    """ A tarefa passou de TAREFAS_TEMPO_LIMITE segundos e foi interrompida. """
+
+
+def tarefa(funcao=None, *, max_tentativas=3):
+    """
+    Marca uma função (de nível de módulo, com argumentos serializáveis em
+    JSON) como tarefa: ``funcao.enfileirar(*args, **kwargs)``.
+    """
+    def marcar(funcao):
+        nome = f'{funcao.__module__}.{funcao.__qualname__}'
+        funcao.enfileirar = lambda *args, **kwargs: enfileirar(nome, args, kwargs, max_tentativas)
+        return funcao
+    return marcar(funcao) if funcao else marcar
+
+
+def enfileirar(nome, args=(), kwargs=None, max_tentativas=3):
+    tarefa = Tarefa.objects.create(nome=nome, args=list(args), kwargs=kwargs or {}, max_tentativas=max_tentativas)
+    if settings.TAREFAS_IMEDIATAS:
+        transaction.on_commit(lambda: executar_imediatamente(tarefa.id))
+    return tarefa
+
+
+def reservar(tarefa_id):
+    """ Marca a tarefa como em execução; False se outro worker a reservou antes. """
+    return bool(
+        Tarefa.objects.filter(id=tarefa_id, status=Tarefa.PENDENTE).update(
+            status=Tarefa.EXECUTANDO, iniciada_em=timezone.now(), tentativas=F('tentativas') + 1,
+        )
+    )
+
+
+def reservar_pendentes(limite):
+    """ Reserva até ``limite`` tarefas cuja hora chegou, das mais antigas para as mais novas. """
+    candidatas = (
+        Tarefa.objects.filter(status=Tarefa.PENDENTE, executar_em__lte=timezone.now())
+        .order_by('executar_em', 'id').values_list('id', flat=True)[:limite]
+    )
+    # Cada reserva é um UPDATE condicionado ao status: dois workers nunca pegam a mesma tarefa
+    return [tarefa_id for tarefa_id in candidatas if reservar(tarefa_id)]
+
+
+def _devolver(tarefas, erro):
+    # Só as que continuam em execução; as que já esgotaram as tentativas falham de vez
+    tarefas = tarefas.filter(status=Tarefa.EXECUTANDO)
+    tarefas.filter(tentativas__gte=F('max_tentativas')).update(
+        status=Tarefa.FALHOU, erro=erro, concluida_em=timezone.now(),
+    )
+    return tarefas.update(status=Tarefa.PENDENTE, erro=erro)
+
+
+def devolver(tarefa_ids, erro):
+    """ Tarefas reservadas cujo processo morreu antes de registrar o resultado. """
+    return _devolver(Tarefa.objects.filter(id__in=tarefa_ids), erro)
+
+
+def recuperar_abandonadas():
+    """
+    Devolve à fila as tarefas em execução há mais de TAREFAS_TEMPO_LIMITE
+    (mais a folga): como o limite interrompe a tarefa, o worker morreu.
+    """
+    limite = timezone.now() - timedelta(seconds=settings.TAREFAS_TEMPO_LIMITE + FOLGA_TEMPO_LIMITE)
+    return _devolver(Tarefa.objects.filter(iniciada_em__lt=limite), 'Abandonada: o worker parou durante a execução.')
+
+
+@contextmanager
+def limite_de_tempo(segundos):
+    """
+    Levanta TempoEsgotado no bloco depois de ``segundos``. Usa SIGALRM, então
+    só vale na thread principal de sistemas Unix (os workers do pool e o
+    ``--processos=0``); no modo imediato, dentro das requisições, não há limite.
+    """
+    if not hasattr(signal, 'setitimer') or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def esgotar(signum, frame):
+        raise TempoEsgotado(f'Interrompida depois de {segundos} s.')
+
+    anterior = signal.signal(signal.SIGALRM, esgotar)
+    signal.setitimer(signal.ITIMER_REAL, segundos)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, anterior)
+
+
+def executar(tarefa_id):
+    """
+    Executa uma tarefa já reservada e registra o resultado. Devolve True se
+    ela terminou (com sucesso ou sem mais tentativas) e False se voltou para a fila.
+    """
+    tarefa = Tarefa.objects.get(id=tarefa_id)
+    inicio = time.perf_counter()
+    try:
+        with limite_de_tempo(settings.TAREFAS_TEMPO_LIMITE):
+            import_string(tarefa.nome)(*tarefa.args, **tarefa.kwargs)
+    except Exception:
+        logger.exception('Tarefa %s falhou (tentativa %s de %s)', tarefa, tarefa.tentativas, tarefa.max_tentativas)
+        tarefa.erro = traceback.format_exc()
+        if tarefa.tentativas < tarefa.max_tentativas:
+            tarefa.status = Tarefa.PENDENTE
+            tarefa.executar_em = timezone.now() + timedelta(seconds=ESPERA_INICIAL * 2 ** (tarefa.tentativas - 1))
+        else:
+            tarefa.status = Tarefa.FALHOU
+    else:
+        tarefa.status = Tarefa.CONCLUIDA
+        tarefa.erro = ''
+    tarefa.duracao = time.perf_counter() - inicio
+    tarefa.concluida_em = timezone.now()
+    tarefa.save(update_fields=['status', 'erro', 'executar_em', 'duracao', 'concluida_em'])
+    return tarefa.status != Tarefa.PENDENTE
+
+
+def executar_imediatamente(tarefa_id):
+    """ Modo TAREFAS_IMEDIATAS: executa a tarefa agora, repetindo as falhas sem esperar. """
+    while reservar(tarefa_id) and not executar(tarefa_id):
+        pass
+
+
+def metricas(desde=None):
+    """ Execuções, falhas e duração (média e máxima, em segundos) por função. """
+    tarefas = Tarefa.objects.filter(status__in=(Tarefa.CONCLUIDA, Tarefa.FALHOU))
+    if desde:
+        tarefas = tarefas.filter(concluida_em__gte=desde)
+    return list(
+        tarefas.values('nome').annotate(
+            execucoes=Count('id'),
+            falhas=Count('id', filter=Q(status=Tarefa.FALHOU)),
+            duracao_media=Avg('duracao'),
+            duracao_maxima=Max('duracao'),
+        ).order_by('nome')
+    )
@@ -0,0 +1,96 @@
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.management.base import BaseCommand
+
+from tarefas import fila, processos
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Executa as tarefas enfileiradas num pool de processos (ou mostra as métricas, com --metricas).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processos', type=int, default=os.cpu_count() or 1,
+            help='Tamanho do pool; 0 executa as tarefas neste mesmo processo.',
+        )
+        parser.add_argument('--intervalo', type=float, default=1.0, help='Segundos entre consultas com a fila vazia.')
+        parser.add_argument('--uma-vez', action='store_true', help='Esvazia a fila e termina.')
+        parser.add_argument('--metricas', action='store_true', help='Mostra execuções, falhas e duração por tarefa.')
+
+    def handle(self, *args, **options):
+        if options['metricas']:
+            return self.mostrar_metricas()
+        if options['processos'] == 0:
+            return self.processar_aqui(options)
+
+        pool = self.novo_pool(options['processos'])
+        executando = {}  # futuro -> id da tarefa
+        try:
+            while True:
+                fila.recuperar_abandonadas()
+                livres = options['processos'] - len(executando)
+                quebrado = False
+                for tarefa_id in fila.reservar_pendentes(livres) if livres else []:
+                    try:
+                        executando[pool.submit(processos.executar, tarefa_id)] = tarefa_id
+                    except BrokenProcessPool:
+                        quebrado = True
+                        fila.devolver([tarefa_id], 'O pool de processos parou antes de executar a tarefa.')
+                if not executando and not quebrado:
+                    if options['uma_vez']:
+                        break
+                    time.sleep(options['intervalo'])
+                    continue
+                prontas, _ = wait(set(executando), timeout=options['intervalo'], return_when=FIRST_COMPLETED)
+                for futuro in prontas:
+                    tarefa_id = executando.pop(futuro)
+                    erro = futuro.exception()
+                    if erro:
+                        # As falhas da própria tarefa já ficam registradas; aqui só chegam erros do worker,
+                        # que não chegou a registrar o resultado
+                        logger.error('Erro ao executar a tarefa %s', tarefa_id, exc_info=erro)
+                        fila.devolver([tarefa_id], f'O worker parou durante a execução: {erro!r}')
+                        quebrado = quebrado or isinstance(erro, BrokenProcessPool)
+                if quebrado:
+                    # Um processo filho morreu (por exemplo, pela própria tarefa) e o pool não aceita mais
+                    # tarefas: as que ele executava voltam para a fila e o pool é recriado
+                    logger.error('Pool de processos quebrado; recriando')
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    fila.devolver(list(executando.values()), 'O pool de processos parou durante a execução.')
+                    executando = {}
+                    pool = self.novo_pool(options['processos'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            pool.shutdown(wait=True)
+
+    def novo_pool(self, tamanho):
+        # spawn: cada processo abre as próprias conexões em vez de herdar as deste
+        return ProcessPoolExecutor(
+            tamanho, mp_context=multiprocessing.get_context('spawn'), initializer=processos.iniciar,
+        )
+
+    def processar_aqui(self, options):
+        while True:
+            fila.recuperar_abandonadas()
+            reservadas = fila.reservar_pendentes(1)
+            if reservadas:
+                fila.executar(reservadas[0])
+            elif options['uma_vez']:
+                break
+            else:
+                time.sleep(options['intervalo'])
+
+    def mostrar_metricas(self):
+        for linha in fila.metricas():
+            self.stdout.write(
+                f"{linha['nome']}: {linha['execucoes']} execuções, {linha['falhas']} falhas, "
+                f"média {linha['duracao_media']:.3f}s, máxima {linha['duracao_maxima']:.3f}s"
+            )
@@ -0,0 +1,43 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Tarefa(models.Model):
+    """ Uma execução enfileirada de uma função marcada com ``@tarefa`` (ver tarefas/fila.py). """
+    PENDENTE = 'pendente'
+    EXECUTANDO = 'executando'
+    CONCLUIDA = 'concluida'
+    FALHOU = 'falhou'
+    STATUS_CHOICES = (
+        (PENDENTE, 'Pendente'),
+        (EXECUTANDO, 'Executando'),
+        (CONCLUIDA, 'Concluída'),
+        (FALHOU, 'Falhou'),
+    )
+
+    nome = models.CharField(max_length=200, verbose_name="Função")
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDENTE)
+    tentativas = models.PositiveSmallIntegerField(default=0)
+    max_tentativas = models.PositiveSmallIntegerField(default=3, verbose_name="Máximo de Tentativas")
+    executar_em = models.DateTimeField(default=timezone.now, verbose_name="Executar em")
+    criada_em = models.DateTimeField(auto_now_add=True, verbose_name="Criada em")
+    iniciada_em = models.DateTimeField(null=True, blank=True, verbose_name="Iniciada em")
+    concluida_em = models.DateTimeField(null=True, blank=True, verbose_name="Concluída em")
+    duracao = models.FloatField(null=True, blank=True, verbose_name="Duração (s)")
+    erro = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name = "Tarefa"
+        verbose_name_plural = "Tarefas"
+        indexes = [
+            # O worker só procura tarefas pendentes, da mais antiga para a mais nova
+            models.Index(
+                fields=['executar_em', 'id'], condition=models.Q(status='pendente'), name='tarefa_pendente_idx',
+            ),
+            models.Index(fields=['nome', 'concluida_em'], name='tarefa_nome_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.nome} #{self.id} ({self.get_status_display()})"
@@ -0,0 +1,22 @@
+"""
+Pontos de entrada dos processos do pool de ``processar_tarefas``.
+
+Com o método spawn, o processo filho importa este módulo antes de
+``django.setup()``; por isso os modelos só são importados dentro das funções.
+"""
+import django
+
+
+def iniciar():
+    django.setup()
+
+
+def executar(tarefa_id):
+    from django.db import connections
+
+    from . import fila
+
+    try:
+        return fila.executar(tarefa_id)
+    finally:
+        connections.close_all()
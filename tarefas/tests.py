@@ -0,0 +1,176 @@
+import time
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import fila
+from .fila import tarefa
+from .models import Tarefa
+
+executadas = []
+
+
+@tarefa
+def anotar(valor, sufixo=''):
+    executadas.append(f'{valor}{sufixo}')
+
+
+@tarefa(max_tentativas=2)
+def falhar():
+    executadas.append('falhou')
+    raise RuntimeError('sempre falha')
+
+
+@tarefa(max_tentativas=1)
+def demorar():
+    time.sleep(5)
+    executadas.append('terminou')
+
+
+class PoolQuebrado:
+    """ ProcessPoolExecutor falso: o primeiro "morre" com a tarefa, os seguintes executam aqui mesmo. """
+    criados = 0
+
+    def __init__(self, *args, **kwargs):
+        PoolQuebrado.criados += 1
+        self.quebrado = PoolQuebrado.criados == 1
+
+    def submit(self, funcao, tarefa_id):
+        futuro = Future()
+        if self.quebrado:
+            futuro.set_exception(BrokenProcessPool('um processo filho morreu'))
+        else:
+            futuro.set_result(fila.executar(tarefa_id))
+        return futuro
+
+    def shutdown(self, **kwargs):
+        pass
+
+
+def processar():
+    call_command('processar_tarefas', '--uma-vez', '--processos=0', stdout=StringIO())
+
+
+class FilaTests(TestCase):
+    def setUp(self):
+        executadas.clear()
+
+    def test_worker_executa_as_pendentes_em_ordem(self):
+        anotar.enfileirar(1)
+        anotar.enfileirar(2, sufixo='!')
+        self.assertEqual(executadas, [])
+
+        processar()
+
+        self.assertEqual(executadas, ['1', '2!'])
+        tarefa = Tarefa.objects.get(args=[1])
+        self.assertEqual((tarefa.status, tarefa.tentativas, tarefa.nome), (Tarefa.CONCLUIDA, 1, 'tarefas.tests.anotar'))
+        self.assertIsNotNone(tarefa.duracao)
+
+    def test_tarefa_desfeita_com_a_transacao(self):
+        try:
+            with transaction.atomic():
+                anotar.enfileirar(1)
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertFalse(Tarefa.objects.exists())
+
+    def test_falha_volta_para_a_fila_com_espera_ate_esgotar_as_tentativas(self):
+        falhar.enfileirar()
+        with self.assertLogs('tarefas.fila', 'ERROR'):
+            processar()
+        tarefa = Tarefa.objects.get()
+        self.assertEqual((tarefa.status, tarefa.tentativas), (Tarefa.PENDENTE, 1))
+        self.assertGreater(tarefa.executar_em, timezone.now())
+        self.assertIn('sempre falha', tarefa.erro)
+
+        # Ainda não chegou a hora da nova tentativa
+        processar()
+        self.assertEqual(executadas, ['falhou'])
+
+        Tarefa.objects.update(executar_em=timezone.now())
+        with self.assertLogs('tarefas.fila', 'ERROR'):
+            processar()
+        tarefa.refresh_from_db()
+        self.assertEqual((tarefa.status, tarefa.tentativas), (Tarefa.FALHOU, 2))
+        self.assertEqual(executadas, ['falhou', 'falhou'])
+
+    def test_reserva_e_exclusiva(self):
+        tarefa = anotar.enfileirar(1)
+        self.assertTrue(fila.reservar(tarefa.id))
+        self.assertFalse(fila.reservar(tarefa.id))
+        self.assertEqual(fila.reservar_pendentes(10), [])
+
+    def test_recupera_tarefas_abandonadas(self):
+        tarefa = anotar.enfileirar(1)
+        fila.reservar(tarefa.id)
+        Tarefa.objects.update(iniciada_em=timezone.now() - timedelta(hours=1))
+        processar()
+        self.assertEqual(executadas, ['1'])
+
+    def test_tarefa_abandonada_sem_tentativas_falha(self):
+        tarefa = falhar.enfileirar()
+        Tarefa.objects.filter(id=tarefa.id).update(tentativas=1)
+        fila.reservar(tarefa.id)
+        Tarefa.objects.update(iniciada_em=timezone.now() - timedelta(hours=1))
+        processar()
+        self.assertEqual(executadas, [])
+        self.assertEqual(Tarefa.objects.get().status, Tarefa.FALHOU)
+
+    def test_tarefa_em_execucao_dentro_do_limite_nao_e_recuperada(self):
+        tarefa = anotar.enfileirar(1)
+        fila.reservar(tarefa.id)
+        Tarefa.objects.update(iniciada_em=timezone.now() - timedelta(seconds=settings.TAREFAS_TEMPO_LIMITE))
+        self.assertEqual(fila.recuperar_abandonadas(), 0)
+
+    @override_settings(TAREFAS_TEMPO_LIMITE=0.2)
+    def test_tempo_limite_interrompe_a_tarefa(self):
+        demorar.enfileirar()
+        with self.assertLogs('tarefas.fila', 'ERROR'):
+            processar()
+        tarefa = Tarefa.objects.get()
+        self.assertEqual(executadas, [])
+        self.assertEqual(tarefa.status, Tarefa.FALHOU)
+        self.assertIn('TempoEsgotado', tarefa.erro)
+        self.assertLess(tarefa.duracao, 2)
+
+    def test_pool_quebrado_e_recriado(self):
+        anotar.enfileirar(1)
+        PoolQuebrado.criados = 0
+        with mock.patch('tarefas.management.commands.processar_tarefas.ProcessPoolExecutor', PoolQuebrado), \
+                self.assertLogs('tarefas.management.commands.processar_tarefas', 'ERROR'):
+            call_command('processar_tarefas', '--uma-vez', '--processos=1', '--intervalo=0', stdout=StringIO())
+        self.assertEqual(PoolQuebrado.criados, 2)
+        self.assertEqual(executadas, ['1'])
+        tarefa = Tarefa.objects.get()
+        self.assertEqual((tarefa.status, tarefa.tentativas), (Tarefa.CONCLUIDA, 2))
+
+    @override_settings(TAREFAS_IMEDIATAS=True)
+    def test_modo_imediato_executa_apos_o_commit(self):
+        with self.assertLogs('tarefas.fila', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+            anotar.enfileirar(1)
+            falhar.enfileirar()
+            self.assertEqual(executadas, [])
+        self.assertEqual(executadas, ['1', 'falhou', 'falhou'])
+        self.assertEqual(Tarefa.objects.get(nome='tarefas.tests.falhar').status, Tarefa.FALHOU)
+
+    def test_metricas_por_tarefa(self):
+        anotar.enfileirar(1)
+        anotar.enfileirar(2)
+        processar()
+        metricas = fila.metricas()
+        self.assertEqual([(linha['nome'], linha['execucoes'], linha['falhas']) for linha in metricas], [
+            ('tarefas.tests.anotar', 2, 0),
+        ])
+        saida = StringIO()
+        call_command('processar_tarefas', '--metricas', stdout=saida)
+        self.assertIn('tarefas.tests.anotar: 2 execuções, 0 falhas', saida.getvalue())